@@ -11,6 +11,11 @@ import matplotlib.pyplot as plt
 from collections import deque
 import numpy as np
 
+# Gait metrics are shared with the server (Backend/gait_metrics.py). The
+# repository root must be on PYTHONPATH: run_python.sh gait-video sets it.
+from Backend.gait_metrics import LEFT_ANKLE, LEFT_ELBOW, RIGHT_ANKLE, RIGHT_ELBOW, pixel_coords, signed_distance
+from Backend.peaks import getPeakDist
+
 
 class RealTimePlotter:
     def __init__(self, window_size=100, update_interval=50, num_lines=8):
@@ -147,22 +152,10 @@ def draw_landmarks_on_image(rgb_image, detection_result):
     return annotated_image
 
 
-def calculate_distance(x, y, x1, y1):
-    dx = x1 - x
-    dy = y1 - y
-    distance = math.sqrt(dx ** 2 + dy ** 2)
-    return distance
-
-
-def getRealCoords(landmark, frame):
-    height, width, channels = frame.shape
-    return int(landmark.x * width), int(landmark.y * height)
-
-
 base_options = python.BaseOptions(model_asset_path='pose_landmarker.task')
 options = vision.PoseLandmarkerOptions(
     base_options=base_options,
-    output_segmentation_masks=True,
+    output_segmentation_masks=False,  # masks are never used
     running_mode=mp.tasks.vision.RunningMode.VIDEO)  # No callback needed for VIDEO mode
 detector = vision.PoseLandmarker.create_from_options(options)
 
@@ -186,20 +179,6 @@ prevSwingLen = None
 prevStrideLen = None
 frame_count = 0
 
-from scipy.signal import find_peaks
-
-def getPeakDist(lengths):
-    print(lengths)
-    window_size = 10
-    smooth = np.convolve(lengths, np.ones(window_size)/window_size, mode='same')
-    peaks, properties = find_peaks(smooth,
-                                   height=None,  # minimum height of peaks
-                                   distance=10,  # minimum distance between peaks
-                                   prominence=10)
-    peak_distances = np.diff(peaks)
-    average_peak_distance = np.mean(peak_distances)
-    return average_peak_distance
-
 swingLens = []
 strideLens = []
 
@@ -221,37 +200,32 @@ while True:
     # Process the detection result
     landmarks = detection_result.pose_landmarks
 
-    if len(landmarks) > 0 and len(landmarks[0]) >= 28:  # Changed from 26 to 28
-        left_foot_x, left_foot_y = getRealCoords(landmarks[0][27], frame)
-        right_foot_x, right_foot_y = getRealCoords(landmarks[0][28], frame)
-        stride_length = int(calculate_distance(left_foot_x, left_foot_y, right_foot_x, right_foot_y))
-
-        if right_foot_x > left_foot_x:
-            stride_length *= -1
+    if len(landmarks) > 0:
+        landmark_array = np.array([[(lm.x, lm.y, lm.z, lm.visibility or 0.0) for lm in landmarks[0]]], dtype=np.float32)
+        pixels = pixel_coords(landmark_array, frame_width, frame_height)
+        points = pixels[0].astype(int)
 
+        (left_foot_x, left_foot_y), (right_foot_x, right_foot_y) = points[[LEFT_ANKLE, RIGHT_ANKLE]].tolist()
+        stride_length = int(signed_distance(pixels, LEFT_ANKLE, RIGHT_ANKLE)[0])
         strideLens.append(stride_length)
 
         cv2.circle(frame, center=(left_foot_x, left_foot_y), radius=2, color=(0, 0, 255), thickness=3)
         cv2.circle(frame, center=(right_foot_x, right_foot_y), radius=2, color=(0, 0, 255), thickness=3)
         cv2.line(frame, (left_foot_x, left_foot_y), (right_foot_x, right_foot_y), (0, 0, 255), 2)
 
-        avgStrideLen = getPeakDist(strideLens)
+        avgStrideLen = getPeakDist(strideLens, last=None)
         cv2.putText(frame, "stride length: " + (str(int(avgStrideLen)) if not math.isnan(avgStrideLen) else 'calculating...'), (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255),
                     2)
 
-        left_elbow_x, left_elbow_y = getRealCoords(landmarks[0][13], frame)
-        right_elbow_x, right_elbow_y = getRealCoords(landmarks[0][14], frame)
-        swing_length = int(calculate_distance(left_elbow_x, left_elbow_y, right_elbow_x, right_elbow_y))
-
-        if right_elbow_x > left_elbow_x:
-            swing_length *= -1
+        (left_elbow_x, left_elbow_y), (right_elbow_x, right_elbow_y) = points[[LEFT_ELBOW, RIGHT_ELBOW]].tolist()
+        swing_length = int(signed_distance(pixels, LEFT_ELBOW, RIGHT_ELBOW)[0])
 
         swingLens.append(swing_length)
         cv2.circle(frame, center=(left_elbow_x, left_elbow_y), radius=2, color=(255, 0, 0), thickness=3)
         cv2.circle(frame, center=(right_elbow_x, right_elbow_y), radius=2, color=(255, 0, 0), thickness=3)
         cv2.line(frame, (left_elbow_x, left_elbow_y), (right_elbow_x, right_elbow_y), (255, 0, 0), 2)
 
-        avgSwingLen = getPeakDist(swingLens)
+        avgSwingLen = getPeakDist(swingLens, last=None)
         cv2.putText(frame, "swing length: " + (str(int(avgSwingLen)) if not math.isnan(avgSwingLen) else 'calculating...'), (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
         plotter.add_value([stride_length, swing_length, 0, 0, 0, 0, 0, 0])
 
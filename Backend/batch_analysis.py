@@ -0,0 +1,186 @@
+"""Offline batch gait analysis for a directory of recorded videos.
+
+Usage (from the repository root):
+
+    python -m Backend.batch_analysis "Backend/Gait Detection" --out results --workers 4
+
+Every video is analysed by one worker process. Inside the worker a producer
+thread decodes frames with OpenCV while the main thread runs the pose
+landmarker on them, so decoding overlaps with inference. For each video the
+tool writes <name>.npz with the per-frame landmarks, timestamps and stride /
+swing series, and a summary.json with the gait metrics of every video plus
+throughput in frames per second per core.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from .gait_metrics import compute_gait_metrics
+
+DEFAULT_MODEL_PATH = 'Backend/Gait Detection/pose_landmarker.task'
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+
+def find_videos(directory):
+    """Video files in a directory, sorted by name"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def _decode_frames(capture, frames, stop):
+    """Producer: decode frames into the queue as RGB arrays, then a None sentinel"""
+    try:
+        while not stop.is_set():
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.put(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        frames.put(None)
+
+
+def analyze_video(path, out_dir, model_path=DEFAULT_MODEL_PATH, queue_size=32):
+    """Worker: run pose estimation over one video and write its landmarks and metrics"""
+    import mediapipe as mp
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+
+    options = vision.PoseLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        output_segmentation_masks=False,
+        running_mode=mp.tasks.vision.RunningMode.VIDEO)
+    detector = vision.PoseLandmarker.create_from_options(options)
+
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    capacity = max(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 1)
+
+    # NaN marks frames where no pose was detected
+    landmarks = np.full((capacity, 33, 4), np.nan, dtype=np.float32)
+
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=_decode_frames, args=(capture, frames, stop), daemon=True)
+
+    started = time.perf_counter()
+    inference_seconds = 0.0
+    frame_count = 0
+    producer.start()
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            if frame_count == len(landmarks):
+                # Frame count reported by the container was too low
+                landmarks = np.concatenate([landmarks, np.full_like(landmarks, np.nan)])
+
+            timestamp_ms = int((frame_count / fps) * 1000)
+            inference_started = time.perf_counter()
+            result = detector.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=frame), timestamp_ms)
+            inference_seconds += time.perf_counter() - inference_started
+
+            if result.pose_landmarks:
+                landmarks[frame_count] = [
+                    (landmark.x, landmark.y, landmark.z, landmark.visibility or 0.0)
+                    for landmark in result.pose_landmarks[0]
+                ]
+            frame_count += 1
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                producer.join(timeout=0.1)
+        capture.release()
+        detector.close()
+    elapsed = time.perf_counter() - started
+
+    landmarks = landmarks[:frame_count]
+    timestamps_ms = np.arange(frame_count) * (1000 / fps)
+    metrics = compute_gait_metrics(landmarks, width, height, timestamps_ms)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    np.savez_compressed(
+        os.path.join(out_dir, f"{name}.npz"),
+        landmarks=landmarks, timestamps_ms=timestamps_ms, stride=metrics.stride, swing=metrics.swing)
+
+    return {
+        "video": path,
+        "frames": frame_count,
+        "frames_with_pose": int(metrics.detected.sum()),
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "avg_stride": None if np.isnan(metrics.avg_stride) else metrics.avg_stride,
+        "avg_swing": None if np.isnan(metrics.avg_swing) else metrics.avg_swing,
+        "cadence": None if np.isnan(metrics.cadence) else metrics.cadence,
+        "stride_peaks": int(len(metrics.stride_peaks)),
+        "swing_peaks": int(len(metrics.swing_peaks)),
+        "elapsed_seconds": elapsed,
+        "inference_seconds": inference_seconds,
+        "frames_per_second": frame_count / elapsed if elapsed else 0.0,
+    }
+
+
+def analyze_directory(directory, out_dir, workers=None, model_path=DEFAULT_MODEL_PATH):
+    """Analyse every video in a directory with a process pool; returns the summary"""
+    videos = find_videos(directory)
+    if not videos:
+        raise ValueError(f"No videos found in {directory}")
+    workers = workers or min(len(videos), os.cpu_count() or 1)
+    os.makedirs(out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyze_video, path, out_dir, model_path): path for path in videos}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"{result['video']}: {result['frames']} frames at {result['frames_per_second']:.1f} fps")
+    elapsed = time.perf_counter() - started
+
+    total_frames = sum(result["frames"] for result in results)
+    summary = {
+        "videos": sorted(results, key=lambda result: result["video"]),
+        "workers": workers,
+        "total_frames": total_frames,
+        "elapsed_seconds": elapsed,
+        "frames_per_second": total_frames / elapsed if elapsed else 0.0,
+        "frames_per_second_per_core": total_frames / elapsed / workers if elapsed else 0.0,
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch gait analysis for a directory of videos")
+    parser.add_argument("directory", help="directory containing the videos")
+    parser.add_argument("--out", default="gait_results", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="pose landmarker .task file")
+    args = parser.parse_args()
+
+    summary = analyze_directory(args.directory, args.out, args.workers, args.model)
+    print(f"{summary['total_frames']} frames in {summary['elapsed_seconds']:.1f}s: "
+          f"{summary['frames_per_second']:.1f} fps total, "
+          f"{summary['frames_per_second_per_core']:.1f} fps per core ({summary['workers']} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Load generator and latency/throughput benchmark for /ws/image.
+
+Usage (from the repository root, with the server running):
+
+    python -m Backend.benchmark --clients 4 --fps 15 --duration 30 --out bench.json
+    python -m Backend.benchmark --clients 4 --fps 15 --duration 30 --compare bench.json
+
+Every simulated client replays one of the bundled Gait Detection/*.mp4
+clips in a loop as binary frames (see frame_protocol.py) at a fixed frame
+rate. The clips are decoded, resized and JPEG encoded once before the run so
+the load generator's own CPU use does not vary between runs, and frames are
+sent on a fixed schedule rather than as fast as replies come back.
+
+The server is asked for per-stage timings (?timings=1), so the results break
+the round trip down into decode, inference, drawing, encode and send. The
+JSON written with --out holds the configuration, p50/p95/p99 round-trip
+latency, achieved FPS, frames the server dropped, per-stage timings and,
+with --server-pid, the growth of the server's resident memory. --compare
+prints the change of the headline numbers against an earlier result file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import msgpack
+import numpy as np
+import websockets
+
+from .frame_protocol import CODEC_JPEG, FRAME_MAGIC, FrameHeader, pack_frame
+from .responses import ENCODINGS
+
+DEFAULT_URL = "ws://localhost:8000/ws/image"
+DEFAULT_VIDEO_DIR = "Backend/Gait Detection"
+
+
+def load_clip(path, width, max_frames, quality):
+    """Decode, resize and JPEG encode the first max_frames frames of a video"""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            if width and frame.shape[1] != width:
+                height = round(frame.shape[0] * width / frame.shape[1])
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            frames.append((buffer.tobytes(), frame.shape[1], frame.shape[0]))
+    finally:
+        capture.release()
+    if not frames:
+        raise ValueError(f"Could not decode any frames from {path}")
+    return frames
+
+
+def read_rss_mb(pid):
+    """Resident set size of a process in MB (Linux only), None if unavailable"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentiles(values):
+    """p50/p95/p99/mean/max of a list of milliseconds (None when empty)"""
+    if not values:
+        return None
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(array.mean()), 2),
+        "max": round(float(array.max()), 2),
+        "count": len(values),
+    }
+
+
+class ClientStats:
+    """What one simulated client sent and got back"""
+
+    def __init__(self, client_id, clip):
+        self.client_id = client_id
+        self.clip = clip
+        self.sent = 0
+        self.answered = 0
+        self.errors = 0
+        self.server_dropped = 0
+        self.latencies_ms = []
+        self.stage_ms = {}
+        self.first_reply = None  # first and last reply to a frame sent after the warmup
+        self.last_reply = None
+
+    def record_reply(self, sent_at, now, timings, warm):
+        self.answered += 1
+        if not warm:
+            return
+        self.first_reply = self.first_reply or now
+        self.last_reply = now
+        self.latencies_ms.append((now - sent_at) * 1000)
+        for stage, ms in (timings or {}).items():
+            self.stage_ms.setdefault(stage, []).append(ms)
+
+    def summary(self):
+        elapsed = (self.last_reply - self.first_reply) if len(self.latencies_ms) > 1 else 0.0
+        return {
+            "client": self.client_id,
+            "clip": self.clip,
+            "frames_sent": self.sent,
+            "frames_answered": self.answered,
+            "server_dropped": self.server_dropped,
+            "errors": self.errors,
+            "achieved_fps": round((len(self.latencies_ms) - 1) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": percentiles(self.latencies_ms),
+        }
+
+
+async def run_client(client_id, url, clip_name, frames, args, started, stop_at):
+    """Send frames at a fixed rate and match replies to them by frame id"""
+    stats = ClientStats(client_id, clip_name)
+    sent_at = {}
+    warm_after = started + args.warmup
+    interval = 1.0 / args.fps
+    uri = (f"{url}?mode={args.mode}&adaptive={int(args.adaptive)}&encoding={args.encoding}&timings=1"
+           f"&session_id=bench-{client_id}-{int(time.time())}")
+
+    async with websockets.connect(uri, max_size=None) as websocket:
+        async def send_frames():
+            frame_id = 0
+            next_send = time.perf_counter()
+            while next_send < stop_at:
+                payload, width, height = frames[frame_id % len(frames)]
+                # Capture time 0 means "unknown" to the server's media clock, so start one interval in
+                header = FrameHeader(frame_id, (frame_id + 1) * interval * 1000, CODEC_JPEG, width, height)
+                message = pack_frame(header, payload)
+                sent_at[frame_id] = time.perf_counter()
+                await websocket.send(message)
+                stats.sent += 1
+                frame_id += 1
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+        def forget_older(frame_id):
+            """Frames are answered in order: earlier ones still waiting were dropped by the server"""
+            for pending in [pending for pending in sent_at if pending < frame_id]:
+                del sent_at[pending]
+
+        async def receive_replies():
+            while True:
+                message = await websocket.recv()
+                if isinstance(message, bytes):
+                    if message.startswith(FRAME_MAGIC):
+                        continue  # the metrics message that follows completes the frame
+                    reply = msgpack.unpackb(message)
+                else:
+                    reply = json.loads(message)
+                if reply.get("type") != "metrics":
+                    if reply.get("status") == "error":
+                        stats.errors += 1
+                        if reply.get("frame_id") is not None:
+                            sent_at.pop(reply["frame_id"], None)
+                            forget_older(reply["frame_id"])
+                    continue
+                now = time.perf_counter()
+                frame_sent_at = sent_at.pop(reply["frame_id"], None)
+                forget_older(reply["frame_id"])
+                if frame_sent_at is None:
+                    continue
+                stats.server_dropped = reply.get("ingest", {}).get("dropped_frames", stats.server_dropped)
+                stats.record_reply(frame_sent_at, now, reply.get("timings_ms"), frame_sent_at >= warm_after)
+
+        receiver = asyncio.create_task(receive_replies())
+        try:
+            await send_frames()
+            # Give the server a moment to answer the last frames
+            await asyncio.sleep(args.drain)
+        finally:
+            receiver.cancel()
+    return stats
+
+
+async def run_benchmark(args):
+    videos = sorted(
+        os.path.join(args.videos, name) for name in os.listdir(args.videos)
+        if name.lower().endswith(".mp4")
+    )
+    if not videos:
+        raise ValueError(f"No .mp4 clips found in {args.videos}")
+    clips = {path: load_clip(path, args.width, args.max_frames, args.quality) for path in videos}
+
+    rss_before = read_rss_mb(args.server_pid)
+    started = time.perf_counter()
+    stop_at = started + args.warmup + args.duration
+    clients = [
+        run_client(i, args.url, os.path.basename(videos[i % len(videos)]), clips[videos[i % len(videos)]],
+                   args, started, stop_at)
+        for i in range(args.clients)
+    ]
+    results = await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - started
+    rss_after = read_rss_mb(args.server_pid)
+
+    latencies = [ms for stats in results for ms in stats.latencies_ms]
+    stages = {}
+    for stats in results:
+        for stage, values in stats.stage_ms.items():
+            stages.setdefault(stage, []).extend(values)
+
+    return {
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "fps": args.fps,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mode": args.mode,
+            "adaptive": args.adaptive,
+            "encoding": args.encoding,
+            "width": args.width,
+            "quality": args.quality,
+            "clips": [os.path.basename(path) for path in videos],
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "commit": git_commit(),
+        },
+        "elapsed_s": round(elapsed, 2),
+        "frames_sent": sum(stats.sent for stats in results),
+        "frames_answered": sum(stats.answered for stats in results),
+        "server_dropped": sum(stats.server_dropped for stats in results),
+        "achieved_fps": round(sum(stats.summary()["achieved_fps"] for stats in results), 2),
+        "latency_ms": percentiles(latencies),
+        "stage_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "server_rss_mb": None if rss_before is None else {
+            "before": round(rss_before, 1),
+            "after": round(rss_after, 1),
+            "growth": round(rss_after - rss_before, 1),
+        },
+        "clients": [stats.summary() for stats in results],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline):
+    """Print the change of the headline numbers against a baseline result"""
+    def delta(label, new, old, unit):
+        if new is None or old is None:
+            return
+        change = f" ({(new - old) / old * 100:+.1f}%)" if old else ""
+        print(f"  {label:<16}{old:>10.2f} -> {new:>10.2f} {unit}{change}")
+
+    print(f"Compared with {baseline['environment'].get('commit') or 'baseline'}:")
+    delta("achieved fps", result["achieved_fps"], baseline["achieved_fps"], "fps")
+    for key in ("p50", "p95", "p99"):
+        new = (result["latency_ms"] or {}).get(key)
+        old = (baseline["latency_ms"] or {}).get(key)
+        delta(f"latency {key}", new, old, "ms")
+    for stage, values in result["stage_ms"].items():
+        old = (baseline["stage_ms"].get(stage) or {}).get("p50")
+        delta(f"{stage} p50", values["p50"] if values else None, old, "ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmark for /ws/image")
+    parser.add_argument("--url", default=DEFAULT_URL, help="WebSocket endpoint")
+    parser.add_argument("--videos", default=DEFAULT_VIDEO_DIR, help="directory with the .mp4 clips to replay")
+    parser.add_argument("--clients", type=int, default=1, help="concurrent simulated clients")
+    parser.add_argument("--fps", type=float, default=15.0, help="frames per second sent by each client")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds sent before measuring starts")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for replies after sending")
+    parser.add_argument("--mode", choices=("image", "landmarks"), default="image", help="server stream mode")
+    parser.add_argument("--adaptive", action="store_true", help="use the server's adaptive ROI inference")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="json", help="reply encoding to negotiate")
+    parser.add_argument("--width", type=int, default=640, help="resize frames to this width (0 keeps the size)")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of the sent frames")
+    parser.add_argument("--max-frames", type=int, default=300, help="frames loaded per clip (replayed in a loop)")
+    parser.add_argument("--server-pid", type=int, default=None, help="server process id, to measure RSS growth")
+    parser.add_argument("--out", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    latency = result["latency_ms"] or {}
+    print(f"{result['frames_answered']}/{result['frames_sent']} frames answered, "
+          f"{result['achieved_fps']:.1f} fps, latency p50 {latency.get('p50')} ms, "
+          f"p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms")
+    for stage, values in result["stage_ms"].items():
+        print(f"  {stage:<10} p50 {values['p50']:>8.2f} ms  p95 {values['p95']:>8.2f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Accuracy and cost of skip-frame inference on recorded clips.
+
+Usage (from the repository root):
+
+    python -m Backend.benchmark_cadence "Backend/Gait Detection" --max-error 6
+
+Every video is run twice through the pose landmarker: once with inference on
+every frame, once driven by a CadenceController as a cadence-mode stream
+would be (see cadence.py). The full run is the reference. For each clip the
+tool reports
+
+* the mean absolute difference of the stride and swing series in pixels,
+  over the frames with a pose in both runs,
+* the difference of the average stride / swing peak distances in frames,
+* the share of frames that got inference in cadence mode,
+* the CPU time of both runs.
+
+Exits with status 1 when the stride or swing error of any clip exceeds
+--max-error pixels.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from .batch_analysis import DEFAULT_MODEL_PATH, find_videos
+from .cadence import CadenceController
+from .gait_metrics import compute_gait_metrics
+
+
+def _landmarker(model_path):
+    import mediapipe as mp
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+
+    options = vision.PoseLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        output_segmentation_masks=False,
+        running_mode=mp.tasks.vision.RunningMode.VIDEO)
+    return vision.PoseLandmarker.create_from_options(options)
+
+
+def _detect(detector, frame, timestamp_ms):
+    import mediapipe as mp
+
+    result = detector.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=frame), timestamp_ms)
+    if not result.pose_landmarks:
+        return np.empty((0, 33, 4), dtype=np.float32)
+    return np.array([[
+        (landmark.x, landmark.y, landmark.z, landmark.visibility or 0.0)
+        for landmark in result.pose_landmarks[0]
+    ]], dtype=np.float32)
+
+
+def run_clip(path, model_path, cadence):
+    """(N, 33, 4) landmarks of a clip (NaN without a pose), its size, fps and CPU seconds"""
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    detector = _landmarker(model_path)
+    controller = CadenceController() if cadence else None
+
+    frames = []
+    cpu_started = time.process_time()
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            timestamp_ms = int((len(frames) / fps) * 1000)
+            if controller is None:
+                landmarks = _detect(detector, frame, timestamp_ms)
+            elif controller.should_infer():
+                started = time.perf_counter()
+                landmarks = _detect(detector, frame, timestamp_ms)
+                controller.observe(frame, landmarks, timestamp_ms, (time.perf_counter() - started) * 1000)
+            else:
+                landmarks = controller.predict(frame, timestamp_ms)
+            frames.append(landmarks[0] if len(landmarks) else np.full((33, 4), np.nan, dtype=np.float32))
+    finally:
+        capture.release()
+        detector.close()
+    cpu_seconds = time.process_time() - cpu_started
+
+    landmarks = np.array(frames, dtype=np.float32).reshape(-1, 33, 4)
+    inferred = controller.frames_inferred if controller else len(frames)
+    return landmarks, (width, height), fps, cpu_seconds, inferred
+
+
+def _peak_difference(reference, candidate):
+    if np.isnan(reference) or np.isnan(candidate):
+        return None
+    return round(abs(candidate - reference), 2)
+
+
+def compare_clip(path, model_path):
+    """Cadence mode against full inference on one clip"""
+    full, (width, height), fps, full_cpu, _ = run_clip(path, model_path, cadence=False)
+    skipped, _, _, cadence_cpu, inferred = run_clip(path, model_path, cadence=True)
+    timestamps_ms = np.arange(len(full)) * (1000 / fps)
+    reference = compute_gait_metrics(full, width, height, timestamps_ms)
+    candidate = compute_gait_metrics(skipped, width, height, timestamps_ms)
+
+    # Only frames with a pose in both runs can be compared
+    both = reference.detected & candidate.detected
+    stride_error = float(np.abs(reference.stride[both] - candidate.stride[both]).mean()) if both.any() else float('nan')
+    swing_error = float(np.abs(reference.swing[both] - candidate.swing[both]).mean()) if both.any() else float('nan')
+    return {
+        "video": path,
+        "frames": len(full),
+        "compared_frames": int(both.sum()),
+        "inferred_share": inferred / len(full) if len(full) else 0.0,
+        "stride_error_px": stride_error,
+        "swing_error_px": swing_error,
+        "avg_stride_difference": _peak_difference(reference.avg_stride, candidate.avg_stride),
+        "avg_swing_difference": _peak_difference(reference.avg_swing, candidate.avg_swing),
+        "full_cpu_seconds": full_cpu,
+        "cadence_cpu_seconds": cadence_cpu,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skip-frame inference against full inference")
+    parser.add_argument("directory", nargs="?", default="Backend/Gait Detection", help="directory containing the videos")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="pose landmarker .task file")
+    parser.add_argument("--max-error", type=float, default=6.0,
+                        help="largest acceptable mean stride/swing error in pixels")
+    args = parser.parse_args()
+
+    videos = find_videos(args.directory)
+    if not videos:
+        parser.error(f"No videos found in {args.directory}")
+
+    failed = False
+    for path in videos:
+        result = compare_clip(path, args.model)
+        print(f"{result['video']}: {result['frames']} frames ({result['compared_frames']} with a pose in both runs), "
+              f"{result['inferred_share']:.0%} inferred")
+        print(f"  stride error {result['stride_error_px']:.2f} px, swing error {result['swing_error_px']:.2f} px")
+        print(f"  avg stride / swing peak distance differs by "
+              f"{result['avg_stride_difference']} / {result['avg_swing_difference']} frames")
+        print(f"  CPU {result['full_cpu_seconds']:.1f}s full, {result['cadence_cpu_seconds']:.1f}s cadence")
+        errors = (result["stride_error_px"], result["swing_error_px"])
+        if any(np.isnan(error) or error > args.max_error for error in errors):
+            failed = True
+    if failed:
+        print(f"Stride/swing error above {args.max_error} px")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Micro-benchmark of the image handling around pose inference.
+
+Usage (from the repository root):
+
+    python -m Backend.benchmark_frame_path --frames 50
+
+Compares the previous frame path (decode to BGR, convert to RGB for
+MediaPipe, copy for drawing, convert back to BGR, copy again for the gait
+overlay, encode) with the single-buffer path in frame_codec.py (decode to
+RGB, annotate in place, convert in place before encoding) on synthetic 720p
+and 1080p JPEG frames. Inference itself is left out: both paths hand the
+same RGB array to mp.Image, which takes its own copy either way.
+
+For each path it reports the time per frame and the peak memory allocated
+while processing one frame (traced with tracemalloc, which sees NumPy and
+OpenCV array buffers), also expressed in full-frame buffers.
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from .frame_codec import decode_rgb, encode_rgb
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+ENCODE_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """A JPEG with gradients and noise, so decode and encode do realistic work"""
+    rng = np.random.default_rng(seed)
+    x, y = np.meshgrid(np.linspace(0, 255, width, dtype=np.float32), np.linspace(0, 255, height, dtype=np.float32))
+    image = np.stack([x, y, (x + y) / 2], axis=-1)
+    image += rng.normal(0, 12, image.shape).astype(np.float32)
+    _, buffer = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8), ENCODE_PARAMS)
+    return buffer.tobytes()
+
+
+def draw_overlay(frame):
+    """Stand-in for the landmark and stride/swing drawing (same in both paths)"""
+    height, width = frame.shape[:2]
+    for i in range(12):
+        start = (width * i // 12, height // 3)
+        end = (width * (i + 1) // 12, 2 * height // 3)
+        cv2.line(frame, start, end, (255, 0, 0), 3)
+        cv2.circle(frame, end, 4, (0, 0, 255), -1)
+
+
+def previous_path(jpeg):
+    """Frame path before frame_codec: three color conversions and two extra copies"""
+    img_bgr = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)  # for mp.Image
+    annotated_rgb = np.copy(rgb)  # draw_landmarks_on_image
+    draw_overlay(annotated_rgb)
+    annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
+    frame = annotated_bgr.copy()  # before process_gait_analysis
+    draw_overlay(frame)
+    _, buffer = cv2.imencode(".jpg", frame, ENCODE_PARAMS)
+    return buffer
+
+
+def single_buffer_path(jpeg):
+    """Current frame path: one decoded RGB buffer, annotated and converted in place"""
+    frame = decode_rgb(jpeg)
+    draw_overlay(frame)
+    draw_overlay(frame)
+    return encode_rgb(frame, ".jpg", ENCODE_PARAMS)
+
+
+def measure(path, jpeg, frames):
+    """Median ms per frame and peak bytes allocated while processing one frame"""
+    path(jpeg)  # warm up
+    times = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        path(jpeg)
+        times.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        path(jpeg)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return float(np.median(times)), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the frame decode/annotate/encode path")
+    parser.add_argument("--frames", type=int, default=50, help="frames timed per path and resolution")
+    args = parser.parse_args()
+
+    for name, (width, height) in RESOLUTIONS.items():
+        jpeg = synthetic_jpeg(width, height)
+        frame_bytes = width * height * 3
+        print(f"{name} ({width}x{height}, {frame_bytes / 1e6:.1f} MB per frame buffer)")
+        for label, path in (("previous", previous_path), ("single buffer", single_buffer_path)):
+            ms, peak = measure(path, jpeg, args.frames)
+            print(f"  {label:<14}{ms:8.2f} ms/frame   peak {peak / 1e6:7.1f} MB "
+                  f"({peak / frame_bytes:.1f} frame buffers)")
+
+
+if __name__ == "__main__":
+    main()
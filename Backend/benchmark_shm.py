@@ -0,0 +1,113 @@
+"""Benchmark of moving decoded frames to a worker process and back.
+
+Usage (from the repository root):
+
+    python -m Backend.benchmark_shm --frames 200
+
+Compares, for 720p and 1080p RGB frames, a round trip to a worker process
+that annotates the frame (one line drawn, standing in for the overlay):
+
+* queue: the frame array is put on a multiprocessing queue, pickled, copied
+  into the worker, annotated and pickled back;
+* shared ring: the frame is copied once into a SharedFrameRing slot (as the
+  gateway's decode would), only the slot index and shape cross the queues,
+  and the worker annotates the slot in place (see shm_ring.py).
+
+Reports the median and 95th percentile round trip per frame.
+"""
+import argparse
+import multiprocessing
+import time
+
+import cv2
+import numpy as np
+
+from .shm_ring import WORKER, SharedFrameRing, attach_worker_ring, worker_ring
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def _annotate(frame):
+    height, width = frame.shape[:2]
+    cv2.line(frame, (0, height // 2), (width - 1, height // 2), (255, 0, 0), 3)
+
+
+def _queue_worker(requests, results):
+    while (frame := requests.get()) is not None:
+        _annotate(frame)
+        results.put(frame)
+
+
+def _ring_worker(requests, results, ring_spec):
+    attach_worker_ring(ring_spec)
+    ring = worker_ring()
+    while (message := requests.get()) is not None:
+        slot, shape = message
+        frame = ring.frame(slot, shape, owner=WORKER)
+        _annotate(frame)
+        del frame
+        ring.give_back(slot)
+        results.put(slot)
+
+
+def _percentiles(times):
+    return float(np.median(times)), float(np.percentile(times, 95))
+
+
+def bench_queue(context, frame, frames):
+    requests, results = context.Queue(), context.Queue()
+    worker = context.Process(target=_queue_worker, args=(requests, results))
+    worker.start()
+    try:
+        times = []
+        for _ in range(frames + 5):
+            started = time.perf_counter()
+            requests.put(frame)
+            results.get()
+            times.append((time.perf_counter() - started) * 1000)
+        return _percentiles(times[5:])
+    finally:
+        requests.put(None)
+        worker.join()
+
+
+def bench_ring(context, frame, frames):
+    ring = SharedFrameRing(2, frame.nbytes)
+    requests, results = context.Queue(), context.Queue()
+    worker = context.Process(target=_ring_worker, args=(requests, results, ring.spec()))
+    worker.start()
+    try:
+        times = []
+        for _ in range(frames + 5):
+            started = time.perf_counter()
+            slot = ring.acquire()
+            np.copyto(ring.frame(slot, frame.shape), frame)
+            ring.hand_off(slot)
+            requests.put((slot, frame.shape))
+            results.get()
+            ring.release(slot)
+            times.append((time.perf_counter() - started) * 1000)
+        return _percentiles(times[5:])
+    finally:
+        requests.put(None)
+        worker.join()
+        ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue pickling vs shared-memory frame ring")
+    parser.add_argument("--frames", type=int, default=200, help="round trips timed per resolution and method")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    rng = np.random.default_rng(0)
+    for name, (width, height) in RESOLUTIONS.items():
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        print(f"{name} ({width}x{height}, {frame.nbytes / 1e6:.1f} MB per frame)")
+        for label, bench in (("queue", bench_queue), ("shared ring", bench_ring)):
+            median, p95 = bench(context, frame, args.frames)
+            print(f"  {label:<12} p50 {median:7.2f} ms   p95 {p95:7.2f} ms per round trip")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Skip-frame inference: full pose inference only every k-th frame.
+
+At 30-60 FPS consecutive poses barely differ, yet every frame used to pay
+for a full landmarker run. In cadence mode (see stream_config.py) a
+session's CadenceController decides per frame whether to run inference.
+In between, it predicts the landmarks:
+
+* every landmark moves on at the velocity measured between the last two
+  inferred frames;
+* the four keypoints gait analysis uses (elbows 13/14, ankles 27/28) are
+  then refined with pyramidal Lucas-Kanade optical flow from the previous
+  frame, on grayscale copies downscaled to at most flow_side pixels. A
+  keypoint whose flow fails keeps its predicted position.
+
+k is picked again after each inference from two signals:
+
+* motion: the speed of the gait keypoints in body heights per second.
+  Slow movement allows up to max_interval frames per inference, fast
+  movement brings k down to 1;
+* load: how much of the time between frames inference takes. A worker
+  that cannot keep up raises k, so frames are still answered instead of
+  dropped.
+
+python -m Backend.benchmark_cadence runs the bundled clips with full
+inference and in cadence mode and reports the stride/swing error and the
+share of frames inferred. With the defaults below, four of the five clips
+stay within 4 px of full inference on 49-79% of the inferences, but the
+elbows of walking.mp4 drift by about 10 px, so cadence mode stays off
+unless a stream asks for it.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from .gait_metrics import LEFT_ANKLE, LEFT_ELBOW, RIGHT_ANKLE, RIGHT_ELBOW
+
+GAIT_KEYPOINTS = [LEFT_ELBOW, RIGHT_ELBOW, LEFT_ANKLE, RIGHT_ANKLE]
+
+LK_PARAMS = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class CadenceController:
+    """Inference cadence and landmark prediction of one single-person stream"""
+
+    def __init__(self, max_interval=3, slow_motion=0.25, fast_motion=1.0, flow_side=320, min_visibility=0.5):
+        self.max_interval = max(1, max_interval)
+        self.slow_motion = slow_motion  # body heights per second allowing max_interval
+        self.fast_motion = fast_motion  # body heights per second needing every frame
+        self.flow_side = flow_side
+        self.min_visibility = min_visibility
+        self.interval = 1
+        self.frames_inferred = 0
+        self.frames_predicted = 0
+        self._since_inference = 0
+        self._landmarks = None  # (1, 33, 4) output of the previous frame
+        self._timestamp_ms = None  # of the previous frame
+        self._inferred = None  # (landmarks, timestamp_ms) of the last inferred frame
+        self._velocity = None  # (33, 3) per second
+        self._gray = None  # downscaled grayscale previous frame
+
+    def should_infer(self):
+        """Whether the next frame needs full inference"""
+        if self._landmarks is None or not len(self._landmarks):
+            return True
+        return self._since_inference + 1 >= self.interval
+
+    def observe(self, frame, landmarks, timestamp_ms, inference_ms):
+        """Take the landmarks of an inferred frame and pick the next interval"""
+        self.frames_inferred += 1
+        self._since_inference = 0
+        frame_ms = timestamp_ms - self._timestamp_ms if self._timestamp_ms is not None else None
+        self._velocity = None
+        if len(landmarks) and self._inferred is not None and len(self._inferred[0]):
+            previous, previous_ms = self._inferred
+            dt = (timestamp_ms - previous_ms) / 1000
+            if dt > 0:
+                self._velocity = (landmarks[0, :, :3] - previous[0, :, :3]) / dt
+
+        self.interval = self._next_interval(landmarks, frame_ms, inference_ms)
+        self._inferred = (landmarks, timestamp_ms)
+        self._remember(frame, landmarks, timestamp_ms)
+
+    def predict(self, frame, timestamp_ms):
+        """Landmarks of a skipped frame, (1, 33, 4) float32"""
+        self.frames_predicted += 1
+        self._since_inference += 1
+        predicted = self._landmarks.copy()
+        if self._velocity is not None:
+            predicted[0, :, :3] += self._velocity * ((timestamp_ms - self._timestamp_ms) / 1000)
+
+        gray = self._downscaled_gray(frame)
+        if self._gray is not None and self._gray.shape == gray.shape:
+            size = (gray.shape[1], gray.shape[0])
+            previous = self._landmarks[0, GAIT_KEYPOINTS, :2] * size
+            points, status, _ = cv2.calcOpticalFlowPyrLK(
+                self._gray, gray, previous.astype(np.float32).reshape(-1, 1, 2), None, **LK_PARAMS)
+            tracked = status.ravel() == 1
+            if tracked.any():
+                predicted[0, np.array(GAIT_KEYPOINTS)[tracked], :2] = points.reshape(-1, 2)[tracked] / size
+
+        self._landmarks = predicted
+        self._timestamp_ms = timestamp_ms
+        self._gray = gray
+        return predicted
+
+    def _remember(self, frame, landmarks, timestamp_ms):
+        self._landmarks = landmarks.astype(np.float32, copy=True)
+        self._timestamp_ms = timestamp_ms
+        self._gray = self._downscaled_gray(frame) if len(landmarks) else None
+
+    def _next_interval(self, landmarks, frame_ms, inference_ms):
+        if not len(landmarks) or self._velocity is None:
+            return 1
+
+        # Keypoint speed relative to the person's size, so distance to the camera does not matter
+        pose = landmarks[0]
+        visible = pose[:, 3] >= self.min_visibility
+        ys = pose[visible, 1] if visible.sum() >= 4 else pose[:, 1]
+        body_height = max(float(ys.max() - ys.min()), 1e-3)
+        speed = float(np.linalg.norm(self._velocity[GAIT_KEYPOINTS, :2], axis=1).max()) / body_height
+        share = (self.fast_motion - speed) / (self.fast_motion - self.slow_motion)
+        motion_interval = 1 + round(min(max(share, 0.0), 1.0) * (self.max_interval - 1))
+
+        # Inference slower than the frame rate: skip enough frames to keep up
+        load_interval = math.ceil(inference_ms / frame_ms) if frame_ms else 1
+        return min(self.max_interval, max(motion_interval, load_interval))
+
+    def _downscaled_gray(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.flow_side / max(height, width))
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        if scale < 1:
+            gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        return gray
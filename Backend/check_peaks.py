@@ -0,0 +1,58 @@
+"""Check StreamingPeakDetector against the batch getPeakDist.
+
+Usage (from the repository root):
+
+    python -m Backend.check_peaks
+
+Streams the sample swing and stride series of Gait Detection/analysis.py
+through a StreamingPeakDetector and compares its peaks with
+find_smoothed_peaks and its average peak distance with getPeakDist. Exits
+with status 1 on any difference.
+
+Matching peaks on these series do not mean the two agree on every input:
+see the limits listed in peaks.py.
+"""
+import sys
+
+import numpy as np
+
+from .peaks import StreamingPeakDetector, average_peak_distance, find_smoothed_peaks, getPeakDist
+
+# Same samples as Gait Detection/analysis.py
+SWING_LENGTHS = [73, 75, 72, 71, 72, 66, 69, 62, 52, 43, 37, 35, 35, 34, 35, 37, 38, 40, 40, 42, 50, 55, 58, 62, 65, 67, 72, 77, 79, 79, 78, 76, 76, 72, 69, 66, 62, 57, 54, 48, 40, 34, 26, 20, 15, 9, 7, 9, 5, 4, 4, 9, 14, 11, 21, 23, 25, 21, 25, 26, 32, 42, 46, 48, 50, 46, 50, 48, 48, 43, 42, 35, 28, 22, 17, 14, 7, -5, -8, -9, -11, -13, -14, -16, -17, -15, -17, -14, -13, -15, -15, -14, -12, -5, -9, -5, 9, 8, -3, -6, 0, 2, 6, 4, -8, 10, 10, 13, 11, -11, -12, -16, -23, -26, -30, -36, -39, -48, -56, -64, -63, -63, -62, -60, -57, -52, -47, -44, -40, -36, -35, -31, -29, -22, -16, -13, -11, -18, -15, -11, -17, -17, -22, -30, -30, -36, -39, -47, -53, -68, -81, -88, -92, -94, -94, -95, -96, -94, -90, -87, -83, -78, -71, -63, -53, -51, -47, -47, -35, -32, -26, -25, -21, -15, -12, 13, -13, 16, 10, 17, 13, 21, 30, 34, 44, 38, 41, 38, 35, 38, 37, 45, 44, 45, 19, 7, 20, 38, 32, 34, 13, 18]
+STRIDE_LENGTHS = [-34, -30, -23, -19, 15, 15, 20, 30, 40, 50, 60, 66, 69, 71, 72, 70, 68, 65, 60, 52, 43, 33, 23, 10, 4, -12, -30, -41, -51, -58, -61, -63, -63, -62, -60, -57, -53, -48, -41, -36, -31, -21, 21, 29, 39, 50, 61, 71, 76, 78, 77, 76, 74, 69, 63, 56, 46, 34, 24, 12, 5, -13, -31, -42, -55, -63, -67, -70, -70, -68, -67, -63, -59, -54, -48, -41, -34, -29, -22, 21, 28, 39, 50, 60, 67, 70, 70, 70, 67, 65, 59, 53, 45, 34, 19, 3, -5, -23, -37, -51, -67, -78, -85, -87, -87, -85, -79, -75, -68, -63, -55, -49, -41, -30, -18, 17, 26, 41, 50, 59, 64, 64, 64, 62, 59, 55, 44, -24, 16, 12, 6, -12, -28, -46, -60, -78, -93, -103, -105, -106, -107, -104, -98, -94, -86, -78, -66, -55, -48, -35, -20, -9, 14, 26, 41, 47, 52, 54, 54, 53, 50, 46, 40, 32, 21, 10, 6, -7, -9, -21, -32, -41, -49, -53, -49, -48, -44, -15, 27, -7, -14, -10, 15, 21, 19, 10, 9, 5, 3, 2, 2, 2, 2, 2, 2, 2, 2, 5, 4, 5, 4, 6]
+
+
+def stream_peaks(lengths):
+    """Peaks of a whole series fed to a StreamingPeakDetector one sample at a time"""
+    detector = StreamingPeakDetector()
+    peaks = []
+    for length in lengths:
+        peaks += detector.update(length)
+    peaks += detector.flush()
+    return peaks
+
+
+def check_series(name, lengths):
+    """Whether streaming and batch detection agree on a series, printing the result"""
+    streamed = stream_peaks(lengths)
+    batch = find_smoothed_peaks(lengths).tolist()
+    streamed_distance = average_peak_distance(streamed)
+    batch_distance = getPeakDist(lengths)
+    same_distance = streamed_distance == batch_distance or (np.isnan(streamed_distance) and np.isnan(batch_distance))
+    if streamed == batch and same_distance:
+        print(f"{name}: peaks {streamed} and average distance {batch_distance} match getPeakDist")
+        return True
+    print(f"{name}: streaming peaks {streamed} (average {streamed_distance}) "
+          f"differ from batch peaks {batch} (average {batch_distance})")
+    return False
+
+
+def main():
+    results = [check_series("swing", SWING_LENGTHS), check_series("stride", STRIDE_LENGTHS)]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Check ResultWriter against the SQLite stand-in across a resumed session.
+
+Usage (from the repository root):
+
+    python -m Backend.check_result_writer
+
+Streams a session through a SessionRegistry with a LandmarkStore, finishes
+it as an eviction would, acquires the same id again, streams and finishes
+that visit too, and checks what the SQLite tables hold afterwards:
+
+* one gait_sessions row covering both visits (frames, media duration and
+  start time of the first visit);
+* the first visit's gait_series rows unchanged by the second visit, and
+  the buckets of both visits in media time order without overlaps.
+
+Exits with status 1 if any check fails. No pose model is needed: frames are
+made-up landmarks and stride/swing lengths.
+"""
+import asyncio
+import sys
+import tempfile
+
+import numpy as np
+
+from .gait_session import SessionRegistry
+from .landmark_store import LandmarkStore
+from .result_writer import SERIES_TABLE, SESSIONS_TABLE, ResultWriter, SQLiteSink
+
+FRAMES_PER_VISIT = 45
+FRAME_MS = 1000 / 30
+
+
+def stream_visit(registry, writer, session_id, frames):
+    """Send frames to a session the way the server does, then finish it like an eviction"""
+    session = registry.acquire(session_id)
+    landmarks = np.zeros((1, 33, 4), dtype=np.float32)
+    for i in range(frames):
+        # Capture times restart with every connection, like performance.now() after a page reload
+        timestamp_ms = session.clock.stamp((i + 1) * FRAME_MS)
+        session.record_landmarks(timestamp_ms, landmarks, 640, 480)
+        stride_length = int(60 * np.sin(i / 5))
+        session.add_samples([stride_length], [-stride_length], [timestamp_ms])
+        session.frame_count += 1
+        writer.observe(session, {"stride_length": stride_length, "swing_length": -stride_length})
+    registry.release(session)
+    registry.remove(session_id)
+    writer.finish(session)
+    return session
+
+
+async def run_check():
+    """Failed checks (empty when everything holds)"""
+    sink = SQLiteSink(":memory:")
+    writer = ResultWriter(sink)
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        registry = SessionRegistry(store=LandmarkStore(root))
+        first = stream_visit(registry, writer, "s1", FRAMES_PER_VISIT)
+        await writer.flush()
+        first_buckets = sorted(sink.rows(SERIES_TABLE), key=lambda row: row["start_ms"])
+
+        second = stream_visit(registry, writer, "s1", FRAMES_PER_VISIT)
+        await writer.flush()
+        buckets = sorted(sink.rows(SERIES_TABLE), key=lambda row: row["start_ms"])
+        summaries = sink.rows(SESSIONS_TABLE)
+
+    if len(summaries) != 1:
+        failures.append(f"expected one gait_sessions row, found {len(summaries)}")
+    else:
+        summary = summaries[0]
+        if summary["frames"] != 2 * FRAMES_PER_VISIT:
+            failures.append(f"gait_sessions frames {summary['frames']}, expected {2 * FRAMES_PER_VISIT}")
+        if summary["duration_ms"] != second.clock.now_ms or second.clock.now_ms <= first.clock.now_ms:
+            failures.append(f"gait_sessions duration_ms {summary['duration_ms']} does not continue the first "
+                            f"visit ({first.clock.now_ms} ms)")
+        if second.created_at != first.created_at:
+            failures.append("the resumed session did not keep the first visit's start time")
+        if not summary["ended"]:
+            failures.append("gait_sessions row not marked as ended")
+
+    if buckets[:len(first_buckets)] != first_buckets:
+        failures.append("the second visit changed buckets of the first visit")
+    if sum(row["samples"] for row in buckets) != 2 * FRAMES_PER_VISIT:
+        failures.append(f"gait_series holds {sum(row['samples'] for row in buckets)} samples, "
+                        f"expected {2 * FRAMES_PER_VISIT}")
+    for previous, row in zip(buckets, buckets[1:]):
+        if row["start_ms"] <= previous["end_ms"]:
+            failures.append(f"bucket at {row['start_ms']} ms overlaps the one at {previous['start_ms']} ms")
+    return failures
+
+
+def main():
+    failures = asyncio.run(run_check())
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print(f"Two visits of {FRAMES_PER_VISIT} frames: one session row, buckets in order, first visit kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""Frame analysis: pose inference, gait measurement and annotation of one frame.
+
+These are the functions the frame workers run, on threads of the server
+process (see frame_workers.py) or in worker processes (see
+process_workers.py). Worker processes import this module, not main.py, so
+importing it must not have side effects: it opens no database, store or
+recording and starts no threads. The pose model files are read and the
+landmarkers created on first use, by the thread that uses them.
+"""
+import base64
+import math
+import os
+from typing import Any, NamedTuple
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe import solutions
+from mediapipe.framework.formats import landmark_pb2
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+from .frame_codec import decode_rgb, encode_rgb
+from .frame_protocol import CODEC_EXTENSIONS, CODEC_JPEG, CODEC_WEBP
+from .frame_workers import Landmarkers
+from .gait_metrics import (
+    LEFT_ANKLE, LEFT_ELBOW, RIGHT_ANKLE, RIGHT_ELBOW, cadence_from_period, pixel_coords, signed_distance)
+from .landmark_filter import SMOOTHED_PEAK_WINDOW
+from .peaks import WINDOW_SIZE
+from .person_tracker import PersonTracker
+from .pose_models import DEFAULT_MODEL_DIR, ModelCache
+from .profiling import StageTimer
+from .responses import FrameGaitMetrics
+from .shm_ring import WORKER, worker_ring
+
+# Pose model files are read once and shared by every landmarker
+models = ModelCache(os.environ.get("GAIT_MODEL_DIR", DEFAULT_MODEL_DIR))
+
+
+def create_detector(pose_options):
+    """Initialize a MediaPipe pose detector for a set of PoseModelOptions (per frame worker)"""
+    base_options = python.BaseOptions(model_asset_buffer=models.buffer(pose_options.model))
+    options = vision.PoseLandmarkerOptions(
+        base_options=base_options,
+        output_segmentation_masks=pose_options.segmentation,
+        min_pose_detection_confidence=pose_options.detection_confidence,
+        min_pose_presence_confidence=pose_options.presence_confidence,
+        min_tracking_confidence=pose_options.tracking_confidence,
+        num_poses=pose_options.num_poses,
+        running_mode=mp.tasks.vision.RunningMode.VIDEO)
+    return vision.PoseLandmarker.create_from_options(options)
+
+
+# Every frame worker thread (or worker process) keeps its own landmarkers, one per session
+landmarkers = Landmarkers(create_detector)
+
+
+def draw_landmarks_on_image(rgb_image, landmarks):
+    """Draw pose landmarks (a (num_poses, 33, 4) array) on an RGB image in place"""
+    annotated_image = rgb_image
+
+    # Loop through the detected poses to visualize.
+    for pose_landmarks in landmarks.tolist():
+        # Draw the pose landmarks.
+        pose_landmarks_proto = landmark_pb2.NormalizedLandmarkList()
+        pose_landmarks_proto.landmark.extend([
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z, _ in pose_landmarks
+        ])
+        solutions.drawing_utils.draw_landmarks(
+            annotated_image,
+            pose_landmarks_proto,
+            solutions.pose.POSE_CONNECTIONS,
+            solutions.drawing_styles.get_default_pose_landmarks_style())
+    return annotated_image
+
+
+def landmarks_to_array(detection_result):
+    """Pack detected poses into a compact (num_poses, 33, 4) float32 array of x, y, z, visibility"""
+    return np.array([
+        [(landmark.x, landmark.y, landmark.z, landmark.visibility or 0.0) for landmark in pose_landmarks]
+        for pose_landmarks in detection_result.pose_landmarks
+    ], dtype=np.float32).reshape(-1, 33, 4)
+
+
+# Overlay colors (frames are RGB while they are annotated)
+STRIDE_COLOR = (255, 0, 0)
+SWING_COLOR = (0, 0, 255)
+PERSON_COLOR = (255, 255, 0)
+
+
+def track_people(landmarks, session, width, height, timestamp_ms, smoothing=False):
+    """Give each pose a stable person id and update every person's gait (multi-pose streams)
+
+    With smoothing each person's pose goes through their own landmark filter.
+
+    Returns the landmarks reordered so the person tracked the longest comes
+    first, which keeps the session's own metrics and recording on one
+    person, and the PersonTracks in the same order.
+    """
+    if session.people is None:
+        session.people = PersonTracker(session.stride_lens.capacity, peak_window=session.stride_peaks.window_size)
+    people = session.people.update(landmarks)
+    if smoothing and len(people):
+        landmarks = np.concatenate([
+            person.smoother.update(landmarks[i:i + 1], timestamp_ms) for i, person in enumerate(people)
+        ])
+    session.people.add_gait(landmarks, people, width, height, timestamp_ms)
+    order = sorted(range(len(people)), key=lambda i: (-people[i].frames, people[i].person_id))
+    return landmarks[order], [people[i] for i in order]
+
+
+def draw_person_ids(frame, people):
+    """Label each tracked person with their id above their landmarks"""
+    height, width = frame.shape[:2]
+    for person in people:
+        x0, y0 = person.box[:2]
+        origin = (int(np.clip(x0, 0, 1) * width), max(20, int(y0 * height) - 10))
+        cv2.putText(frame, f"#{person.person_id}", origin, cv2.FONT_HERSHEY_SIMPLEX, 0.8, PERSON_COLOR, 2)
+
+
+def process_gait_analysis(frame, landmarks, session, timestamp_ms, fast_mode=False, annotate=True):
+    """Process gait analysis for a session and return annotated frame with metrics
+
+    landmarks is the (num_poses, 33, 4) array of the frame; gait is measured
+    on the first pose. timestamp_ms is the frame's media time, which turns
+    peak distances into periods and cadence. The RGB frame is annotated in
+    place; with annotate=False it is only used for its size and is not drawn
+    on.
+    """
+    metrics: FrameGaitMetrics = {}
+    
+    if len(landmarks) > 0:
+        height, width = frame.shape[:2]
+        pixels = pixel_coords(landmarks[:1], width, height)
+        points = pixels[0].astype(int)
+
+        # Foot landmarks for stride analysis
+        (left_foot_x, left_foot_y), (right_foot_x, right_foot_y) = points[[LEFT_ANKLE, RIGHT_ANKLE]].tolist()
+        stride_length = int(signed_distance(pixels, LEFT_ANKLE, RIGHT_ANKLE)[0])
+        session.stride_lens.append(stride_length)
+        session.sample_times.append(timestamp_ms)
+
+        # Draw foot landmarks and stride line
+        if annotate:
+            cv2.circle(frame, center=(left_foot_x, left_foot_y), radius=4, color=STRIDE_COLOR, thickness=-1)
+            cv2.circle(frame, center=(right_foot_x, right_foot_y), radius=4, color=STRIDE_COLOR, thickness=-1)
+            cv2.line(frame, (left_foot_x, left_foot_y), (right_foot_x, right_foot_y), STRIDE_COLOR, 3)
+
+        # Calculate average stride length (skip heavy computation in fast mode)
+        if not fast_mode:
+            session.stride_peaks.update(stride_length)
+            avgStrideLen = session.stride_peaks.average_distance()
+            stride_text = f"Stride: {int(avgStrideLen) if not math.isnan(avgStrideLen) else 'Analyzing...'}"
+        else:
+            stride_text = f"Stride: {stride_length}px (fast)"
+            avgStrideLen = float('nan')
+        
+        if annotate:
+            cv2.putText(frame, stride_text, (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, STRIDE_COLOR, 2)
+
+        # Elbow landmarks for swing analysis
+        (left_elbow_x, left_elbow_y), (right_elbow_x, right_elbow_y) = points[[LEFT_ELBOW, RIGHT_ELBOW]].tolist()
+        swing_length = int(signed_distance(pixels, LEFT_ELBOW, RIGHT_ELBOW)[0])
+        session.swing_lens.append(swing_length)
+        
+        # Draw elbow landmarks and swing line
+        if annotate:
+            cv2.circle(frame, center=(left_elbow_x, left_elbow_y), radius=4, color=SWING_COLOR, thickness=-1)
+            cv2.circle(frame, center=(right_elbow_x, right_elbow_y), radius=4, color=SWING_COLOR, thickness=-1)
+            cv2.line(frame, (left_elbow_x, left_elbow_y), (right_elbow_x, right_elbow_y), SWING_COLOR, 3)
+
+        # Calculate average swing length (skip heavy computation in fast mode)
+        if not fast_mode:
+            session.swing_peaks.update(swing_length)
+            avgSwingLen = session.swing_peaks.average_distance()
+            swing_text = f"Swing: {int(avgSwingLen) if not math.isnan(avgSwingLen) else 'Analyzing...'}"
+        else:
+            swing_text = f"Swing: {swing_length}px (fast)"
+            avgSwingLen = float('nan')
+            
+        if annotate:
+            cv2.putText(frame, swing_text, (30, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.8, SWING_COLOR, 2)
+
+        # Peak distances in real time, from the media time of each sample
+        stride_period, swing_period = session.periods_ms() if not fast_mode else (float('nan'), float('nan'))
+        steps_per_minute = cadence_from_period(stride_period)
+
+        # Store metrics
+        metrics = {
+            "stride_length": stride_length,
+            "swing_length": swing_length,
+            "avg_stride": avgStrideLen if not math.isnan(avgStrideLen) else None,
+            "avg_swing": avgSwingLen if not math.isnan(avgSwingLen) else None,
+            "stride_period_ms": round(stride_period, 1) if not math.isnan(stride_period) else None,
+            "swing_period_ms": round(swing_period, 1) if not math.isnan(swing_period) else None,
+            "cadence": round(steps_per_minute, 1) if not math.isnan(steps_per_minute) else None,
+            "timestamp_ms": timestamp_ms,
+            "frame_count": session.frame_count,
+            "fast_mode": fast_mode
+        }
+
+    session.frame_count += 1
+    return frame, metrics
+
+
+def decode_data_url(image_data):
+    """Strip an optional data URL prefix and decode the base64 payload"""
+    if "data:image/" in image_data:
+        image_b64 = image_data.split(",")[1]
+    else:
+        image_b64 = image_data
+    return base64.b64decode(image_b64)
+
+
+def detect_landmarks(img_rgb, session, timer, config, timestamp_ms):
+    """Run this worker's landmarker on a frame (on a crop around the person in adaptive mode)"""
+    inference_rgb = img_rgb
+    if config.adaptive:
+        inference_rgb = session.roi.prepare(img_rgb)
+        timer.lap("roi")
+
+    # Create MediaPipe Image and detect pose landmarks with this worker's detector
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=inference_rgb)
+    timer.lap("mp_image")
+    detection_result = landmarkers.detect_for_video(mp_image, session.session_id, timestamp_ms, config.pose_options())
+    timer.lap("inference")
+    landmarks = landmarks_to_array(detection_result)
+    if config.adaptive:
+        # Back to coordinates normalized to the full frame
+        landmarks = session.roi.to_frame(landmarks)
+    return landmarks
+
+
+def analyze_frame(img_rgb, session, timer, config, timestamp_ms, annotate=True):
+    """Run pose detection and gait analysis on an RGB frame.
+
+    timestamp_ms is the frame's media time (see media_clock.py). Returns the frame annotated in place (None when annotate is False), the
+    gait metrics and the detected landmarks as an array. Stage times are
+    recorded on the StageTimer. The stream config picks the landmarker and,
+    in adaptive mode, runs inference on a downscaled crop around the
+    tracked person (see roi.py). With num_poses > 1 every person is tracked
+    and measured separately (see person_tracker.py). With smoothing the
+    landmarks are filtered over time before gait analysis (see
+    landmark_filter.py). In cadence mode only some frames get inference; the
+    landmarks of the others are predicted (see cadence.py).
+    """
+    # Cadence mode follows one person; multi-pose streams infer every frame
+    cadence = config.cadence and config.num_poses == 1
+    predicted = cadence and not session.cadence.should_infer()
+    if predicted:
+        landmarks = session.cadence.predict(img_rgb, timestamp_ms)
+        timer.lap("predict")
+    else:
+        landmarks = detect_landmarks(img_rgb, session, timer, config, timestamp_ms)
+        if cadence:
+            session.cadence.observe(img_rgb, landmarks, timestamp_ms, timer.timings["inference"])
+            timer.lap("cadence")
+    height, width = img_rgb.shape[:2]
+    people = None
+    session.set_peak_window(SMOOTHED_PEAK_WINDOW if config.smoothing else WINDOW_SIZE)
+    if config.num_poses > 1:
+        landmarks, people = track_people(landmarks, session, width, height, timestamp_ms, config.smoothing)
+        timer.lap("track")
+    elif config.smoothing:
+        landmarks = session.smoother.update(landmarks, timestamp_ms)
+        timer.lap("smooth")
+    session.record_landmarks(timestamp_ms, landmarks, width, height)
+    timer.lap("record")
+
+    if not annotate:
+        # Landmarks-only clients draw the overlay themselves
+        _, gait_metrics = process_gait_analysis(img_rgb, landmarks, session, timestamp_ms, annotate=False)
+        timer.lap("gait")
+    else:
+        # Draw landmarks on the decoded frame itself (MediaPipe holds its own copy)
+        draw_landmarks_on_image(img_rgb, landmarks)
+        if people:
+            draw_person_ids(img_rgb, people)
+        timer.lap("draw")
+
+        # Process gait analysis and add metrics to frame
+        img_rgb, gait_metrics = process_gait_analysis(img_rgb, landmarks, session, timestamp_ms)
+        timer.lap("gait")
+
+    if people is not None:
+        gait_metrics["people"] = [person.gait_metrics for person in people]
+    elif config.smoothing and session.smoother.filled:
+        gait_metrics["gap_filled"] = True
+    if predicted and gait_metrics:
+        gait_metrics["predicted"] = True
+    return (img_rgb if annotate else None), gait_metrics, landmarks
+
+
+def encode_frame(frame, codec=CODEC_JPEG):
+    """Encode a processed RGB frame as JPEG (default) or WebP (converts it to BGR in place)"""
+    if codec == CODEC_WEBP:
+        encode_param = [int(cv2.IMWRITE_WEBP_QUALITY), 70]
+    else:
+        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]  # Reduce quality for faster processing
+    return encode_rgb(frame, CODEC_EXTENSIONS[codec], encode_param)
+
+
+class FrameResult(NamedTuple):
+    image: Any  # encoded frame (bytes or data URL), None in landmarks mode
+    gait_metrics: dict
+    width: int
+    height: int
+    landmarks: np.ndarray  # (num_poses, 33, 4)
+    timer: StageTimer  # per-stage processing times of this frame
+
+
+def process_base64_image(image_data, session, config, timestamp_ms):
+    """Worker: decode a base64 image, analyze it and return the result as a data URL"""
+    timer = StageTimer()
+    image_bytes = decode_data_url(image_data)
+    timer.lap("base64_decode")
+    img_rgb = decode_rgb(image_bytes)
+    height, width = img_rgb.shape[:2]
+    timer.lap("decode")
+
+    if config.mode == "landmarks":
+        _, gait_metrics, landmarks = analyze_frame(img_rgb, session, timer, config, timestamp_ms, annotate=False)
+        return FrameResult(None, gait_metrics, width, height, landmarks, timer)
+
+    processed_frame, gait_metrics, landmarks = analyze_frame(img_rgb, session, timer, config, timestamp_ms)
+
+    # Convert processed frame back to base64
+    buffer = encode_frame(processed_frame)
+    timer.lap("encode")
+    processed_b64 = base64.b64encode(buffer).decode('utf-8')
+    timer.lap("base64_encode")
+    return FrameResult(f"data:image/jpeg;base64,{processed_b64}", gait_metrics, width, height, landmarks, timer)
+
+
+def process_binary_payload(payload, codec, session, config, timestamp_ms):
+    """Worker: decode raw JPEG/WebP bytes, analyze and re-encode them"""
+    timer = StageTimer()
+    # Decode straight from the message buffer
+    img_rgb = decode_rgb(payload)
+    height, width = img_rgb.shape[:2]
+    timer.lap("decode")
+
+    if config.mode == "landmarks":
+        _, gait_metrics, landmarks = analyze_frame(img_rgb, session, timer, config, timestamp_ms, annotate=False)
+        return FrameResult(None, gait_metrics, width, height, landmarks, timer)
+
+    processed_frame, gait_metrics, landmarks = analyze_frame(img_rgb, session, timer, config, timestamp_ms)
+    encoded = encode_frame(processed_frame, codec)
+    timer.lap("encode")
+    return FrameResult(encoded, gait_metrics, width, height, landmarks, timer)
+
+
+def analyze_shared_frame(slot, shape, session, timer, config, timestamp_ms, annotate):
+    """Worker process: analyze the frame in a frame ring slot, annotating it in place"""
+    timer.lap("dispatch")
+    ring = worker_ring()
+    try:
+        img_rgb = ring.frame(slot, shape, owner=WORKER)
+        _, gait_metrics, landmarks = analyze_frame(img_rgb, session, timer, config, timestamp_ms, annotate)
+        del img_rgb  # no view of the slot may outlive the hand-back
+        return gait_metrics, landmarks, timer
+    finally:
+        ring.give_back(slot)
@@ -0,0 +1,41 @@
+"""Image decode and encode for the frame path.
+
+MediaPipe wants RGB, the drawing helpers work on any 3-channel array and
+OpenCV's encoder wants BGR. Frames used to be decoded to RGB by PIL, turned
+into BGR for OpenCV, back into RGB for MediaPipe, copied for drawing, turned
+into BGR again and copied once more before the gait overlay: four full-frame
+copies and three color conversions per frame.
+
+The frame path now holds a single RGB buffer: it is decoded straight into RGB
+(cv2.IMREAD_COLOR_RGB where OpenCV has it, otherwise an in-place conversion
+of the decoded BGR image), annotated in place, and converted to BGR in place
+once, right before encoding.
+"""
+import cv2
+import numpy as np
+
+# OpenCV >= 4.10 can decode straight into RGB
+IMREAD_COLOR_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+
+
+def decode_rgb(buffer):
+    """Decode JPEG/PNG/WebP bytes (any buffer) into a writeable RGB array"""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if IMREAD_COLOR_RGB is not None:
+        frame = cv2.imdecode(data, IMREAD_COLOR_RGB)
+    else:
+        frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if frame is not None:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+    if frame is None:
+        raise ValueError("Could not decode image payload")
+    return frame
+
+
+def encode_rgb(frame, extension, params):
+    """Encode an RGB frame with cv2.imencode; the frame is converted to BGR in place"""
+    cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=frame)
+    ok, buffer = cv2.imencode(extension, frame, params)
+    if not ok:
+        raise ValueError(f"Could not encode frame as {extension}")
+    return buffer
@@ -0,0 +1,79 @@
+"""Binary frame protocol for the /ws/image WebSocket.
+
+Binary clients send each camera frame as a single binary message made of a
+fixed 20-byte little-endian header followed by the raw encoded image bytes
+(no base64, no JSON):
+
+    offset  size  field
+    0       2     magic, always b"GF"
+    2       1     protocol version (1)
+    3       1     codec (1 = JPEG, 2 = WebP)
+    4       2     width in pixels (0 if unknown)
+    6       2     height in pixels (0 if unknown)
+    8       4     frame id, echoed back by the server
+    12      8     capture timestamp in milliseconds (float64, 0 if unknown)
+
+The capture timestamps place the frames on the session's media clock (see
+media_clock.py) and are echoed back unchanged. The server answers with the annotated frame in the same format, followed by a
+compact JSON text message carrying the gait metrics for that frame id. In
+landmarks mode (see stream_config.py) the reply uses codec 3 and its payload
+is a little-endian float32 array of shape (num_poses, 33, 4) holding x, y, z
+and visibility for each pose landmark instead of an image.
+"""
+import struct
+from typing import NamedTuple
+
+FRAME_MAGIC = b"GF"
+FRAME_VERSION = 1
+
+CODEC_JPEG = 1
+CODEC_WEBP = 2
+CODEC_LANDMARKS = 3  # server replies only, see stream_config.py
+
+# File extension passed to cv2.imencode for each codec
+CODEC_EXTENSIONS = {
+    CODEC_JPEG: ".jpg",
+    CODEC_WEBP: ".webp",
+}
+
+FRAME_HEADER = struct.Struct("<2sBBHHId")
+
+
+class FrameHeader(NamedTuple):
+    frame_id: int
+    timestamp_ms: float
+    codec: int
+    width: int
+    height: int
+
+
+def unpack_frame(message):
+    """Split a binary frame message into its header and a zero-copy view of the payload"""
+    if len(message) < FRAME_HEADER.size:
+        raise ValueError(f"Binary frame too short: {len(message)} bytes")
+
+    magic, version, codec, width, height, frame_id, timestamp_ms = FRAME_HEADER.unpack_from(message)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Binary frame has an invalid magic number")
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame protocol version {version}")
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError(f"Unsupported frame codec {codec}")
+
+    header = FrameHeader(frame_id, timestamp_ms, codec, width, height)
+    return header, memoryview(message)[FRAME_HEADER.size:]
+
+
+def pack_frame(header, payload):
+    """Build a binary frame message from a header and encoded image bytes"""
+    prefix = FRAME_HEADER.pack(
+        FRAME_MAGIC,
+        FRAME_VERSION,
+        header.codec,
+        header.width,
+        header.height,
+        header.frame_id & 0xFFFFFFFF,
+        header.timestamp_ms,
+    )
+    # bytes.join accepts any buffer (e.g. the ndarray from cv2.imencode) and copies once
+    return b"".join((prefix, payload))
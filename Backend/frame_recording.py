@@ -0,0 +1,174 @@
+"""Recordings of the frames clients send to /ws/image.
+
+With GAIT_RECORD_DIR set, the server writes every message a connection
+sends (frames and config changes) to one recording file per connection,
+<session_id>-<unix ms>.gfr. python -m Backend.replay feeds a recording
+through the server's frame handlers again (see replay.py), so a session seen
+in production can be reproduced and profiled offline. Recording costs disk,
+not latency: records go through a 1 MB write buffer on the event loop and
+reach the file in large writes.
+
+A recording is a short file header followed by records:
+
+    file header   4s magic b"GFRC", B version (1)
+    record        B kind, d arrival ms, d capture ms, I payload length
+                  followed by the payload
+
+kind is one of
+
+    KIND_BINARY  a binary frame message as received, header included
+                 (see frame_protocol.py)
+    KIND_JSON    the image of a JSON frame message, base64-decoded
+    KIND_BASE64  a bare base64/data URL text frame, base64-decoded
+    KIND_CONFIG  the connection's StreamConfig as JSON, written when the
+                 connection opens and after every config change
+
+Image payloads of text frames are stored decoded, a quarter smaller than
+their base64 text; a payload that is not valid base64 is kept as its text
+with the RAW_TEXT bit set in kind, so the replay fails on it the same way.
+arrival ms counts from the start of the recording. capture ms is the
+capture time a JSON frame carried (see media_clock.py), NaN otherwise;
+binary frames carry theirs in their own header.
+"""
+import binascii
+import math
+import os
+import struct
+import time
+from typing import NamedTuple
+
+import orjson
+
+from .frame_protocol import FRAME_MAGIC
+
+RECORDING_MAGIC = b"GFRC"
+RECORDING_VERSION = 1
+RECORDING_EXTENSION = ".gfr"
+
+FILE_HEADER = struct.Struct("<4sB")
+RECORD_HEADER = struct.Struct("<BddI")
+
+KIND_BINARY = 1
+KIND_JSON = 2
+KIND_BASE64 = 3
+KIND_CONFIG = 4
+RAW_TEXT = 0x80
+
+# IngestedFrame.kind -> record kind
+FRAME_KINDS = {"binary": KIND_BINARY, "json": KIND_JSON, "base64": KIND_BASE64}
+
+
+class Record(NamedTuple):
+    kind: int
+    arrival_ms: float
+    capture_ms: float | None
+    payload: bytes
+    raw_text: bool = False
+
+    def text(self):
+        """Payload of a text frame as the base64 text the client sent (without the data URL prefix)"""
+        if self.raw_text:
+            return self.payload.decode()
+        return binascii.b2a_base64(self.payload, newline=False).decode()
+
+    def config(self):
+        return orjson.loads(self.payload)
+
+
+class FrameRecorder:
+    """Appends one connection's messages to a recording file"""
+
+    def __init__(self, path, buffer_bytes=1 << 20):
+        self.path = path
+        self._file = open(path, "wb", buffering=buffer_bytes)
+        self._file.write(FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        self._started = time.perf_counter()
+        self.frames = 0
+
+    def frame(self, kind, payload, received_at, capture_ms=None):
+        """Record a frame; kind and received_at as in IngestedFrame, payload as received"""
+        record_kind = FRAME_KINDS[kind]
+        if kind != "binary":
+            # Text frames: store the image bytes, not their base64 text
+            payload = payload if isinstance(payload, str) else str(payload)
+            try:
+                text = payload.split(",")[1] if "data:image/" in payload else payload
+                payload = binascii.a2b_base64(text)
+            except (binascii.Error, IndexError):
+                record_kind |= RAW_TEXT
+                payload = payload.encode()
+        self.write(record_kind, (received_at - self._started) * 1000, capture_ms, payload)
+        self.frames += 1
+
+    def config(self, options, received_at=None):
+        """Record the connection's stream options (StreamConfig.to_dict())"""
+        if received_at is None:
+            received_at = time.perf_counter()
+        self.write(KIND_CONFIG, (received_at - self._started) * 1000, None, orjson.dumps(options))
+
+    def write(self, kind, arrival_ms, capture_ms, payload):
+        """Append one record as is"""
+        if self._file is None:
+            raise ValueError("FrameRecorder is closed")
+        capture_ms = float("nan") if capture_ms is None else capture_ms
+        self._file.write(RECORD_HEADER.pack(kind, arrival_ms, capture_ms, len(payload)))
+        self._file.write(payload)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RecordingDirectory:
+    """Where connections are recorded (GAIT_RECORD_DIR)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def recorder(self, session_id):
+        """Start recording a new connection of a session"""
+        if not session_id or os.sep in session_id or session_id.startswith("."):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{session_id}-{int(time.time() * 1000)}{RECORDING_EXTENSION}"
+        return FrameRecorder(os.path.join(self.root, name))
+
+
+def read_recording(path):
+    """Yield the Records of a recording file in order; a torn last record is ignored"""
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a frame recording")
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {version}")
+
+        while len(prefix := f.read(RECORD_HEADER.size)) == RECORD_HEADER.size:
+            kind, arrival_ms, capture_ms, length = RECORD_HEADER.unpack(prefix)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield Record(kind & ~RAW_TEXT, arrival_ms, None if math.isnan(capture_ms) else capture_ms,
+                         payload, bool(kind & RAW_TEXT))
+
+
+def write_recording(path, messages, config=None):
+    """Write binary frame messages (e.g. from a video, see replay.py) as a recording
+
+    messages yields (arrival_ms, message) pairs of packed binary frames.
+    """
+    recorder = FrameRecorder(path)
+    try:
+        if config is not None:
+            recorder.write(KIND_CONFIG, 0.0, None, orjson.dumps(config))
+        for arrival_ms, message in messages:
+            if not message.startswith(FRAME_MAGIC):
+                raise ValueError("Only binary frame messages can be written to a recording")
+            recorder.write(KIND_BINARY, arrival_ms, None, message)
+            recorder.frames += 1
+    finally:
+        recorder.close()
@@ -0,0 +1,96 @@
+"""Worker threads for CPU-bound frame processing.
+
+Decoding, pose detection, drawing and encoding used to run inside the async
+WebSocket handler and stalled every other client on the event loop while a
+frame was processed. FrameWorkerPool runs that work on a fixed number of
+worker threads instead (MediaPipe and OpenCV release the GIL while they
+work), so the event loop only does I/O.
+
+Landmarkers are not shared between sessions. In VIDEO mode a landmarker
+tracks the pose from one frame to the next and requires increasing
+timestamps, so a landmarker fed frames of two sessions would carry one
+person's pose into the other's frames, and every session's media clock
+starts at 0 (see media_clock.py). Landmarkers therefore keeps one
+landmarker per session and set of options (model tier, masks, confidences)
+on each worker thread. A session is pinned to one worker, so its frames
+reach its landmarker in order. Each thread keeps at most max_detectors of
+them, closing the least recently used; a session whose landmarker was
+closed gets a fresh one and its tracking starts over. forget() closes a
+session's landmarkers once the session is gone. Landmarkers is separate
+from the pool so worker processes (see process_workers.py) use it without
+a thread pool.
+"""
+import asyncio
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Landmarkers:
+    """Per-thread PoseLandmarkers, one per session and set of options"""
+
+    def __init__(self, create_detector, max_detectors=8):
+        self.max_detectors = max(1, max_detectors)
+        self._create_detector = create_detector  # called with the options of the landmarker
+        self._local = threading.local()
+
+    def detect_for_video(self, mp_image, session_id, timestamp_ms, options):
+        """Detect pose landmarks with the calling thread's landmarker for this session and options"""
+        local = self._local
+        if not hasattr(local, "detectors"):
+            local.detectors = OrderedDict()  # (session id, options) -> [landmarker, last timestamp]
+
+        key = (session_id, options)
+        entry = local.detectors.get(key)
+        if entry is None:
+            entry = local.detectors[key] = [self._create_detector(options), -1]
+            while len(local.detectors) > self.max_detectors:
+                _, (evicted, _) = local.detectors.popitem(last=False)
+                evicted.close()
+        local.detectors.move_to_end(key)
+
+        # Session clocks increase strictly; clamping only guards the landmarker against misuse
+        detector, last_timestamp_ms = entry
+        timestamp_ms = entry[1] = max(int(timestamp_ms), last_timestamp_ms + 1)
+        return detector.detect_for_video(mp_image, timestamp_ms)
+
+    def forget(self, session_id):
+        """Close the calling thread's landmarkers of a session"""
+        detectors = getattr(self._local, "detectors", None)
+        if not detectors:
+            return
+        for key in [key for key in detectors if key[0] == session_id]:
+            detector, _ = detectors.pop(key)
+            detector.close()
+
+
+class FrameWorkerPool:
+    """Fixed set of single-threaded workers; their landmarkers live in a Landmarkers"""
+
+    def __init__(self, num_workers):
+        if num_workers < 1:
+            raise ValueError("FrameWorkerPool needs at least one worker")
+        self.num_workers = num_workers
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"frame-worker-{i}")
+            for i in range(num_workers)
+        ]
+
+    def worker_index(self, session_id):
+        """Worker a session is pinned to (stable for the life of the process)"""
+        return zlib.crc32(session_id.encode()) % self.num_workers
+
+    async def run(self, session, fn, *args):
+        """Run fn(*args) on the session's worker without blocking the event loop"""
+        executor = self._executors[self.worker_index(session.session_id)]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+
+    def submit(self, session_id, fn, *args):
+        """Run fn(*args) on a session's worker without waiting for it (e.g. Landmarkers.forget)"""
+        return self._executors[self.worker_index(session_id)].submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        for executor in self._executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,100 @@
+"""Vectorized gait metrics over landmark arrays.
+
+The live server, the batch analysis and the stored-session graphs all derive
+the same measurements from pose landmarks. This module computes them for a
+whole (N, 33, 4) array of x, y, z, visibility landmarks at once with NumPy
+instead of looping over landmark objects one frame at a time:
+
+stride
+    signed pixel distance between the ankles (27/28)
+swing
+    signed pixel distance between the elbows (13/14)
+
+Both are truncated to whole pixels like the original per-frame code, and are
+negative when the right landmark is further right in the image than the
+left one. Frames without a pose are NaN in the landmarks and in every
+series. Peaks and cadence are found on the frames that have a pose.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .peaks import average_peak_distance, find_smoothed_peaks
+
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+
+
+def pixel_coords(landmarks, width, height):
+    """(N, 33, 2) pixel coordinates, truncated like int(landmark.x * width)
+
+    width and height are either the frame size of all frames or one value
+    per frame.
+    """
+    # float64 so the products truncate exactly like the per-landmark Python code did
+    scale = np.stack(np.broadcast_arrays(width, height), axis=-1).astype(np.float64)
+    if scale.ndim == 2:
+        scale = scale[:, None, :]
+    return np.trunc(landmarks[..., :2] * scale)
+
+
+def signed_distance(pixels, left, right):
+    """Whole-pixel distance between two landmarks, negative when right is right of left"""
+    delta = pixels[:, right] - pixels[:, left]
+    length = np.trunc(np.hypot(delta[:, 0], delta[:, 1]))
+    return np.where(pixels[:, right, 0] > pixels[:, left, 0], -length, length)
+
+
+def gait_series(landmarks, width, height):
+    """Signed stride (ankles) and swing (elbows) lengths in pixels per frame"""
+    pixels = pixel_coords(landmarks, width, height)
+    return signed_distance(pixels, LEFT_ANKLE, RIGHT_ANKLE), signed_distance(pixels, LEFT_ELBOW, RIGHT_ELBOW)
+
+
+def cadence(peaks, timestamps_ms):
+    """Steps per minute from the peaks of the stride series (nan without two peaks)
+
+    Every stride peak starts a new gait cycle of two steps.
+    """
+    if len(peaks) < 2:
+        return float('nan')
+    return cadence_from_period(np.mean(np.diff(np.asarray(timestamps_ms)[peaks])))
+
+
+def cadence_from_period(cycle_ms):
+    """Steps per minute for an average time between stride peaks (nan if unknown)"""
+    return 2 * 60000 / cycle_ms if cycle_ms > 0 else float('nan')
+
+
+class GaitMetrics(NamedTuple):
+    stride: np.ndarray  # (N,) signed stride length per frame, NaN without a pose
+    swing: np.ndarray  # (N,) signed swing length per frame, NaN without a pose
+    detected: np.ndarray  # (N,) True where a pose was found
+    stride_peaks: np.ndarray  # peak indices into the detected frames
+    swing_peaks: np.ndarray
+    avg_stride: float  # average distance between the last stride peaks in frames (nan if unknown)
+    avg_swing: float
+    cadence: float  # steps per minute (nan if unknown)
+
+
+def compute_gait_metrics(landmarks, width, height, timestamps_ms):
+    """All gait metrics of a recording in one pass over its landmark array"""
+    stride, swing = gait_series(landmarks, width, height)
+    detected = ~np.isnan(stride)
+    if detected.any():
+        stride_peaks = find_smoothed_peaks(stride[detected])
+        swing_peaks = find_smoothed_peaks(swing[detected])
+    else:
+        stride_peaks = swing_peaks = np.empty(0, dtype=np.intp)
+    return GaitMetrics(
+        stride=stride,
+        swing=swing,
+        detected=detected,
+        stride_peaks=stride_peaks,
+        swing_peaks=swing_peaks,
+        avg_stride=float(average_peak_distance(stride_peaks)),
+        avg_swing=float(average_peak_distance(swing_peaks)),
+        cadence=float(cadence(stride_peaks, np.asarray(timestamps_ms)[detected])),
+    )
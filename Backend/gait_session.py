@@ -0,0 +1,293 @@
+"""Per-connection gait analysis state.
+
+Each WebSocket client gets its own GaitSession holding a bounded history of
+stride and swing lengths with the media time of every sample, and its own
+frame clock (see media_clock.py), so concurrent patients no longer share (and
+corrupt) module-level lists. Peak distances are turned into stride/swing
+periods in milliseconds through those times (peak_period_ms). Sessions live in a
+SessionRegistry that evicts them once they have been idle for too long.
+
+When the registry has a LandmarkStore, every session also records its
+landmark stream there (see landmark_store.py): the landmarks gait analysis
+used, i.e. after smoothing for streams that smooth them. A session created
+for an id that already has a recording (the client came back after its
+session was evicted, or the server restarted) resumes its frame index,
+media time and start time, so the recording and the saved results (see
+result_writer.py) continue instead of starting over at 0.
+
+export_state()/load_state() turn the histories and frame count into plain
+data and back, so a session can be handed to a frame worker process and
+rebuilt there after the process restarts (see process_workers.py).
+"""
+import math
+import re
+import time
+import uuid
+
+import numpy as np
+
+from .cadence import CadenceController
+from .landmark_filter import LandmarkSmoother
+from .media_clock import MediaClock
+from .peaks import WINDOW_SIZE, StreamingPeakDetector, average_peak_distance
+from .roi import RoiTracker
+
+
+class RingBuffer:
+    """Fixed-capacity FIFO of numbers backed by a NumPy array.
+
+    Every value is written twice (at i and i + capacity) so the most recent
+    values are always one contiguous slice and can be read without copying.
+    """
+
+    def __init__(self, capacity, dtype=np.int32):
+        if capacity <= 0:
+            raise ValueError("RingBuffer capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # index of the oldest value
+        self._size = 0
+        self.total = 0  # number of values ever appended
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        """Add a value, overwriting the oldest one when full"""
+        if self._size < self.capacity:
+            index = (self._head + self._size) % self.capacity
+            self._size += 1
+        else:
+            index = self._head
+            self._head = (self._head + 1) % self.capacity
+        self._data[index] = value
+        self._data[index + self.capacity] = value
+        self.total += 1
+
+    def values(self):
+        """Read-only view of all buffered values, oldest first"""
+        view = self._data[self._head:self._head + self._size]
+        view.flags.writeable = False
+        return view
+
+    def last(self, n):
+        """Read-only view of the newest n values, oldest first"""
+        n = min(n, self._size)
+        return self.values()[self._size - n:]
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def since(self, total):
+        """Values appended after the buffer had seen `total` values (at most the whole buffer)"""
+        return self.last(self.total - total)
+
+
+def peak_period_ms(detector, sample_times, origin=0):
+    """Average time between a peak detector's last peaks in ms (nan if unknown)
+
+    Peak indices count samples from `origin`, the number of samples
+    sample_times had seen when the detector started. Peaks older than the
+    buffered history are left out.
+    """
+    first = sample_times.total - len(sample_times)
+    positions = np.asarray(detector.recent_peaks, dtype=np.int64) + origin - first
+    return average_peak_distance(sample_times.values()[positions[positions >= 0]])
+
+
+def replay_peaks(stride_lens, swing_lens, window_size):
+    """New stride and swing peak detectors with the given window, fed the buffered history
+
+    Returns the two detectors and their peak origin (see peak_period_ms).
+    """
+    stride = stride_lens.values().tolist()
+    swing = swing_lens.values().tolist()
+    stride_peaks = StreamingPeakDetector(window_size)
+    swing_peaks = StreamingPeakDetector(window_size)
+    for stride_length, swing_length in zip(stride, swing):
+        stride_peaks.update(stride_length)
+        swing_peaks.update(swing_length)
+    return stride_peaks, swing_peaks, stride_lens.total - len(stride)
+
+
+class GaitSession:
+    """Gait analysis state for a single client"""
+
+    def __init__(self, session_id, history_size=1800, recorder=None):
+        self.session_id = session_id
+        self.frame_count = 0
+        self.stride_lens = RingBuffer(history_size)
+        self.swing_lens = RingBuffer(history_size)
+        self.sample_times = RingBuffer(history_size, dtype=np.int64)  # media time of each sample, ms
+        self.clock = MediaClock()  # stamps frames; runs where the connection is, never in a worker
+        self.stride_peaks = StreamingPeakDetector()
+        self.swing_peaks = StreamingPeakDetector()
+        self._peak_origin = 0  # sample the peak detectors' index 0 refers to
+        self.recorder = recorder  # LandmarkWriter, or None when not recording
+        self.roi = RoiTracker()  # inference crop for adaptive mode
+        self.smoother = LandmarkSmoother()  # landmark filter for streams with smoothing on
+        self.cadence = CadenceController()  # skip-frame inference for streams in cadence mode
+        self.people = None  # PersonTracker, once the stream asks for several poses
+        self.connections = 0
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+        self.resumed_ms = None  # media time of the last stored frame when continuing a stored session
+
+    def resume(self, recorder):
+        """Continue the frame index, media time and start time of a session id's stored recording"""
+        if recorder is None:
+            return
+        if recorder.created_at is not None:
+            self.created_at = recorder.created_at
+        if recorder.last_frame_index is not None:
+            self.frame_count = recorder.last_frame_index + 1
+            self.resumed_ms = math.ceil(recorder.last_timestamp_ms)
+            self.clock.resume(self.resumed_ms)
+
+    def touch(self):
+        """Mark the session as active now"""
+        self.last_seen = time.monotonic()
+
+    def idle_seconds(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_seen
+
+    def record_landmarks(self, timestamp_ms, landmarks, width, height):
+        """Append this frame's landmarks to the session's recording, if any"""
+        if self.recorder is not None:
+            self.recorder.append(self.frame_count, timestamp_ms, landmarks, width, height)
+
+    def set_peak_window(self, window_size=WINDOW_SIZE):
+        """Switch the peak detectors' moving average window, replaying the history into them
+
+        Tracked people of multi-pose streams switch with the session.
+        """
+        if self.people is not None:
+            self.people.set_peak_window(window_size)
+        if window_size == self.stride_peaks.window_size:
+            return
+        self.stride_peaks, self.swing_peaks, self._peak_origin = replay_peaks(
+            self.stride_lens, self.swing_lens, window_size)
+
+    def periods_ms(self):
+        """Average stride and swing peak periods in ms (nan if unknown)"""
+        return (peak_period_ms(self.stride_peaks, self.sample_times, self._peak_origin),
+                peak_period_ms(self.swing_peaks, self.sample_times, self._peak_origin))
+
+    def add_samples(self, stride_lengths, swing_lengths, timestamps_ms):
+        """Append stride/swing lengths measured elsewhere (e.g. by a worker process)"""
+        for stride_length, swing_length, timestamp_ms in zip(stride_lengths, swing_lengths, timestamps_ms):
+            self.stride_lens.append(stride_length)
+            self.swing_lens.append(swing_length)
+            self.sample_times.append(timestamp_ms)
+            self.stride_peaks.update(stride_length)
+            self.swing_peaks.update(swing_length)
+
+    def export_state(self):
+        """Frame count and stride/swing histories as plain, picklable data"""
+        return {
+            "frame_count": self.frame_count,
+            "total": self.stride_lens.total,
+            "stride_lens": self.stride_lens.values().copy(),
+            "swing_lens": self.swing_lens.values().copy(),
+            "sample_times": self.sample_times.values().copy(),
+        }
+
+    def load_state(self, state):
+        """Replace the histories with exported ones; peak detectors are rebuilt from them"""
+        self.frame_count = state["frame_count"]
+        self.stride_lens.clear()
+        self.swing_lens.clear()
+        self.sample_times.clear()
+        self.stride_peaks = StreamingPeakDetector(self.stride_peaks.window_size)
+        self.swing_peaks = StreamingPeakDetector(self.swing_peaks.window_size)
+        self.add_samples(state["stride_lens"].tolist(), state["swing_lens"].tolist(), state["sample_times"].tolist())
+        # Keep sequence numbers (see metrics_history.py) continuous across the move
+        self.stride_lens.total = self.swing_lens.total = self.sample_times.total = state["total"]
+        self._peak_origin = state["total"] - len(state["stride_lens"])
+
+    def close(self):
+        """Write out and close the landmark recording"""
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+# Client-supplied session ids name directories and files (see landmark_store.py)
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def check_session_id(session_id):
+    """Reject session ids that are not 1-64 letters, digits, '_' or '-'"""
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(session_id):
+        raise ValueError(f"Invalid session id {str(session_id)[:80]!r}")
+
+
+class SessionRegistry:
+    """Tracks live GaitSessions and evicts idle ones"""
+
+    def __init__(self, history_size=1800, idle_timeout=120.0, store=None):
+        self.history_size = history_size
+        self.idle_timeout = idle_timeout
+        self.store = store  # LandmarkStore for raw landmark recordings, optional
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def acquire(self, session_id=None):
+        """Attach a connection to an existing session, or create a new one
+        (ValueError for an invalid session id, see check_session_id)"""
+        if session_id:
+            check_session_id(session_id)
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            session_id = session_id or uuid.uuid4().hex[:12]
+            recorder = self.store.writer(session_id) if self.store is not None else None
+            session = GaitSession(session_id, self.history_size, recorder)
+            # An id evicted earlier (or stored before a restart) carries on where its recording stopped
+            session.resume(recorder)
+            self._sessions[session.session_id] = session
+        session.connections += 1
+        session.touch()
+        return session
+
+    def release(self, session):
+        """Detach a connection; the session stays resumable until it goes idle"""
+        session.connections = max(0, session.connections - 1)
+        session.touch()
+        if session.connections == 0 and session.recorder is not None:
+            session.recorder.flush()
+
+    def remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def evict_idle(self, now=None):
+        """Drop disconnected sessions idle for longer than idle_timeout"""
+        if now is None:
+            now = time.monotonic()
+        evicted = [
+            session for session in self._sessions.values()
+            if session.connections == 0 and session.idle_seconds(now) > self.idle_timeout
+        ]
+        for session in evicted:
+            del self._sessions[session.session_id]
+            session.close()
+        return evicted
+
+    def close(self):
+        """Close every session's recording (on shutdown) and return the sessions"""
+        closed = list(self._sessions.values())
+        for session in closed:
+            session.close()
+        return closed
@@ -0,0 +1,153 @@
+"""Downsampled stride/swing series for /graph/{session_id}.
+
+A stored session (see landmark_store.py) can hold hours of frames, far more
+points than a chart can show. SeriesPyramid precomputes min/max envelopes of
+the stride and swing series at several resolutions: level 0 is one point per
+frame and every further level merges `factor` buckets of the level below,
+down to a single bucket for the whole session. A query picks the finest
+level that fits the requested number of points (however few), so
+serving a graph only slices arrays that are already computed. Keeping the
+minimum and maximum of each bucket (rather than its mean) preserves the
+stride/swing peaks the gait metrics are based on.
+
+Pyramids are built when a session is closed and saved next to its columns
+as graph.npz. GraphCache rebuilds them on demand while a session is still
+being recorded.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .gait_metrics import gait_series
+
+PYRAMID_FILE = "graph.npz"
+SERIES = ("stride", "swing")
+
+
+def _bucket_envelope(values, starts):
+    """Per-bucket (min, max) of values, ignoring NaN; NaN for buckets without data"""
+    return np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
+
+
+class SeriesPyramid:
+    """Min/max envelopes of the stride and swing series at several resolutions"""
+
+    def __init__(self, levels, factor):
+        self.levels = levels  # list of dicts of equally long arrays, finest first
+        self.factor = factor
+
+    @property
+    def rows(self):
+        """Number of frames the pyramid was built from"""
+        return len(self.levels[0]["timestamp_ms"])
+
+    @classmethod
+    def build(cls, timestamp_ms, stride, swing, factor=4, min_points=1):
+        """Build all levels from per-frame series (NaN where no pose was found)
+
+        Levels are added until one has at most min_points buckets; with the
+        default of 1 every query fits in the requested number of points.
+        """
+        level = {
+            "timestamp_ms": np.asarray(timestamp_ms, dtype=np.float64),
+            "stride_min": np.asarray(stride, dtype=np.float32),
+            "stride_max": np.asarray(stride, dtype=np.float32),
+            "swing_min": np.asarray(swing, dtype=np.float32),
+            "swing_max": np.asarray(swing, dtype=np.float32),
+        }
+        levels = [level]
+        while len(level["timestamp_ms"]) > min_points:
+            starts = np.arange(0, len(level["timestamp_ms"]), factor)
+            coarser = {"timestamp_ms": level["timestamp_ms"][starts]}
+            for name in SERIES:
+                coarser[f"{name}_min"], _ = _bucket_envelope(level[f"{name}_min"], starts)
+                _, coarser[f"{name}_max"] = _bucket_envelope(level[f"{name}_max"], starts)
+            levels.append(coarser)
+            level = coarser
+        return cls(levels, factor)
+
+    def query(self, points=1000, start_ms=None, end_ms=None):
+        """Envelope of the frames with start_ms <= timestamp < end_ms in at most `points` buckets"""
+        timestamps = self.levels[0]["timestamp_ms"]
+        start = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side="left"))
+        end = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side="left"))
+        end = max(start, end)
+
+        for index, level in enumerate(self.levels):
+            bucket = self.factor ** index
+            first, last = start // bucket, -(-end // bucket)
+            if last - first <= max(1, points) or index == len(self.levels) - 1:
+                break
+        return index, bucket, {name: values[first:last] for name, values in level.items()}
+
+    def save(self, path):
+        arrays = {"factor": np.array(self.factor)}
+        for index, level in enumerate(self.levels):
+            for name, values in level.items():
+                arrays[f"{index}/{name}"] = values
+        # Write to a temporary file first so readers never see a partial pyramid
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            factor = int(data["factor"])
+            levels = []
+            while f"{len(levels)}/timestamp_ms" in data:
+                prefix = f"{len(levels)}/"
+                levels.append({
+                    key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)
+                })
+        return cls(levels, factor)
+
+
+def build_session_pyramid(series):
+    """Compute the stride/swing pyramid of a stored LandmarkSeries"""
+    stride, swing = gait_series(series.landmarks, series.width, series.height)
+    return SeriesPyramid.build(series.timestamp_ms, stride, swing)
+
+
+class GraphCache:
+    """Pyramids of stored sessions, rebuilt when a session has grown"""
+
+    def __init__(self, store, max_sessions=32):
+        self.store = store
+        self.max_sessions = max_sessions
+        self._pyramids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Up-to-date pyramid of a session; raises KeyError if it was never stored"""
+        series = self.store.open(session_id)
+        with self._lock:
+            pyramid = self._pyramids.get(session_id)
+            if pyramid is not None and pyramid.rows == len(series):
+                self._pyramids.move_to_end(session_id)
+                return pyramid
+
+        path = os.path.join(series.directory, PYRAMID_FILE)
+        pyramid = SeriesPyramid.load(path) if os.path.exists(path) else None
+        # Pyramids saved before levels went down to one bucket are rebuilt too
+        if pyramid is None or pyramid.rows != len(series) or len(pyramid.levels[-1]["timestamp_ms"]) > 1:
+            pyramid = build_session_pyramid(series)
+        self._remember(session_id, pyramid)
+        return pyramid
+
+    def build(self, session_id):
+        """Precompute and save the pyramid of a finished session"""
+        series = self.store.open(session_id)
+        pyramid = build_session_pyramid(series)
+        pyramid.save(os.path.join(series.directory, PYRAMID_FILE))
+        self._remember(session_id, pyramid)
+        return pyramid
+
+    def _remember(self, session_id, pyramid):
+        with self._lock:
+            self._pyramids[session_id] = pyramid
+            self._pyramids.move_to_end(session_id)
+            while len(self._pyramids) > self.max_sessions:
+                self._pyramids.popitem(last=False)
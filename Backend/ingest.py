@@ -0,0 +1,80 @@
+"""Per-connection frame ingest with latest-frame-wins backpressure.
+
+The WebSocket receive loop puts every incoming frame into a LatestFrameSlot
+and a separate processing task takes frames out of it. The slot holds at most
+one pending frame: when a new frame arrives before the previous one was
+picked up, the older one is dropped and counted. Frames therefore never pile
+up in the socket buffer and the annotated stream stays close to real time no
+matter how fast the camera pushes.
+"""
+import asyncio
+import time
+from typing import Any, NamedTuple
+
+
+class IngestedFrame(NamedTuple):
+    kind: str  # "binary", "json" or "base64"
+    payload: Any
+    received_at: float  # time.perf_counter() when the message arrived
+    frame_id: Any = None  # client frame id, echoed back when given
+    capture_ms: float | None = None  # client capture time of a JSON frame (see media_clock.py)
+
+    def lag_ms(self, now=None):
+        """Milliseconds since the frame was received"""
+        if now is None:
+            now = time.perf_counter()
+        return (now - self.received_at) * 1000
+
+
+class LatestFrameSlot:
+    """Single-slot buffer that keeps only the newest pending frame"""
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        """Number of frames waiting to be processed (0 or 1)"""
+        return 0 if self._frame is None else 1
+
+    def put(self, frame):
+        """Store a frame, replacing (and counting as dropped) any pending one
+
+        Returns True if a pending frame was dropped.
+        """
+        dropped = self._frame is not None
+        if dropped:
+            self.dropped += 1
+        self._frame = frame
+        self.received += 1
+        self._ready.set()
+        return dropped
+
+    async def get(self):
+        """Wait for the newest frame; returns None once the slot is closed"""
+        while self._frame is None:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    def stats(self, frame=None):
+        """Ingest statistics reported back to the client"""
+        stats = {
+            "received_frames": self.received,
+            "dropped_frames": self.dropped,
+            "queue_depth": self.depth,
+        }
+        if frame is not None:
+            stats["lag_ms"] = round(frame.lag_ms(), 1)
+        return stats
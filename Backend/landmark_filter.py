@@ -0,0 +1,110 @@
+"""Temporal smoothing and gap filling of pose landmarks.
+
+Raw landmarks jitter from frame to frame: ankle and elbow positions wobble
+by a few pixels even when the person stands still, which shows up in the
+stride/swing series as spikes and sign flips around zero. The peak detector
+used to absorb that with its 10-sample moving average alone, which also
+delays every peak by 4 frames and flattens short strides.
+
+With smoothing on (see stream_config.py) each session runs its landmarks
+through a One Euro filter (Casiez et al., CHI 2012) before gait analysis:
+an exponential low-pass whose cutoff rises with the speed of each
+coordinate, so slow jitter is removed while fast limb movement is followed
+with little lag. All 33 x (x, y, z) coordinates are filtered at once as
+NumPy arrays; visibility is passed through.
+
+When the landmarker misses a pose for a moment (motion blur, occlusion),
+LandmarkSmoother keeps the pose going for up to max_gap_ms by moving every
+landmark along its filtered velocity, so the series and the overlay do not
+drop out. Longer gaps end the track and the filter starts over.
+
+Smoothed series need less smoothing in the peak detector: sessions that
+smooth landmarks use SMOOTHED_PEAK_WINDOW instead of the default window.
+"""
+import math
+
+import numpy as np
+
+SMOOTHED_PEAK_WINDOW = 4
+
+# Defaults for landmarks normalized to the frame (speeds in frame sizes per second)
+MIN_CUTOFF_HZ = 1.5
+BETA = 8.0
+DERIVATIVE_CUTOFF_HZ = 1.0
+MAX_GAP_MS = 250.0
+
+
+def _alpha(cutoff_hz, dt):
+    """Smoothing factor of an exponential low-pass with this cutoff frequency"""
+    tau = 1.0 / (2 * math.pi * cutoff_hz)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    """One Euro filter applied elementwise to arrays of a fixed shape"""
+
+    def __init__(self, min_cutoff=MIN_CUTOFF_HZ, beta=BETA, d_cutoff=DERIVATIVE_CUTOFF_HZ):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None  # last filtered value
+        self.velocity = None  # filtered derivative, per second
+        self.timestamp_ms = None
+
+    def __call__(self, x, timestamp_ms):
+        x = np.asarray(x, dtype=np.float64)
+        if self.value is None or self.value.shape != x.shape:
+            self.value = x.copy()
+            self.velocity = np.zeros_like(x)
+            self.timestamp_ms = timestamp_ms
+            return self.value
+
+        dt = (timestamp_ms - self.timestamp_ms) / 1000
+        if dt <= 0:
+            dt = 1 / 30
+        a_d = _alpha(self.d_cutoff, dt)
+        self.velocity = a_d * (x - self.value) / dt + (1 - a_d) * self.velocity
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        a = _alpha(cutoff, dt)
+        self.value = a * x + (1 - a) * self.value
+        self.timestamp_ms = timestamp_ms
+        return self.value
+
+
+class LandmarkSmoother:
+    """Streaming smoothing and gap filling of one person's (33, 4) landmarks"""
+
+    def __init__(self, max_gap_ms=MAX_GAP_MS, **filter_options):
+        self.max_gap_ms = max_gap_ms
+        self.filter = OneEuroFilter(**filter_options)
+        self.visibility = None
+        self.filled = False  # whether the last update returned a predicted pose
+        self.frames_filled = 0
+
+    def update(self, landmarks, timestamp_ms):
+        """Filter a frame's (num_poses, 33, 4) landmarks; only the first pose is kept
+
+        Returns a (1, 33, 4) float32 array, or (0, 33, 4) when there is no
+        pose and the gap is too long to fill.
+        """
+        self.filled = False
+        if len(landmarks):
+            pose = landmarks[0]
+            self.visibility = pose[:, 3:]
+            coords = self.filter(pose[:, :3], timestamp_ms)
+            return np.concatenate([coords, self.visibility], axis=1)[None].astype(np.float32)
+
+        last = self.filter.timestamp_ms
+        if last is None or timestamp_ms - last > self.max_gap_ms:
+            self.filter.reset()
+            return np.empty((0, 33, 4), dtype=np.float32)
+
+        # Carry the pose along its filtered velocity; the filter state stays at the last real frame
+        coords = self.filter.value + self.filter.velocity * ((timestamp_ms - last) / 1000)
+        self.filled = True
+        self.frames_filled += 1
+        return np.concatenate([coords, self.visibility], axis=1)[None].astype(np.float32)
@@ -0,0 +1,254 @@
+"""Append-only columnar store for raw pose landmark streams.
+
+The live server used to throw the landmarks away after every frame and keep
+only the derived stride/swing lengths. LandmarkStore persists the raw stream
+of every session instead, so new metrics can be computed (and graphs drawn)
+from history without running MediaPipe on the video again.
+
+Each session is a directory under the store root with one flat binary file
+per column, appended to row by row:
+
+    <root>/<session_id>/
+        meta.json           column dtypes and shapes
+        frame_index.bin     int32                   (n,)
+        timestamp_ms.bin    float64                 (n,)
+        landmarks.bin       float32 (or float16)    (n, 33, 4)
+        width.bin           uint16                  (n,)
+        height.bin          uint16                  (n,)
+
+landmarks holds x, y, z and visibility of the 33 landmarks of the first
+detected pose; frames without a pose are stored as NaN so the rows stay
+aligned with the frame clock. width and height are the size of the frame
+the landmarks were detected in, needed to turn them into pixel distances.
+
+A session id that comes back after its session was evicted (or after a
+restart) appends to the same columns. The new session continues the frame
+index and media time of the last stored row, so both columns stay sorted.
+
+Readers map the files with np.memmap, so slicing a LandmarkSeries reads only
+the pages it touches. The row count is derived from the file sizes, which
+keeps a series readable while it is still being written (a torn last row is
+ignored).
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = ("x", "y", "z", "visibility")
+STORE_VERSION = 1
+
+# Column name -> (dtype, per-row shape); the landmarks dtype is configurable
+COLUMNS = {
+    "frame_index": (np.dtype("<i4"), ()),
+    "timestamp_ms": (np.dtype("<f8"), ()),
+    "landmarks": (np.dtype("<f4"), (NUM_LANDMARKS, len(LANDMARK_FIELDS))),
+    "width": (np.dtype("<u2"), ()),
+    "height": (np.dtype("<u2"), ()),
+}
+LANDMARK_DTYPES = ("float16", "float32")
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.bin")
+
+
+class LandmarkWriter:
+    """Buffered appender for one session's landmark columns.
+
+    Rows are collected in preallocated arrays and written out every
+    flush_rows frames (and on flush/close). Appends from the session's frame
+    worker and flushes from the event loop may interleave, so both take a lock.
+    """
+
+    def __init__(self, directory, columns, flush_rows=30):
+        self.directory = directory
+        self.columns = columns
+        self.flush_rows = max(1, flush_rows)
+        self._lock = threading.Lock()
+        self._buffers = {
+            name: np.empty((self.flush_rows,) + shape, dtype=dtype)
+            for name, (dtype, shape) in columns.items()
+        }
+        self._pending = 0
+        # Drop a torn row left behind by a crash so the columns stay aligned
+        series = LandmarkSeries(directory)
+        self.rows_written = len(series)
+        # Where an earlier visit of the session left off, so a resumed session continues from there
+        self.created_at = series.meta.get("created_at")
+        self.last_frame_index = int(series.frame_index[-1]) if len(series) else None
+        self.last_timestamp_ms = float(series.timestamp_ms[-1]) if len(series) else None
+        self._files = {}
+        for name, (dtype, shape) in columns.items():
+            f = open(_column_path(directory, name), "ab")
+            f.truncate(self.rows_written * dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+            self._files[name] = f
+
+    def append(self, frame_index, timestamp_ms, landmarks, width=0, height=0):
+        """Add one frame; landmarks is (num_poses, 33, 4), only the first pose is kept"""
+        with self._lock:
+            if self._files is None:
+                raise ValueError("LandmarkWriter is closed")
+            row = self._pending
+            self._buffers["frame_index"][row] = frame_index
+            self._buffers["timestamp_ms"][row] = timestamp_ms
+            if len(landmarks):
+                self._buffers["landmarks"][row] = landmarks[0]
+            else:
+                self._buffers["landmarks"][row] = np.nan
+            self._buffers["width"][row] = width
+            self._buffers["height"][row] = height
+            self._pending += 1
+            if self._pending == self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        """Write buffered rows so readers can see them"""
+        with self._lock:
+            if self._files is not None:
+                self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._files is None:
+                return
+            self._flush_locked()
+            for f in self._files.values():
+                f.close()
+            self._files = None
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        for name, f in self._files.items():
+            f.write(self._buffers[name][:self._pending].tobytes())
+            f.flush()
+        self.rows_written += self._pending
+        self._pending = 0
+
+
+class LandmarkSeries:
+    """Read-only, memory-mapped view of one session's landmark columns"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._columns = {
+            name: (np.dtype(spec["dtype"]), tuple(spec["shape"]))
+            for name, spec in self.meta["columns"].items()
+        }
+        self._length = min(self._rows_on_disk(name) for name in self._columns)
+        self._maps = {}
+
+    def _rows_on_disk(self, name):
+        dtype, shape = self._columns[name]
+        path = _column_path(self.directory, name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return size // (dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+
+    def __len__(self):
+        return self._length
+
+    def column(self, name):
+        """Read-only array of a column (memory mapped, no data is read up front)"""
+        if name not in self._maps:
+            dtype, shape = self._columns[name]
+            if self._length == 0:
+                array = np.empty((0,) + shape, dtype=dtype)
+            else:
+                array = np.memmap(
+                    _column_path(self.directory, name), dtype=dtype, mode="r",
+                    shape=(self._length,) + shape)
+            self._maps[name] = array
+        return self._maps[name]
+
+    @property
+    def frame_index(self):
+        return self.column("frame_index")
+
+    @property
+    def timestamp_ms(self):
+        return self.column("timestamp_ms")
+
+    @property
+    def landmarks(self):
+        return self.column("landmarks")
+
+    @property
+    def width(self):
+        return self.column("width")
+
+    @property
+    def height(self):
+        return self.column("height")
+
+    def time_range(self, start_ms=None, end_ms=None):
+        """Row slice covering start_ms <= timestamp < end_ms (timestamps must be sorted)"""
+        timestamps = self.timestamp_ms
+        start = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side="left"))
+        end = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side="left"))
+        return slice(start, end)
+
+
+class LandmarkStore:
+    """Directory of per-session landmark series"""
+
+    def __init__(self, root, landmark_dtype="float32", flush_rows=30):
+        if landmark_dtype not in LANDMARK_DTYPES:
+            raise ValueError(f"Unsupported landmark dtype {landmark_dtype!r}, expected one of {LANDMARK_DTYPES}")
+        self.root = root
+        self.flush_rows = flush_rows
+        self.columns = dict(COLUMNS)
+        self.columns["landmarks"] = (np.dtype(landmark_dtype).newbyteorder("<"), COLUMNS["landmarks"][1])
+
+    def session_dir(self, session_id):
+        if not session_id or os.sep in session_id or session_id.startswith("."):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        return os.path.join(self.root, session_id)
+
+    def sessions(self):
+        """Ids of all stored sessions"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, "meta.json"))
+        )
+
+    def writer(self, session_id):
+        """Open a session for appending, creating it if needed"""
+        directory = self.session_dir(session_id)
+        meta_path = os.path.join(directory, "meta.json")
+        columns = self.columns
+        if os.path.exists(meta_path):
+            # Resumed sessions keep appending in the dtypes they were created with
+            columns = {
+                name: (np.dtype(spec["dtype"]), tuple(spec["shape"]))
+                for name, spec in LandmarkSeries(directory).meta["columns"].items()
+            }
+        else:
+            os.makedirs(directory, exist_ok=True)
+            meta = {
+                "version": STORE_VERSION,
+                "session_id": session_id,
+                "created_at": time.time(),
+                "landmark_fields": list(LANDMARK_FIELDS),
+                "columns": {
+                    name: {"dtype": dtype.str, "shape": list(shape)}
+                    for name, (dtype, shape) in columns.items()
+                },
+            }
+            with open(meta_path, "w") as f:
+                json.dump(meta, f, indent=2)
+        return LandmarkWriter(directory, columns, self.flush_rows)
+
+    def open(self, session_id):
+        """Read a stored session; raises KeyError if it does not exist"""
+        directory = self.session_dir(session_id)
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            raise KeyError(session_id)
+        return LandmarkSeries(directory)
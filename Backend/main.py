@@ -1,21 +1,134 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import base64
-from io import BytesIO
-from PIL import Image
-import cv2
 import numpy as np
 import json
+import orjson
 from datetime import datetime
 import os
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from mediapipe import solutions
-from mediapipe.framework.formats import landmark_pb2
 import math
+import asyncio
+import logging
+import time
 
-app = FastAPI()
+from .frame_analysis import (
+    FrameResult, analyze_shared_frame, decode_data_url, encode_frame, landmarkers, models, process_base64_image,
+    process_binary_payload)
+from .frame_protocol import CODEC_JPEG, CODEC_LANDMARKS, pack_frame, unpack_frame
+from .gait_session import SessionRegistry
+from .graph_series import GraphCache
+from .frame_codec import decode_rgb
+from .frame_recording import RecordingDirectory
+from .frame_workers import FrameWorkerPool
+from .ingest import IngestedFrame, LatestFrameSlot
+from .landmark_store import LandmarkStore
+from .media_clock import capture_time_ms
+from .metrics_history import HistoryCursor, past_metrics
+from .pose_models import MODEL_FILES
+from .process_workers import ProcessWorkerPool
+from .shm_ring import DEFAULT_SLOT_BYTES, SharedFrameRing
+from .profiling import ServerMetrics, StageTimer
+from .result_writer import ResultWriter, SQLiteSink, SupabaseSink
+from .responses import FrameReply, MetricsReply, StatusReply, encode_message
+from .stream_config import StreamConfig
+
+logging.basicConfig(
+    level=os.environ.get("GAIT_LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s")
+logger = logging.getLogger("gait.server")
+
+# Per-frame log lines are sampled: one structured line every GAIT_LOG_EVERY frames per session
+LOG_EVERY = max(1, int(os.environ.get("GAIT_LOG_EVERY", 100)))
+
+# Stage histograms and frame counters served by /metrics
+server_metrics = ServerMetrics()
+
+# Live frame slots, for the queue depth gauge
+active_slots = set()
+
+# With GAIT_NO_SINKS=1 (set by replay.py) nothing is persisted: no landmark store, recordings or results
+no_sinks = os.environ.get("GAIT_NO_SINKS", "") == "1"
+
+# Raw landmark streams of every session are kept on disk (GAIT_STORE_DIR="" disables)
+store_dir = "" if no_sinks else os.environ.get("GAIT_STORE_DIR", "gait_store")
+landmark_store = LandmarkStore(
+    store_dir, landmark_dtype=os.environ.get("GAIT_STORE_DTYPE", "float32")) if store_dir else None
+
+# With GAIT_RECORD_DIR set, every connection's incoming frames are recorded for replay (see frame_recording.py)
+record_dir = "" if no_sinks else os.environ.get("GAIT_RECORD_DIR", "")
+recordings = RecordingDirectory(record_dir) if record_dir else None
+
+# Per-client gait sessions (bounded history, evicted after going idle)
+sessions = SessionRegistry(
+    history_size=int(os.environ.get("GAIT_HISTORY_FRAMES", 1800)),
+    idle_timeout=float(os.environ.get("GAIT_SESSION_IDLE_S", 120)),
+    store=landmark_store)
+
+def create_result_writer():
+    """Session results go to SQLite (GAIT_RESULTS_SQLITE) or Supabase if configured (see result_writer.py)"""
+    if no_sinks:
+        return None
+    sqlite_path = os.environ.get("GAIT_RESULTS_SQLITE")
+    if sqlite_path:
+        return ResultWriter(SQLiteSink(sqlite_path))
+    if os.environ.get("SUPABASE_URL") and os.environ.get("SUPABASE_KEY"):
+        from .supabase import supabase
+        return ResultWriter(SupabaseSink(supabase))
+    return None
+
+result_writer = create_result_writer()
+
+# Downsampled stride/swing series served by /graph/{session_id}
+graphs = GraphCache(landmark_store) if landmark_store is not None else None
+
+async def evict_idle_sessions():
+    """Periodically drop sessions whose clients went away"""
+    while True:
+        await asyncio.sleep(max(1.0, sessions.idle_timeout / 4))
+        for session in sessions.evict_idle():
+            logger.info("Evicted idle session %s", session.session_id)
+            if result_writer is not None:
+                result_writer.finish(session)
+            if process_workers is not None:
+                process_workers.forget(session.session_id)
+            else:
+                workers.submit(session.session_id, landmarkers.forget, session.session_id)
+            if graphs is not None:
+                # Precompute the graph pyramid now that the recording is complete
+                await asyncio.to_thread(graphs.build, session.session_id)
+
+@asynccontextmanager
+async def lifespan(app):
+    global process_workers, frame_ring
+    if num_process_workers > 0:
+        # Started here, not at import, so importing this module (e.g. in replay.py) starts no processes
+        if num_shm_slots > 0:
+            frame_ring = SharedFrameRing(
+                num_shm_slots, int(os.environ.get("GAIT_SHM_SLOT_BYTES", DEFAULT_SLOT_BYTES)))
+        process_workers = ProcessWorkerPool(num_process_workers, sessions.history_size, frame_ring)
+        logger.info("Started %d frame worker processes (%d shared frame slots)",
+                    num_process_workers, num_shm_slots if frame_ring is not None else 0)
+    eviction_task = asyncio.create_task(evict_idle_sessions())
+    if result_writer is not None:
+        result_writer.start()
+    yield
+    eviction_task.cancel()
+    workers.shutdown(wait=False)
+    if process_workers is not None:
+        process_workers.shutdown()
+    if frame_ring is not None:
+        frame_ring.close()
+    for session in sessions.close():
+        if result_writer is not None:
+            result_writer.finish(session)
+        if graphs is not None:
+            graphs.build(session.session_id)
+    if result_writer is not None:
+        await result_writer.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware for frontend communication
 app.add_middleware(
@@ -26,320 +139,423 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize MediaPipe pose detector
-base_options = python.BaseOptions(model_asset_path='Backend/Gait Detection/pose_landmarker.task')
-options = vision.PoseLandmarkerOptions(
-    base_options=base_options,
-    output_segmentation_masks=True,
-    running_mode=mp.tasks.vision.RunningMode.VIDEO)
-detector = vision.PoseLandmarker.create_from_options(options)
-
-# Global variables for gait analysis
-frame_count = 0
-swingLens = []
-strideLens = []
-processing_queue = 0
-
-def draw_landmarks_on_image(rgb_image, detection_result):
-    """Draw pose landmarks on image"""
-    pose_landmarks_list = detection_result.pose_landmarks
-    annotated_image = np.copy(rgb_image)
-
-    # Loop through the detected poses to visualize.
-    for idx in range(len(pose_landmarks_list)):
-        pose_landmarks = pose_landmarks_list[idx]
-
-        # Draw the pose landmarks.
-        pose_landmarks_proto = landmark_pb2.NormalizedLandmarkList()
-        pose_landmarks_proto.landmark.extend([
-            landmark_pb2.NormalizedLandmark(x=landmark.x, y=landmark.y, z=landmark.z) for landmark in pose_landmarks
-        ])
-        solutions.drawing_utils.draw_landmarks(
-            annotated_image,
-            pose_landmarks_proto,
-            solutions.pose.POSE_CONNECTIONS,
-            solutions.drawing_styles.get_default_pose_landmarks_style())
-    return annotated_image
-
-def calculate_distance(x, y, x1, y1):
-    """Calculate Euclidean distance between two points"""
-    dx = x1 - x
-    dy = y1 - y
-    distance = math.sqrt(dx ** 2 + dy ** 2)
-    return distance
-
-def getRealCoords(landmark, frame):
-    """Convert normalized coordinates to pixel coordinates"""
-    height, width, channels = frame.shape
-    return int(landmark.x * width), int(landmark.y * height)
-
-from scipy.signal import find_peaks
-
-def getPeakDist(lengths):
-    window_size = 10
-    smooth = np.convolve(lengths, np.ones(window_size)/window_size, mode='same')
-    peaks, properties = find_peaks(smooth,
-                                   height=None,  # minimum height of peaks
-                                   distance=10,  # minimum distance between peaks
-                                   prominence=10)
-    peak_distances = np.diff(peaks)
-    
-    # Calculate average of last 3 peak distances only
-    if len(peak_distances) >= 3:
-        last_three_distances = peak_distances[-3:]
-        average_peak_distance = np.mean(last_three_distances)
-    elif len(peak_distances) > 0:
-        # If we have fewer than 3 peak distances, use all available
-        average_peak_distance = np.mean(peak_distances)
-    else:
-        # No peak distances found
-        average_peak_distance = float('nan')
-    
-    return average_peak_distance
+# Decode, inference, drawing and encode run on worker threads, not the event loop
+# (the frame functions themselves are in frame_analysis.py)
+workers = FrameWorkerPool(int(os.environ.get("GAIT_WORKERS", min(4, os.cpu_count() or 1))))
 
+# With GAIT_PROCESS_WORKERS=N frames run in N worker processes instead (see process_workers.py)
+num_process_workers = int(os.environ.get("GAIT_PROCESS_WORKERS", 0))
+process_workers = None
 
-def process_gait_analysis(frame, detection_result, fast_mode=False):
-    """Process gait analysis and return annotated frame with metrics"""
-    global frame_count, swingLens, strideLens
-    
-    landmarks = detection_result.pose_landmarks
-    metrics = {}
-    
-    if len(landmarks) > 0 and len(landmarks[0]) >= 29:  # Ensure we have all required landmarks
-        # Foot landmarks for stride analysis
-        left_foot_x, left_foot_y = getRealCoords(landmarks[0][27], frame)
-        right_foot_x, right_foot_y = getRealCoords(landmarks[0][28], frame)
-        stride_length = int(calculate_distance(left_foot_x, left_foot_y, right_foot_x, right_foot_y))
-
-        if right_foot_x > left_foot_x:
-            stride_length *= -1
-
-        strideLens.append(stride_length)
-
-        # Draw foot landmarks and stride line
-        cv2.circle(frame, center=(left_foot_x, left_foot_y), radius=4, color=(0, 0, 255), thickness=-1)
-        cv2.circle(frame, center=(right_foot_x, right_foot_y), radius=4, color=(0, 0, 255), thickness=-1)
-        cv2.line(frame, (left_foot_x, left_foot_y), (right_foot_x, right_foot_y), (0, 0, 255), 3)
-
-        # Calculate average stride length (skip heavy computation in fast mode)
-        if not fast_mode:
-            avgStrideLen = getPeakDist(strideLens)
-            stride_text = f"Stride: {int(avgStrideLen) if not math.isnan(avgStrideLen) else 'Analyzing...'}"
-        else:
-            stride_text = f"Stride: {stride_length}px (fast)"
-            avgStrideLen = float('nan')
-        
-        cv2.putText(frame, stride_text, (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-
-        # Elbow landmarks for swing analysis
-        left_elbow_x, left_elbow_y = getRealCoords(landmarks[0][13], frame)
-        right_elbow_x, right_elbow_y = getRealCoords(landmarks[0][14], frame)
-        swing_length = int(calculate_distance(left_elbow_x, left_elbow_y, right_elbow_x, right_elbow_y))
-
-        if right_elbow_x > left_elbow_x:
-            swing_length *= -1
-
-        swingLens.append(swing_length)
-        
-        # Draw elbow landmarks and swing line
-        cv2.circle(frame, center=(left_elbow_x, left_elbow_y), radius=4, color=(255, 0, 0), thickness=-1)
-        cv2.circle(frame, center=(right_elbow_x, right_elbow_y), radius=4, color=(255, 0, 0), thickness=-1)
-        cv2.line(frame, (left_elbow_x, left_elbow_y), (right_elbow_x, right_elbow_y), (255, 0, 0), 3)
-
-        # Calculate average swing length (skip heavy computation in fast mode)
-        if not fast_mode:
-            avgSwingLen = getPeakDist(swingLens)
-            swing_text = f"Swing: {int(avgSwingLen) if not math.isnan(avgSwingLen) else 'Analyzing...'}"
-        else:
-            swing_text = f"Swing: {swing_length}px (fast)"
-            avgSwingLen = float('nan')
-            
-        cv2.putText(frame, swing_text, (30, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
-
-        # Store metrics
-        metrics = {
-            "stride_length": stride_length,
-            "swing_length": swing_length,
-            "avg_stride": avgStrideLen if not math.isnan(avgStrideLen) else None,
-            "avg_swing": avgSwingLen if not math.isnan(avgSwingLen) else None,
-            "frame_count": frame_count,
-            "fast_mode": fast_mode
-        }
+# With GAIT_SHM_SLOTS=N as well, frames reach the worker processes through shared memory (see shm_ring.py)
+num_shm_slots = int(os.environ.get("GAIT_SHM_SLOTS", 0))
+frame_ring = None
 
-    frame_count += 1
-    return frame, metrics
+def frame_pool():
+    """Where frames are processed: worker processes if enabled, otherwise worker threads"""
+    return process_workers or workers
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the FastAPI application!"}
 
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus text exposition of stage timings, frame counters and session gauges"""
+    slots = list(active_slots)
+    body = server_metrics.render({
+        "active_sessions": ("Gait sessions held in memory", len(sessions)),
+        "active_connections": ("Open /ws/image connections", len(slots)),
+        "queue_depth": ("Frames waiting to be processed", sum(slot.depth for slot in slots)),
+        "shared_frame_slots_in_use": ("Frame ring slots holding a frame",
+                                      frame_ring.in_use() if frame_ring is not None else 0),
+        "worker_restarts": ("Frame worker processes restarted after exiting",
+                            process_workers.restarts if process_workers is not None else 0),
+        "result_rows_pending": ("Session result rows waiting to be written",
+                                result_writer.pending if result_writer is not None else 0),
+        "result_rows_dropped": ("Session result rows dropped while the database was unreachable",
+                                result_writer.rows_dropped if result_writer is not None else 0),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+def series_to_json(values):
+    """Rounded list with None for frames without a pose"""
+    return [None if math.isnan(value) else round(value, 1) for value in values.tolist()]
+
 @app.get("/graph/{item_id}")
-def read_item(item_id: int):
-    return {"message": f"Welcome to the FastAPI application! You requested item {item_id}."}
+def read_item(item_id: str, request: Request, points: int = 1000,
+              start_ms: float | None = None, end_ms: float | None = None):
+    """Stride/swing series of a stored session, downsampled to at most `points` buckets
+
+    Each bucket carries the min and max of the frames it covers. start_ms and
+    end_ms restrict the series to a time range of the recording.
+    """
+    if graphs is None:
+        raise HTTPException(status_code=404, detail="Landmark recording is disabled")
+    try:
+        pyramid = graphs.get(item_id)
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=404, detail=f"Unknown session {item_id}")
+
+    # The series only changes when frames are appended, so the frame count identifies it
+    etag = f'"{item_id}-{pyramid.rows}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    level, bucket_frames, series = pyramid.query(points, start_ms, end_ms)
+    return JSONResponse({
+        "session_id": item_id,
+        "frames": pyramid.rows,
+        "level": level,
+        "bucket_frames": bucket_frames,
+        "timestamp_ms": series["timestamp_ms"].tolist(),
+        "stride_min": series_to_json(series["stride_min"]),
+        "stride_max": series_to_json(series["stride_max"]),
+        "swing_min": series_to_json(series["swing_min"]),
+        "swing_max": series_to_json(series["swing_max"]),
+    }, headers=headers)
+
+def landmarks_to_json(landmarks):
+    """One flat [x0, y0, z0, v0, x1, ...] row per pose, rounded for a compact payload"""
+    return np.round(landmarks.reshape(len(landmarks), -1), 4)
+
+async def send_message(websocket, message, config):
+    """Send a reply in the connection's encoding (see responses.py)"""
+    data = encode_message(message, config.encoding)
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+def add_past_metrics(reply, session, gait_metrics, config, history):
+    """Attach the stride/swing history to a reply, as a window or as a delta (see metrics_history.py)"""
+    people = []
+    if "people" in gait_metrics and session.people is not None:
+        in_frame = {person["person_id"] for person in gait_metrics["people"]}
+        people = [track for track in session.people.tracks if track.person_id in in_frame]
+
+    if config.history == "delta":
+        reply["past_metrics_delta"] = history.delta(None, session.stride_lens, session.swing_lens)
+        if people:
+            reply["people_past_metrics_delta"] = {
+                str(track.person_id): history.delta(track.person_id, track.stride_lens, track.swing_lens)
+                for track in people
+            }
+            history.retain([None] + [track.person_id for track in session.people.tracks])
+        return
+
+    reply["past_metrics"] = past_metrics(session.stride_lens, session.swing_lens)
+    if people:
+        reply["people_past_metrics"] = {
+            str(track.person_id): past_metrics(track.stride_lens, track.swing_lens) for track in people
+        }
+
+def decode_to_slot(data, codec, slot, timer):
+    """Gateway thread: decode a frame into a frame ring slot; returns its shape, None if it does not fit"""
+    if codec is None:
+        data = decode_data_url(data)
+        timer.lap("base64_decode")
+    img_rgb = decode_rgb(data)
+    timer.lap("decode")
+    if not frame_ring.fits(img_rgb.shape):
+        return None
+    np.copyto(frame_ring.frame(slot, img_rgb.shape), img_rgb)
+    timer.lap("shm_write")
+    return img_rgb.shape
+
+def encode_slot(slot, shape, codec, timer):
+    """Gateway thread: encode the annotated frame in a slot (a data URL when codec is None)"""
+    buffer = encode_frame(frame_ring.frame(slot, shape), codec or CODEC_JPEG)
+    timer.lap("encode")
+    if codec is not None:
+        return buffer
+    processed_b64 = base64.b64encode(buffer).decode('utf-8')
+    timer.lap("base64_encode")
+    return f"data:image/jpeg;base64,{processed_b64}"
+
+async def process_frame(session, config, data, timestamp_ms, codec=None):
+    """Decode, analyze and encode one frame: a binary payload with its codec, or base64 when codec is None"""
+    if frame_ring is not None:
+        slot = frame_ring.acquire()
+        if slot is not None:
+            result = await process_shared_frame(session, config, data, timestamp_ms, codec, slot)
+            if result is not None:
+                return result
+    # Every slot busy (or the frame is larger than one): the frame travels encoded
+    if codec is None:
+        return await frame_pool().run(session, process_base64_image, data, session, config, timestamp_ms)
+    return await frame_pool().run(session, process_binary_payload, data, codec, session, config, timestamp_ms)
+
+async def process_shared_frame(session, config, data, timestamp_ms, codec, slot):
+    """Process mode with a frame ring: decode and encode on gateway threads, inference in the worker"""
+    async def using_slot(job):
+        # A cancelled await does not stop a thread or worker that is writing to the slot:
+        # keep the slot until the job is over
+        nonlocal slot
+        job = asyncio.ensure_future(job)
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            held, slot = slot, None
+            job.add_done_callback(lambda _: frame_ring.release(held, force=True))
+            raise
+
+    try:
+        timer = StageTimer()
+        shape = await using_slot(workers.run(session, decode_to_slot, data, codec, slot, timer))
+        if shape is None:
+            return None
+        height, width = shape[:2]
+        annotate = config.mode != "landmarks"
+
+        frame_ring.hand_off(slot)
+        gait_metrics, landmarks, timer = await using_slot(process_workers.run(
+            session, analyze_shared_frame, slot, shape, session, timer, config, timestamp_ms, annotate))
+        if not annotate:
+            return FrameResult(None, gait_metrics, width, height, landmarks, timer)
+
+        image = await using_slot(workers.run(session, encode_slot, slot, shape, codec, timer))
+        return FrameResult(image, gait_metrics, width, height, landmarks, timer)
+    finally:
+        if slot is not None:
+            # Also reclaims the slot from a worker that died holding it
+            frame_ring.release(slot, force=True)
+
+async def handle_binary_frame(websocket, frame, session, slot, config, history):
+    """Process a binary frame (see frame_protocol.py) and reply in the same format"""
+    frame_id = None
+    try:
+        header, payload = unpack_frame(frame.payload)
+        frame_id = header.frame_id
+        timestamp_ms = session.clock.stamp(header.timestamp_ms, frame.received_at)
+        result = await process_frame(session, config, payload, timestamp_ms, header.codec)
+        gait_metrics = result.gait_metrics
+
+        reply_header = header._replace(width=result.width, height=result.height)
+        result.timer.skip()
+        if result.image is None:
+            # Landmarks mode: raw little-endian float32 (num_poses, 33, 4) instead of an image
+            reply_header = reply_header._replace(codec=CODEC_LANDMARKS)
+            await websocket.send_bytes(pack_frame(reply_header, result.landmarks.astype("<f4")))
+        else:
+            await websocket.send_bytes(pack_frame(reply_header, result.image))
+        result.timer.lap("send")
+
+        # Metrics travel in a compact side message keyed by frame id
+        metrics_message: MetricsReply = {
+            "type": "metrics",
+            "frame_id": header.frame_id,
+            "gait_metrics": gait_metrics,
+            "frame_count": session.frame_count,
+            "session_id": session.session_id,
+            "ingest": slot.stats(frame)
+        }
+        add_past_metrics(metrics_message, session, gait_metrics, config, history)
+        if config.timings:
+            metrics_message["timings_ms"] = result.timer.rounded()
+        await send_message(websocket, metrics_message, config)
+        frame_done(frame, session, result, config)
+
+    except Exception as e:
+        server_metrics.increment("frame_errors")
+        logger.warning("Error processing binary frame for session %s: %s", session.session_id, e)
+        error: StatusReply = {"status": "error", "message": f"Error processing image: {str(e)}"}
+        if frame_id is not None:
+            error["frame_id"] = frame_id
+        await send_message(websocket, error, config)
+
+async def handle_base64_frame(websocket, frame, session, slot, config, history):
+    """Process a base64 image (JSON message or bare data URL) and reply with JSON"""
+    try:
+        # Decode, analyze and re-encode the base64 image on the session's worker
+        timestamp_ms = session.clock.stamp(frame.capture_ms, frame.received_at)
+        result = await process_frame(session, config, frame.payload, timestamp_ms)
+        width, height, gait_metrics = result.width, result.height, result.gait_metrics
+
+        # Send processed image and metrics back to frontend
+        response: FrameReply = {
+            "status": "success",
+            "message": "Frame processed with gait analysis",
+            "dimensions": {"width": width, "height": height},
+            "gait_metrics": gait_metrics,
+            "frame_count": session.frame_count,
+            "session_id": session.session_id,
+            "ingest": slot.stats(frame)
+        }
+        if result.image is not None:
+            response["processed_image"] = result.image
+        else:
+            response["landmarks"] = landmarks_to_json(result.landmarks)
+        if frame.frame_id is not None:
+            response["frame_id"] = frame.frame_id
+        if frame.kind == "json":
+            add_past_metrics(response, session, gait_metrics, config, history)
+        if config.timings:
+            response["timings_ms"] = result.timer.rounded()
+
+        result.timer.skip()
+        await send_message(websocket, response, config)
+        result.timer.lap("send")
+        frame_done(frame, session, result, config)
+
+    except Exception as e:
+        server_metrics.increment("frame_errors")
+        logger.warning("Error processing %s frame for session %s: %s", frame.kind, session.session_id, e)
+        error: StatusReply = {"status": "error", "message": f"Error processing image: {str(e)}"}
+        if frame.frame_id is not None:
+            error["frame_id"] = frame.frame_id
+        await send_message(websocket, error, config)
+
+def frame_done(frame, session, result, config):
+    """Record a processed frame in the metrics and log a sample of frames"""
+    lag_ms = frame.lag_ms()
+    server_metrics.observe_frame(result.timer, lag_ms)
+    if result_writer is not None:
+        result_writer.observe(session, result.gait_metrics)
+    if session.frame_count % LOG_EVERY == 0:
+        logger.info(json.dumps({
+            "event": "frame",
+            "session_id": session.session_id,
+            "frame_count": session.frame_count,
+            "kind": frame.kind,
+            "mode": config.mode,
+            "width": result.width,
+            "height": result.height,
+            "lag_ms": round(lag_ms, 1),
+            "timings_ms": result.timer.rounded(),
+        }, separators=(",", ":")))
+
+async def handle_frame(websocket, frame, session, slot, config, history):
+    """Process one ingested frame and send the replies for it"""
+    if frame.kind == "binary":
+        await handle_binary_frame(websocket, frame, session, slot, config, history)
+    else:
+        await handle_base64_frame(websocket, frame, session, slot, config, history)
+
+async def process_frames(websocket, session, slot, config, history):
+    """Processing loop: always works on the newest frame the client sent"""
+    while True:
+        frame = await slot.get()
+        if frame is None:
+            return
+        await handle_frame(websocket, frame, session, slot, config, history)
+
+def check_model_installed(model):
+    """Reject pose model tiers whose .task file this server does not have"""
+    if model in MODEL_FILES and not os.path.exists(models.path(model)):
+        raise ValueError(f"Pose model {model!r} is not installed on this server")
+
+def receive_frame(slot, frame, recorder=None):
+    """Hand a frame to the processing task, counting frames it replaces"""
+    server_metrics.increment("frames_received")
+    if recorder is not None:
+        recorder.frame(frame.kind, frame.payload, frame.received_at, frame.capture_ms)
+    if slot.put(frame):
+        server_metrics.increment("frames_dropped")
 
 @app.websocket("/ws/image")
 async def websocket_image(websocket: WebSocket):
     await websocket.accept()
-    print("WebSocket connection established")
-    
-    global frame_count
-    fps = 30  # Assume 30 FPS for timestamp calculation
+
+    # Stream options (e.g. ?mode=landmarks) can also be changed with a config message
+    try:
+        config = StreamConfig.from_query(websocket.query_params)
+        check_model_installed(config.model)
+        # Clients may pass ?session_id=... to resume a session after reconnecting
+        session = sessions.acquire(websocket.query_params.get("session_id"))
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    except OSError as e:
+        logger.error("Could not open the landmark recording of a session: %s", e)
+        await websocket.close(code=1011, reason="Session storage unavailable")
+        return
+
+    # The client's capture clock need not continue the previous connection's
+    session.clock.rebase()
+    recorder = None
+    if recordings is not None:
+        try:
+            recorder = recordings.recorder(session.session_id)
+            recorder.config(config.to_dict())
+        except OSError as e:
+            logger.warning("Not recording session %s: %s", session.session_id, e)
+            recorder = None
+    logger.info("WebSocket connection established (session %s, mode %s)", session.session_id, config.mode)
+
+    # Frames are handed to a separate processing task; only the newest one is kept
+    slot = LatestFrameSlot()
+    active_slots.add(slot)
+    # Stride/swing samples this connection has received (history=delta)
+    history = HistoryCursor()
+    processor = asyncio.create_task(process_frames(websocket, session, slot, config, history))
     
     try:
         while True:
-            # Receive data from frontend
-            data = await websocket.receive_text()
+            # Receive data from frontend (binary frames or legacy JSON/base64 text)
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            session.touch()
+            received_at = time.perf_counter()
+
+            if received.get("bytes") is not None:
+                receive_frame(slot, IngestedFrame("binary", received["bytes"], received_at), recorder)
+                continue
+
+            data = received["text"]
             
             try:
                 # Parse JSON data
-                message = json.loads(data)
-                
-                if "image" in message:
-                    # Extract base64 image data
-                    image_data = message["image"]
-                    
-                    # Remove data URL prefix if present
-                    if "data:image/" in image_data:
-                        image_b64 = image_data.split(",")[1]
-                        image_format = image_data.split(";")[0].split("/")[1]
-                    else:
-                        image_b64 = image_data
-                        image_format = "jpeg"
-                    
-                    # Decode base64 to image
-                    image_bytes = base64.b64decode(image_b64)
-                    image = Image.open(BytesIO(image_bytes))
-                    
-                    # Convert PIL image to numpy array for OpenCV
-                    img_array = np.array(image)
-                    
-                    # Convert RGB to BGR for OpenCV processing
-                    if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                    else:
-                        img_bgr = img_array
-                    
-                    # Get image dimensions
-                    height, width = img_bgr.shape[:2]
-                    
-                    # Calculate timestamp for MediaPipe
-                    timestamp_ms = int((frame_count / fps) * 1000)
-                    
-                    # Create MediaPipe Image and detect pose landmarks
-                    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
-                    
-                    # Detect pose landmarks
-                    detection_result = detector.detect_for_video(mp_image, timestamp_ms)
-                    
-                    # Draw landmarks on the image
-                    annotated_rgb = draw_landmarks_on_image(mp_image.numpy_view(), detection_result)
-                    annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
-                    
-                    # Process gait analysis and add metrics to frame
-                    processed_frame, gait_metrics = process_gait_analysis(annotated_bgr.copy(), detection_result)
-                    
-                    # Convert processed frame back to base64 with optimized quality
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]  # Reduce quality for faster processing
-                    _, buffer = cv2.imencode('.jpg', processed_frame, encode_param)
-                    processed_b64 = base64.b64encode(buffer).decode('utf-8')
-                    processed_data_url = f"data:image/jpeg;base64,{processed_b64}"
-                    
-                    print(f"Frame {frame_count} processed: {width}x{height}")
-                    
-                    # Pair swing and stride data into objects for the last 50 measurements
-                    past_metrics_paired = []
-                    swing_data = swingLens[-50:]
-                    stride_data = strideLens[-50:]
-                    min_length = min(len(swing_data), len(stride_data))
-                    
-                    for i in range(min_length):
-                        past_metrics_paired.append({
-                            "swing_length": swing_data[i],
-                            "stride_length": stride_data[i]
-                        })
-
-                    # Send processed image and metrics back to frontend
-                    response = {
-                        "status": "success",
-                        "message": "Frame processed with gait analysis",
-                        "processed_image": processed_data_url,
-                        "dimensions": {"width": width, "height": height},
-                        "gait_metrics": gait_metrics,
-                        "past_metrics": past_metrics_paired,
-                        "frame_count": frame_count
-                    }
-                    
-                    await websocket.send_text(json.dumps(response))
-                
-                else:
-                    # Handle other message types
-                    print(f"Received message: {message}")
-                    await websocket.send_text(json.dumps({
-                        "status": "received",
-                        "message": "Message received but no image found"
-                    }))
-                    
-            except json.JSONDecodeError:
+                message = orjson.loads(data)
+            except orjson.JSONDecodeError:
                 # Handle direct base64 string (fallback)
-                if "data:image/" in data:
-                    image_b64 = data.split(",")[1]
-                else:
-                    image_b64 = data
-                
+                receive_frame(slot, IngestedFrame("base64", data, received_at), recorder)
+                continue
+
+            # Only JSON objects carry frames or commands; other JSON (a list, a string) is just acknowledged
+            is_object = isinstance(message, dict)
+            if is_object and "image" in message:
+                receive_frame(slot, IngestedFrame(
+                    "json", message["image"], received_at, message.get("frame_id"), capture_time_ms(message)),
+                    recorder)
+            elif is_object and message.get("type") == "config":
                 try:
-                    image_bytes = base64.b64decode(image_b64)
-                    image = Image.open(BytesIO(image_bytes))
-                    img_array = np.array(image)
-                    
-                    if len(img_array.shape) == 3:
-                        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                    else:
-                        img_bgr = img_array
-                    
-                    height, width = img_bgr.shape[:2]
-                    timestamp_ms = int((frame_count / fps) * 1000)
-                    
-                    # Process with MediaPipe
-                    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
-                    detection_result = detector.detect_for_video(mp_image, timestamp_ms)
-                    
-                    # Draw landmarks and process gait analysis
-                    annotated_rgb = draw_landmarks_on_image(mp_image.numpy_view(), detection_result)
-                    annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
-                    processed_frame, gait_metrics = process_gait_analysis(annotated_bgr.copy(), detection_result)
-                    
-                    # Convert back to base64 with optimized quality
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-                    _, buffer = cv2.imencode('.jpg', processed_frame, encode_param)
-                    processed_b64 = base64.b64encode(buffer).decode('utf-8')
-                    processed_data_url = f"data:image/jpeg;base64,{processed_b64}"
-                    
-                    print(f"Direct base64 frame {frame_count} processed: {width}x{height}")
-                    
-                    await websocket.send_text(json.dumps({
-                        "status": "success",
-                        "message": "Frame processed with gait analysis",
-                        "processed_image": processed_data_url,
-                        "dimensions": {"width": width, "height": height},
-                        "gait_metrics": gait_metrics,
-                        "frame_count": frame_count
-                    }))
-                    
-                except Exception as e:
-                    print(f"Error processing direct base64: {e}")
-                    await websocket.send_text(json.dumps({
-                        "status": "error",
-                        "message": f"Error processing image: {str(e)}"
-                    }))
+                    if "model" in message:
+                        check_model_installed(str(message["model"]))
+                    config.update(message)
+                    if recorder is not None:
+                        recorder.config(config.to_dict(), received_at)
+                    await send_message(websocket, {"status": "configured", "config": config.to_dict()}, config)
+                except ValueError as e:
+                    await send_message(websocket, {"status": "error", "message": str(e)}, config)
+            elif is_object and message.get("type") == "snapshot":
+                # The client lost its history window: resend it with the next reply
+                history.request_snapshot()
+            else:
+                # Handle other message types
+                logger.debug("Received message without image: %s", message)
+                await send_message(websocket, {
+                    "status": "received",
+                    "message": "Message received but no image found"
+                }, config)
                     
     except WebSocketDisconnect:
-        print("WebSocket disconnected")
+        logger.info("WebSocket disconnected (session %s)", session.session_id)
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        logger.warning("WebSocket error (session %s): %s", session.session_id, e)
         try:
-            await websocket.send_text(json.dumps({
+            await send_message(websocket, {
                 "status": "error",
                 "message": f"Connection error: {str(e)}"
-            }))
+            }, config)
         except:
-            pass
\ No newline at end of file
+            pass
+    finally:
+        slot.close()
+        active_slots.discard(slot)
+        processor.cancel()
+        if recorder is not None:
+            recorder.close()
+        sessions.release(session)
@@ -0,0 +1,96 @@
+"""Per-session media clock built from client capture timestamps.
+
+Frames used to be stamped frame_count / 30 s, whatever the camera really
+delivered. Webcams run at variable frame rates and frames are dropped on the
+way (see ingest.py), so that clock squeezed every gap to 33 ms: peak
+distances could not be turned into seconds and the landmarker's VIDEO mode
+tracking saw implausible motion.
+
+Clients now send the capture time of each frame: the timestamp field of the
+binary header (see frame_protocol.py), or timestamp_ms (a number) or
+timestamp (an ISO 8601 string) in JSON frame messages. A frame without one
+(0 in the binary header, a bare data URL) is stamped with the time the
+server received it, which at least keeps real gaps.
+
+MediaClock maps those times onto one monotonic millisecond timeline per
+session, starting at 0:
+
+* times from one source keep their real spacing, so dropped frames leave
+  gaps of the right length;
+* a new connection or a switch between capture and arrival times starts a
+  new segment one nominal frame after the last frame, because the client's
+  clock (e.g. performance.now() after a page reload) has nothing to do with
+  the previous one;
+* a source that jumps backwards or more than max_gap_ms forwards is
+  treated the same way;
+* a session resumed from its stored recording (see gait_session.py)
+  continues after the last stored frame instead of starting at 0 again;
+* every stamp is an integer strictly after the previous one, as MediaPipe
+  requires in VIDEO mode.
+"""
+import math
+from datetime import datetime
+
+NOMINAL_FRAME_MS = 1000 / 30
+MAX_GAP_MS = 10_000.0
+
+
+def capture_time_ms(message):
+    """Capture time a JSON frame message carries, in ms (None if it has none)"""
+    value = message.get("timestamp_ms")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    value = message.get("timestamp")
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp() * 1000
+        except ValueError:
+            return None
+    return None
+
+
+class MediaClock:
+    """Monotonic media time of one session's frames, in milliseconds"""
+
+    def __init__(self, frame_ms=NOMINAL_FRAME_MS, max_gap_ms=MAX_GAP_MS):
+        self.frame_ms = frame_ms  # spacing assumed where a new segment starts
+        self.max_gap_ms = max_gap_ms
+        self.now_ms = None  # media time of the last frame
+        self.segments = 0  # number of times the clock was rebased
+        self._source = None  # "capture" or "arrival"
+        self._offset = None  # media time minus source time in the current segment
+
+    def rebase(self):
+        """Start a new segment with the next frame (e.g. when a client reconnects)"""
+        self._offset = None
+
+    def resume(self, now_ms):
+        """Continue an earlier timeline: the next frame starts a new segment after now_ms"""
+        self.now_ms = int(now_ms)
+        self._offset = None
+
+    def stamp(self, capture_ms=None, received_at=None):
+        """Media time of the next frame from its capture time in ms or, failing that,
+        its time.perf_counter() arrival time in seconds"""
+        if capture_ms is not None and math.isfinite(capture_ms) and capture_ms > 0:
+            source, source_ms = "capture", float(capture_ms)
+        else:
+            source, source_ms = "arrival", received_at * 1000
+
+        if self.now_ms is None:
+            self._offset = -source_ms
+        elif self._offset is None or source != self._source:
+            self._offset = self.now_ms + self.frame_ms - source_ms
+            self.segments += 1
+        else:
+            step = source_ms + self._offset - self.now_ms
+            if step < 0 or step > self.max_gap_ms:
+                self._offset = self.now_ms + self.frame_ms - source_ms
+                self.segments += 1
+        self._source = source
+
+        media_ms = round(source_ms + self._offset)
+        if self.now_ms is not None and media_ms <= self.now_ms:
+            media_ms = self.now_ms + 1
+        self.now_ms = media_ms
+        return media_ms
@@ -0,0 +1,64 @@
+"""Stride/swing history sent to clients with their frame replies.
+
+Every reply used to carry the last 50 stride/swing pairs ("past_metrics"),
+rebuilt as 50 dicts and serialized again each frame although 49 of them had
+just been sent. With history=delta (see stream_config.py) a connection only
+receives the samples it has not seen yet:
+
+    "past_metrics_delta": {
+        "seq": 1234,               # sequence number of the first sample
+        "snapshot": false,         # true: replace the window, false: append
+        "stride_length": [41],
+        "swing_length": [-12]
+    }
+
+Sequence numbers count every sample the session ever measured (RingBuffer
+.total), so a client can tell where a delta belongs. The first reply on a
+connection, the first after a {"type": "snapshot"} message, and any reply
+after the client fell more than a window behind carry a snapshot of the last
+WINDOW samples instead. The client keeps its own window; the work per frame
+no longer depends on the window size.
+"""
+
+WINDOW = 50
+
+
+def past_metrics(stride_lens, swing_lens, window=WINDOW):
+    """The last `window` stride/swing pairs as a list of dicts (history=window)"""
+    return [
+        {"swing_length": swing, "stride_length": stride}
+        for swing, stride in zip(swing_lens.last(window).tolist(), stride_lens.last(window).tolist())
+    ]
+
+
+class HistoryCursor:
+    """How far one connection has received each stride/swing history"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._next = {}  # history key -> sequence number of the next sample to send
+
+    def request_snapshot(self):
+        """Send full windows again with the next replies"""
+        self._next.clear()
+
+    def retain(self, keys):
+        """Forget histories (e.g. people no longer tracked) not in keys"""
+        for key in self._next.keys() - set(keys):
+            del self._next[key]
+
+    def delta(self, key, stride_lens, swing_lens):
+        """Samples of a history this connection has not received yet"""
+        total = min(stride_lens.total, swing_lens.total)
+        start = self._next.get(key)
+        snapshot = start is None or total - start > self.window or start > total
+        if snapshot:
+            start = total - min(self.window, len(stride_lens), len(swing_lens))
+        count = total - start
+        self._next[key] = total
+        return {
+            "seq": start,
+            "snapshot": snapshot,
+            "stride_length": stride_lens.last(count).tolist(),
+            "swing_length": swing_lens.last(count).tolist(),
+        }
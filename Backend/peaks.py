@@ -0,0 +1,243 @@
+"""Peak detection on stride/swing length series.
+
+getPeakDist is the original batch implementation: smooth the whole history
+with a boxcar moving average and run scipy.signal.find_peaks over it. Its cost
+grows with the length of the history, which made every frame slower the
+longer a session ran.
+
+StreamingPeakDetector finds peaks one sample at a time in O(1) amortized
+work per sample. It keeps a running moving-average window and
+confirms each local maximum as soon as its distance and prominence are
+settled, following the same rules as find_peaks:
+
+* the smoothed value at index i is the mean of raw samples i - w//2 through
+  i + (w-1)//2, zero padded, exactly like np.convolve(..., mode='same'). A
+  smoothed value is therefore final (w-1)//2 samples after it was received;
+* local maxima may be flat plateaus, reported at their middle index;
+* peaks closer than `distance` are thinned by keeping the highest first,
+  before the prominence filter is applied (equally high peaks are visited
+  right to left; find_peaks leaves that order to numpy's unstable argsort);
+* prominence is measured against the lowest point on each side up to the
+  nearest higher sample (or the start/end of the series).
+
+Because find_peaks sees the zero padding at the end of the history, the batch
+version can report spurious peaks near the newest samples that later
+disappear. The streaming detector only reports peaks that can no longer
+change; flush() applies the end-of-series padding when a recording ends.
+
+The two agree on the sample series (python -m Backend.check_peaks), but not
+on every input. Fuzzing against find_peaks turned up differences
+
+* between equally high plateaus or peaks, where find_peaks' order is not
+  defined;
+* for peaks whose prominence is exactly the threshold, where the running
+  sums round differently from np.convolve;
+* on series shorter than the smoothing window.
+
+Peak distances, not exact indices, are what the gait metrics rely on.
+"""
+from collections import deque
+
+import numpy as np
+from scipy.signal import find_peaks
+
+WINDOW_SIZE = 10
+PEAK_DISTANCE = 10
+PEAK_PROMINENCE = 10
+
+
+def find_smoothed_peaks(lengths, window_size=WINDOW_SIZE, distance=PEAK_DISTANCE, prominence=PEAK_PROMINENCE):
+    """Indices of peaks in the moving-average smoothed series"""
+    smooth = np.convolve(lengths, np.ones(window_size)/window_size, mode='same')
+    peaks, properties = find_peaks(smooth,
+                                   height=None,  # minimum height of peaks
+                                   distance=distance,  # minimum distance between peaks
+                                   prominence=prominence)
+    return peaks
+
+
+def average_peak_distance(peaks, last=3):
+    """Average of the last `last` distances between peaks, all of them if last is None (nan if there are none)"""
+    peak_distances = np.diff(peaks)
+
+    # Calculate average of the most recent peak distances only
+    if last is not None and len(peak_distances) >= last:
+        last_distances = peak_distances[-last:]
+        average_peak_distance = np.mean(last_distances)
+    elif len(peak_distances) > 0:
+        # If we have fewer (or all were asked for), use all available
+        average_peak_distance = np.mean(peak_distances)
+    else:
+        # No peak distances found
+        average_peak_distance = float('nan')
+
+    return average_peak_distance
+
+
+def getPeakDist(lengths, last=3):
+    """Batch version: re-analyses the whole history on every call"""
+    return average_peak_distance(find_smoothed_peaks(lengths), last)
+
+
+class _Candidate:
+    """A local maximum of the smoothed series awaiting confirmation"""
+
+    __slots__ = ("index", "value", "left_ok", "right_min", "right_open", "kept")
+
+    def __init__(self, index, value, left_min, prominence):
+        self.index = index
+        self.value = value
+        self.left_ok = value - left_min >= prominence
+        self.right_min = value
+        self.right_open = True  # still scanning right for the prominence base
+        self.kept = None  # distance filter verdict, None until resolved
+
+    def right_ok(self, prominence):
+        return self.value - self.right_min >= prominence
+
+
+class StreamingPeakDetector:
+    """Online counterpart of find_smoothed_peaks / getPeakDist (see the module docstring for where they differ)"""
+
+    def __init__(self, window_size=WINDOW_SIZE, distance=PEAK_DISTANCE, prominence=PEAK_PROMINENCE):
+        self.window_size = window_size
+        self.distance = int(np.ceil(distance))
+        self.prominence = prominence
+        self.lag = (window_size - 1) // 2
+
+        # Moving average over the raw samples
+        self._window = deque()
+        self._window_sum = 0
+        self._raw_count = 0
+
+        # Smoothed series state
+        self._count = 0  # number of finalised smoothed values
+        self._prev = None
+        self._left_stack = []  # (value, min of its segment), values strictly decreasing
+        self._plateau = None  # (start index, value, left min) of a rising plateau
+
+        # Candidates waiting for the distance filter (one cluster) and for
+        # their right-hand prominence base
+        self._cluster = []
+        self._pending = deque()
+
+        self.peak_count = 0
+        self.recent_peaks = deque(maxlen=4)
+
+    def update(self, value):
+        """Add a raw sample; returns the indices of newly confirmed peaks"""
+        self._window.append(value)
+        self._window_sum += value
+        if len(self._window) > self.window_size:
+            self._window_sum -= self._window.popleft()
+        self._raw_count += 1
+
+        # The smoothed value lag samples back now has its full window
+        index = self._raw_count - 1 - self.lag
+        if index < 0:
+            return []
+        return self._push(self._window_sum / self.window_size)
+
+    def flush(self):
+        """Finish the series (zero padding the tail) and confirm the last peaks"""
+        confirmed = []
+        while self._count < self._raw_count:
+            # Slide the window past the end of the series
+            self._window.append(0)
+            if len(self._window) > self.window_size:
+                self._window_sum -= self._window.popleft()
+            confirmed += self._push(self._window_sum / self.window_size)
+
+        # A plateau running into the last sample is not a peak
+        self._plateau = None
+        self._resolve_cluster()
+        for candidate in self._pending:
+            candidate.right_open = False
+        confirmed += self._confirm()
+        return confirmed
+
+    def average_distance(self):
+        """Average of the last 3 distances between confirmed peaks"""
+        return average_peak_distance(list(self.recent_peaks))
+
+    def _push(self, y):
+        index = self._count
+        self._count += 1
+
+        # Lowest value between this sample and the nearest higher one on its left
+        left_min = y
+        while self._left_stack and self._left_stack[-1][0] <= y:
+            left_min = min(left_min, self._left_stack.pop()[1])
+        self._left_stack.append((y, left_min))
+
+        # Extend the right-hand prominence base of every open candidate
+        for candidate in self._pending:
+            if candidate.right_open:
+                if y > candidate.value:
+                    candidate.right_open = False
+                elif y < candidate.right_min:
+                    candidate.right_min = y
+                    if candidate.right_ok(self.prominence):
+                        candidate.right_open = False
+
+        # Local maxima, including flat plateaus reported at their middle
+        prev = self._prev
+        self._prev = y
+        if prev is not None:
+            if prev < y:
+                self._plateau = (index, y, left_min)
+            elif self._plateau is not None and y < self._plateau[1]:
+                start, value, plateau_left_min = self._plateau
+                self._plateau = None
+                self._add_candidate((start + index - 1) // 2, value, plateau_left_min, y)
+
+        # Once no future peak can come within `distance` of the cluster, thin it
+        if self._cluster:
+            earliest_next = self._plateau[0] if self._plateau is not None else index
+            if earliest_next - self._cluster[-1].index >= self.distance:
+                self._resolve_cluster()
+
+        return self._confirm()
+
+    def _add_candidate(self, index, value, left_min, next_value):
+        candidate = _Candidate(index, value, left_min, self.prominence)
+        # The plateau itself and the sample that ended it lie on the right side
+        candidate.right_min = next_value
+        if candidate.right_ok(self.prominence):
+            candidate.right_open = False
+        self._cluster.append(candidate)
+        self._pending.append(candidate)
+
+    def _resolve_cluster(self):
+        """Apply the find_peaks distance rule to a closed group of nearby peaks"""
+        cluster = self._cluster
+        if not cluster:
+            return
+        self._cluster = []
+
+        for candidate in cluster:
+            candidate.kept = True
+        heights = np.array([candidate.value for candidate in cluster])
+        for position in np.argsort(heights, kind="stable")[::-1]:
+            candidate = cluster[position]
+            if not candidate.kept:
+                continue
+            for other in cluster:
+                if other is not candidate and abs(other.index - candidate.index) < self.distance:
+                    other.kept = False
+
+    def _confirm(self):
+        """Pop settled candidates in index order, returning the accepted peaks"""
+        confirmed = []
+        while self._pending:
+            candidate = self._pending[0]
+            if candidate.kept is None:
+                break
+            if candidate.kept and candidate.left_ok and candidate.right_open:
+                break
+            self._pending.popleft()
+            if candidate.kept and candidate.left_ok and candidate.right_ok(self.prominence):
+                confirmed.append(candidate.index)
+                self.recent_peaks.append(candidate.index)
+                self.peak_count += 1
+        return confirmed
@@ -0,0 +1,166 @@
+"""Stable person ids across frames for multi-person gait analysis.
+
+With num_poses > 1 (see stream_config.py) the landmarker can return several
+people per frame, in no particular order. PersonTracker matches the poses of
+each frame to the people seen before:
+
+1. greedily by the overlap (IoU) of their landmark bounding boxes, best
+   pairs first;
+2. poses left over are matched to the nearest remaining person whose box
+   centre is within half a box size of theirs;
+3. anything still unmatched starts a new person.
+
+People that are not seen for max_missed frames are forgotten. Every person
+keeps its own stride/swing history and peak detectors, so the metrics of one
+person are never mixed with another's. The detectors use the session's peak
+window (shorter for smoothed streams, see landmark_filter.py), for people
+seen before and after the window changes. Matching is a handful of NumPy
+operations on (people x poses) arrays, so the cost grows with the number of
+people in frame, not with the history.
+"""
+import math
+
+import numpy as np
+
+from .gait_metrics import cadence_from_period, gait_series
+from .gait_session import RingBuffer, peak_period_ms, replay_peaks
+from .landmark_filter import LandmarkSmoother
+from .peaks import WINDOW_SIZE, StreamingPeakDetector
+
+
+def pose_boxes(landmarks, min_visibility=0.5):
+    """(num_poses, 4) x0, y0, x1, y1 boxes of the visible landmarks (all landmarks if too few)"""
+    points = landmarks[..., :2]
+    visible = landmarks[..., 3] >= min_visibility
+    visible[visible.sum(axis=1) < 4] = True
+    low = np.where(visible[..., None], points, np.inf).min(axis=1)
+    high = np.where(visible[..., None], points, -np.inf).max(axis=1)
+    return np.concatenate([low, high], axis=1)
+
+
+def box_iou(a, b):
+    """(len(a), len(b)) intersection over union of two sets of boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class PersonTrack:
+    """Gait history of one tracked person"""
+
+    def __init__(self, person_id, box, history_size, peak_window=WINDOW_SIZE):
+        self.person_id = person_id
+        self.box = box
+        self.missed = 0
+        self.frames = 0
+        self.stride_lens = RingBuffer(history_size)
+        self.swing_lens = RingBuffer(history_size)
+        self.sample_times = RingBuffer(history_size, dtype=np.int64)
+        self.stride_peaks = StreamingPeakDetector(peak_window)
+        self.swing_peaks = StreamingPeakDetector(peak_window)
+        self._peak_origin = 0  # sample the peak detectors' index 0 refers to
+        self.smoother = LandmarkSmoother()  # used when the stream smooths landmarks
+        self.gait_metrics = {}
+
+    def add(self, stride_length, swing_length, timestamp_ms):
+        """Record this frame's stride and swing and refresh the person's metrics"""
+        self.frames += 1
+        self.stride_lens.append(stride_length)
+        self.swing_lens.append(swing_length)
+        self.sample_times.append(timestamp_ms)
+        self.stride_peaks.update(stride_length)
+        self.swing_peaks.update(swing_length)
+        avg_stride = self.stride_peaks.average_distance()
+        avg_swing = self.swing_peaks.average_distance()
+        stride_period = peak_period_ms(self.stride_peaks, self.sample_times, self._peak_origin)
+        swing_period = peak_period_ms(self.swing_peaks, self.sample_times, self._peak_origin)
+        cadence = cadence_from_period(stride_period)
+        self.gait_metrics = {
+            "person_id": self.person_id,
+            "stride_length": stride_length,
+            "swing_length": swing_length,
+            "avg_stride": None if math.isnan(avg_stride) else avg_stride,
+            "avg_swing": None if math.isnan(avg_swing) else avg_swing,
+            "stride_period_ms": None if math.isnan(stride_period) else round(stride_period, 1),
+            "swing_period_ms": None if math.isnan(swing_period) else round(swing_period, 1),
+            "cadence": None if math.isnan(cadence) else round(cadence, 1),
+            "frames": self.frames,
+        }
+
+    def set_peak_window(self, window_size):
+        """Switch the peak detectors' moving average window, replaying the history into them"""
+        if window_size != self.stride_peaks.window_size:
+            self.stride_peaks, self.swing_peaks, self._peak_origin = replay_peaks(
+                self.stride_lens, self.swing_lens, window_size)
+
+
+class PersonTracker:
+    """Assigns stable ids to the poses of consecutive frames"""
+
+    def __init__(self, history_size=1800, iou_threshold=0.3, max_missed=15, peak_window=WINDOW_SIZE):
+        self.history_size = history_size
+        self.peak_window = peak_window
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, landmarks):
+        """Match a frame's (num_poses, 33, 4) landmarks to people; returns one PersonTrack per pose"""
+        boxes = pose_boxes(landmarks) if len(landmarks) else np.empty((0, 4))
+        assigned = [None] * len(boxes)
+        unmatched_tracks = list(range(len(self.tracks)))
+
+        if self.tracks and len(boxes):
+            track_boxes = np.array([track.box for track in self.tracks])
+            iou = box_iou(track_boxes, boxes)
+            while iou.size and iou.max() >= self.iou_threshold:
+                t, p = np.unravel_index(np.argmax(iou), iou.shape)
+                assigned[p] = self.tracks[t]
+                unmatched_tracks.remove(t)
+                iou[t, :] = -1
+                iou[:, p] = -1
+
+            # Fast movers barely overlap their previous box: fall back to centre distance
+            for p in (p for p, track in enumerate(assigned) if track is None):
+                if not unmatched_tracks:
+                    break
+                centre = (boxes[p, :2] + boxes[p, 2:]) / 2
+                candidates = track_boxes[unmatched_tracks]
+                centres = (candidates[:, :2] + candidates[:, 2:]) / 2
+                sizes = np.maximum(candidates[:, 2:] - candidates[:, :2], 1e-6).max(axis=1)
+                distance = np.hypot(*(centres - centre).T) / sizes
+                best = int(np.argmin(distance))
+                if distance[best] <= 0.5:
+                    assigned[p] = self.tracks[unmatched_tracks.pop(best)]
+
+        for p, track in enumerate(assigned):
+            if track is None:
+                track = assigned[p] = PersonTrack(self._next_id, boxes[p], self.history_size, self.peak_window)
+                self._next_id += 1
+                self.tracks.append(track)
+            track.box = boxes[p]
+            track.missed = 0
+
+        for t in unmatched_tracks:
+            self.tracks[t].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return assigned
+
+    def set_peak_window(self, window_size):
+        """Peak window of every person's detectors, now and for people found later"""
+        self.peak_window = window_size
+        for track in self.tracks:
+            track.set_peak_window(window_size)
+
+    def add_gait(self, landmarks, people, width, height, timestamp_ms):
+        """Measure stride and swing of every pose in one pass and add them to their people"""
+        if not people:
+            return
+        stride, swing = gait_series(landmarks, width, height)
+        for track, stride_length, swing_length in zip(people, stride.tolist(), swing.tolist()):
+            track.add(int(stride_length), int(swing_length), timestamp_ms)
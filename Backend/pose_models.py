@@ -0,0 +1,64 @@
+"""Pose landmarker models and options selectable per session.
+
+Sessions pick a model tier, whether segmentation masks are produced and the
+detection/presence/tracking confidence thresholds (see stream_config.py).
+Masks are off unless asked for: nothing in the server uses them, and
+producing one costs inference time and a full-frame buffer per frame.
+
+ModelCache reads each .task file from disk once and shares the bytes between
+all landmarkers created from it. Landmarkers themselves cannot be shared:
+each frame worker creates one for every session and set of options it is
+asked for (see frame_workers.py), because VIDEO mode tracks one stream per
+instance and needs increasing timestamps.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+DEFAULT_MODEL_DIR = 'Backend/Gait Detection'
+
+# Model tier -> .task file; "default" is the model the server always used
+MODEL_FILES = {
+    "default": "pose_landmarker.task",
+    "lite": "pose_landmarker_lite.task",
+    "full": "pose_landmarker_full.task",
+    "heavy": "pose_landmarker_heavy.task",
+}
+
+
+@dataclass(frozen=True)
+class PoseModelOptions:
+    """Everything that needs a separate landmarker instance (hashable cache key)"""
+    model: str = "default"
+    segmentation: bool = False
+    detection_confidence: float = 0.5
+    presence_confidence: float = 0.5
+    tracking_confidence: float = 0.5
+    num_poses: int = 1
+
+
+class ModelCache:
+    """Reads each model file once and hands out its bytes"""
+
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR):
+        self.model_dir = model_dir
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def path(self, model):
+        if model not in MODEL_FILES:
+            raise ValueError(f"Unknown pose model {model!r}, expected one of {tuple(MODEL_FILES)}")
+        return os.path.join(self.model_dir, MODEL_FILES[model])
+
+    def buffer(self, model):
+        """Contents of a model's .task file, loaded on first use"""
+        with self._lock:
+            data = self._buffers.get(model)
+            if data is None:
+                with open(self.path(model), "rb") as f:
+                    data = self._buffers[model] = f.read()
+            return data
+
+    def available(self):
+        """Model tiers whose .task file exists"""
+        return [model for model in MODEL_FILES if os.path.exists(self.path(model))]
@@ -0,0 +1,256 @@
+"""Frame workers in separate processes, for using more than one core.
+
+FrameWorkerPool (frame_workers.py) runs frames on threads of the server
+process. MediaPipe releases the GIL during inference, but the Python around
+it (landmark packing, gait analysis, drawing calls) does not, so one process
+tops out well below one core per worker. With GAIT_PROCESS_WORKERS=N the
+server instead starts N worker processes and becomes a gateway:
+
+* the gateway owns the WebSocket connections and the authoritative
+  GaitSession of every client; frames of a session always go to the same
+  worker (crc32 of the session id, like FrameWorkerPool) so its landmarker
+  sees the session's frames in order;
+* each worker keeps a working copy of the sessions routed to it and runs
+  the same frame functions as the thread pool (process_binary_payload,
+  process_base64_image) on it, with its own landmarkers. Those live in
+  frame_analysis.py, which has no import side effects: a worker never
+  imports main.py, so it opens no results database, landmark store or
+  recording of its own;
+* with every result the worker sends back what the frame added to the
+  session (frame count, new stride/swing samples and their media times,
+  recorded landmark rows);
+  the gateway applies it to its own GaitSession, so replies, the delta
+  history channel and landmark recording work as in thread mode;
+* the first job of a session on a worker carries session.export_state(),
+  so a worker that crashed and was restarted picks up every session where
+  the gateway left it. Only the adaptive crop and multi-person tracks
+  (which re-acquire within a few frames) start over.
+
+Requests and results travel over one multiprocessing queue pair per worker;
+frames cross as their encoded bytes, so a 1080p JPEG costs a few hundred
+kilobytes of copying, not a decoded frame. With a shared frame ring (see
+shm_ring.py) not even those: the gateway decodes into shared memory and
+the workers only run inference and annotate in place. Per-person histories of
+multi-pose streams stay in the worker, so replies there carry the people's
+current metrics but not people_past_metrics.
+
+To check scaling on one machine, run the server with different worker counts
+and the same load, e.g.
+
+    GAIT_PROCESS_WORKERS=4 uvicorn Backend.main:app
+    python -m Backend.benchmark --clients 8 --fps 30 --out workers4.json
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import zlib
+
+from .gait_session import GaitSession
+from .shm_ring import attach_worker_ring
+
+logger = logging.getLogger("gait.workers")
+
+
+class CapturedRows:
+    """Stands in for a LandmarkWriter in a worker: keeps the rows for the gateway to write"""
+
+    def __init__(self):
+        self.rows = []
+
+    def append(self, *row):
+        self.rows.append(row)
+
+    def take(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _worker_main(index, requests, results, history_size, ring_spec):
+    """Worker process: run frame jobs on its own copies of the sessions"""
+    attach_worker_ring(ring_spec)
+    sessions = {}
+    while True:
+        message = requests.get()
+        if message is None:
+            return
+        if message[0] == "forget":
+            sessions.pop(message[1], None)
+            # Imported here: only workers that ran frames have landmarkers to close
+            from .frame_analysis import landmarkers
+            landmarkers.forget(message[1])
+            continue
+
+        _, job_id, session_id, state, fn, args, session_args = message
+        session = seen = None
+        try:
+            session = sessions.get(session_id)
+            if session is None or state is not None:
+                session = GaitSession(session_id, history_size, CapturedRows())
+                if state is not None:
+                    session.load_state(state)
+                sessions[session_id] = session
+
+            seen = session.stride_lens.total
+            args = list(args)
+            for position in session_args:
+                args[position] = session
+            ok, value = True, fn(*args)
+        except Exception as e:
+            # Exceptions may not pickle; the gateway only reports the message
+            ok, value = False, f"{type(e).__name__}: {e}"
+
+        update = None
+        if seen is not None:
+            # What the frame added to the session, even if it failed halfway
+            update = (
+                session.frame_count,
+                session.stride_lens.since(seen).tolist(),
+                session.swing_lens.since(seen).tolist(),
+                session.sample_times.since(seen).tolist(),
+                session.recorder.take(),
+            )
+        results.put((job_id, ok, value, update))
+
+
+class ProcessWorkerPool:
+    """Frame workers in child processes, with the same run() interface as FrameWorkerPool"""
+
+    def __init__(self, num_workers, history_size=1800, ring=None):
+        if num_workers < 1:
+            raise ValueError("ProcessWorkerPool needs at least one worker")
+        self.num_workers = num_workers
+        self.history_size = history_size
+        self.ring = ring  # SharedFrameRing the workers attach to (see shm_ring.py), optional
+        self._context = multiprocessing.get_context("spawn")
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = [dict() for _ in range(num_workers)]  # job id -> (loop, future)
+        self._synced = [set() for _ in range(num_workers)]  # sessions the current process has
+        self._processes = [None] * num_workers
+        self._requests = [None] * num_workers
+        self._results = [None] * num_workers
+        self._closed = False
+        self.restarts = 0
+        for i in range(num_workers):
+            self._start(i)
+            threading.Thread(target=self._read_results, args=(i,), name=f"frame-results-{i}", daemon=True).start()
+
+    def _start(self, index):
+        self._requests[index] = self._context.Queue()
+        self._results[index] = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._requests[index], self._results[index], self.history_size,
+                  self.ring.spec() if self.ring is not None else None),
+            name=f"frame-process-{index}",
+            daemon=True)
+        process.start()
+        self._processes[index] = process
+
+    def worker_index(self, session_id):
+        """Worker a session is pinned to (stable for the life of the gateway)"""
+        return zlib.crc32(session_id.encode()) % self.num_workers
+
+    async def run(self, session, fn, *args):
+        """Run fn(*args) in the session's worker process, with `session` replaced by the worker's copy
+
+        fn must be a module-level function (it is pickled by reference).
+        The session's new samples and recorded rows are applied here
+        before the result is returned.
+        """
+        index = self.worker_index(session.session_id)
+        session_args = [position for position, arg in enumerate(args) if arg is session]
+        # memoryviews (e.g. binary frame payloads) cannot be pickled
+        args = tuple(
+            None if arg is session else bytes(arg) if isinstance(arg, memoryview) else arg
+            for arg in args)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            state = None
+            if session.session_id not in self._synced[index]:
+                state = session.export_state()
+                self._synced[index].add(session.session_id)
+            job_id = next(self._job_ids)
+            self._pending[index][job_id] = (loop, future)
+            self._requests[index].put(("job", job_id, session.session_id, state, fn, args, session_args))
+
+        ok, value, update = await future
+        if update is not None:
+            frame_count, stride_lengths, swing_lengths, timestamps_ms, rows = update
+            session.frame_count = frame_count
+            session.add_samples(stride_lengths, swing_lengths, timestamps_ms)
+            if session.recorder is not None:
+                for row in rows:
+                    session.recorder.append(*row)
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def forget(self, session_id):
+        """Drop a session's working copy from its worker (once the gateway evicted it)
+
+        Workers keep every session routed to them until told to forget it.
+        """
+        index = self.worker_index(session_id)
+        with self._lock:
+            self._synced[index].discard(session_id)
+            self._requests[index].put(("forget", session_id))
+
+    def _read_results(self, index):
+        """Resolve the futures of one worker; restart the worker if it dies"""
+        while not self._closed:
+            try:
+                job_id, ok, value, update = self._results[index].get(timeout=1.0)
+            except queue.Empty:
+                if not self._closed and not self._processes[index].is_alive():
+                    self._restart(index)
+                continue
+            except (EOFError, OSError):
+                continue
+            with self._lock:
+                loop, future = self._pending[index].pop(job_id, (None, None))
+            if future is None:
+                continue
+            loop.call_soon_threadsafe(_set_result, future, (ok, value, update))
+
+    def _restart(self, index):
+        exitcode = self._processes[index].exitcode
+        logger.warning("Frame worker process %d exited with code %s, restarting", index, exitcode)
+        with self._lock:
+            pending, self._pending[index] = self._pending[index], {}
+            # The new process has no sessions: each one is sent its state again
+            self._synced[index].clear()
+            self._start(index)
+            self.restarts += 1
+        for loop, future in pending.values():
+            loop.call_soon_threadsafe(_set_exception, future, RuntimeError("Frame worker process restarted"))
+
+    def shutdown(self, wait=True):
+        self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            if wait:
+                process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def _set_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future, exception):
+    if not future.done():
+        future.set_exception(exception)
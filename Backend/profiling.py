@@ -0,0 +1,132 @@
+"""Per-stage timing of the frame path and the /metrics endpoint.
+
+StageTimer records how long each stage of processing one frame took by
+taking a lap at the end of every stage, so timing a frame costs one
+perf_counter() call per stage. Clients that connect with ?timings=1 get the
+laps back in every reply (see stream_config.py); the benchmark harness
+(benchmark.py) uses them to break round-trip latency down by stage.
+
+Every frame's laps are also added to fixed-bucket histograms in
+ServerMetrics, which renders them together with frame counters and gauges in
+the Prometheus text format for GET /metrics. Adding a frame only increments
+a few integers, so the histograms can stay on for every frame.
+"""
+import bisect
+import threading
+import time
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class StageTimer:
+    """Lap timer: lap(stage) records the time since the previous lap in ms"""
+
+    __slots__ = ("timings", "_last")
+
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def skip(self):
+        """Restart the clock without recording the time since the last lap"""
+        self._last = time.perf_counter()
+
+    def rounded(self):
+        return {stage: round(ms, 2) for stage, ms in self.timings.items()}
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def render(self, name, labels=""):
+        """Prometheus text lines for this histogram"""
+        separator = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class ServerMetrics:
+    """Stage histograms and frame counters of the whole server"""
+
+    COUNTERS = {
+        "frames_received": "Frames received from clients",
+        "frames_dropped": "Frames replaced by a newer frame before processing",
+        "frames_processed": "Frames processed and answered",
+        "frame_errors": "Frames that failed to process",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.latency = Histogram()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def observe_frame(self, timer, lag_ms):
+        """Add one processed frame: its stage laps and the time from receipt to reply"""
+        with self._lock:
+            for stage, ms in timer.timings.items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram()
+                histogram.observe(ms / 1000)
+            self.latency.observe(lag_ms / 1000)
+            self.counters["frames_processed"] += 1
+
+    def render(self, gauges):
+        """Prometheus text exposition; gauges maps name -> (help, value)"""
+        lines = []
+        with self._lock:
+            for name, description in self.COUNTERS.items():
+                lines += [
+                    f"# HELP gait_{name}_total {description}",
+                    f"# TYPE gait_{name}_total counter",
+                    f"gait_{name}_total {self.counters[name]}",
+                ]
+            lines += [
+                "# HELP gait_stage_duration_seconds Time spent in each stage of processing a frame",
+                "# TYPE gait_stage_duration_seconds histogram",
+            ]
+            for stage, histogram in sorted(self.stages.items()):
+                lines += histogram.render("gait_stage_duration_seconds", f'stage="{stage}"')
+            lines += [
+                "# HELP gait_frame_latency_seconds Time from receiving a frame to sending its reply",
+                "# TYPE gait_frame_latency_seconds histogram",
+            ]
+            lines += self.latency.render("gait_frame_latency_seconds")
+        for name, (description, value) in gauges.items():
+            lines += [
+                f"# HELP gait_{name} {description}",
+                f"# TYPE gait_{name} gauge",
+                f"gait_{name} {value}",
+            ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,222 @@
+"""Replay recorded frames through the /ws/image frame handlers.
+
+Usage (from the repository root):
+
+    python -m Backend.replay gait_recordings/<session>-<ms>.gfr --out metrics.jsonl
+    python -m Backend.replay "Backend/Gait Detection/<clip>.mp4" --out metrics.jsonl
+    python -m Backend.replay recording.gfr --paced --speed 2 --out metrics.jsonl
+
+The input is a recording made with GAIT_RECORD_DIR (see frame_recording.py)
+or a video file, which is turned into binary JPEG frames stamped at the
+video's frame rate first (--save-recording keeps them as a recording, so the
+bundled clips become a fixed regression corpus). Frames go through the same
+code as a live connection: IngestedFrame, LatestFrameSlot and main's frame
+handlers, with the recorded config messages applied in between. Only the
+WebSocket is replaced, by a sink that collects the replies. main is
+imported with GAIT_NO_SINKS=1, so a replay never writes replayed sessions
+to the results database, the landmark store or new recordings.
+
+By default every frame is processed, one after the other, as fast as
+possible. Frames without a capture time are stamped with their recorded
+arrival time, so the replay is deterministic and two runs of the same
+recording write the same metrics file. With --paced frames are handed in at
+their recorded arrival times (divided by --speed) while main's processing
+loop runs, so frames are dropped under load like they were live.
+
+--out gets one JSON line per reply (gait metrics or errors). Processed
+images and the timing fields that differ from run to run (timings_ms,
+ingest.lag_ms) are left out unless --keep-timings is given. The summary printed at the end
+has throughput and the mean time of each processing stage. To profile, run
+the replay under a profiler, e.g. python -m cProfile -m Backend.replay ...
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import cv2
+import msgpack
+import orjson
+
+# Replays write nothing but --out: no results database, landmark store or recordings,
+# whatever the environment configures for the server
+os.environ["GAIT_NO_SINKS"] = "1"
+
+from . import main as server  # noqa: E402 (reads GAIT_NO_SINKS at import)
+from .benchmark import load_clip
+from .frame_protocol import CODEC_JPEG, FRAME_MAGIC, FrameHeader, pack_frame
+from .frame_recording import (
+    KIND_BINARY, KIND_CONFIG, KIND_JSON, RECORDING_EXTENSION, Record, read_recording, write_recording)
+from .gait_session import GaitSession
+from .ingest import IngestedFrame, LatestFrameSlot
+from .metrics_history import HistoryCursor
+from .stream_config import StreamConfig
+
+if not server.no_sinks:
+    raise ImportError("Backend.main was imported before Backend.replay, with the server's sinks enabled")
+
+VOLATILE_FIELDS = ("timings_ms",)
+
+
+class ReplaySocket:
+    """Stands in for the client's WebSocket: keeps every reply the handlers send"""
+
+    def __init__(self):
+        self.replies = []
+        self.frames = 0  # binary frames (annotated images or landmarks) sent back
+
+    async def send_bytes(self, data):
+        if data[:2] == FRAME_MAGIC:
+            self.frames += 1
+        else:
+            self.replies.append(msgpack.unpackb(data))
+
+    async def send_text(self, data):
+        self.replies.append(orjson.loads(data))
+
+
+def video_recording(path, width=None, quality=80):
+    """A video as (arrival ms, binary frame message) pairs at its frame rate"""
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    capture.release()
+    interval_ms = 1000 / fps
+    frames = load_clip(path, width, float("inf"), quality)
+    return [
+        # Capture times start one frame in: 0 means "unknown" (see media_clock.py)
+        (i * interval_ms, pack_frame(FrameHeader(i, (i + 1) * interval_ms, CODEC_JPEG, w, h), payload))
+        for i, (payload, w, h) in enumerate(frames)
+    ]
+
+
+def load_input(path, width=None, quality=80, save_recording=None):
+    """Records of a recording file or of a video converted to binary frames"""
+    if path.endswith(RECORDING_EXTENSION):
+        return list(read_recording(path))
+    messages = video_recording(path, width, quality)
+    if save_recording is not None:
+        write_recording(save_recording, messages)
+    return [Record(KIND_BINARY, arrival_ms, None, message) for arrival_ms, message in messages]
+
+
+def ingested(record, received_at):
+    """The IngestedFrame a live connection would have made of a recorded frame"""
+    if record.kind == KIND_BINARY:
+        return IngestedFrame("binary", record.payload, received_at)
+    kind = "json" if record.kind == KIND_JSON else "base64"
+    return IngestedFrame(kind, record.text(), received_at, capture_ms=record.capture_ms)
+
+
+def output_line(reply, keep_timings):
+    reply = {key: value for key, value in reply.items() if key != "processed_image"}
+    if not keep_timings:
+        for field in VOLATILE_FIELDS:
+            reply.pop(field, None)
+        if "ingest" in reply:
+            reply["ingest"] = {key: value for key, value in reply["ingest"].items() if key != "lag_ms"}
+    return orjson.dumps(reply)
+
+
+async def replay(records, options, paced=False, speed=1.0):
+    """Run records through the frame handlers; returns the replies and the number of frames"""
+    session = GaitSession("replay", server.sessions.history_size)
+    config = StreamConfig().update(options)
+    config.timings = True
+    history = HistoryCursor()
+    socket = ReplaySocket()
+    slot = LatestFrameSlot()
+    started = time.perf_counter()
+    processor = None
+    if paced:
+        processor = asyncio.create_task(server.process_frames(socket, session, slot, config, history))
+
+    frames = 0
+    try:
+        for record in records:
+            if record.kind == KIND_CONFIG:
+                # Recorded config changes, then the command line's overrides again
+                config.update(record.config()).update(options)
+                config.timings = True
+                continue
+            frames += 1
+            if paced:
+                await asyncio.sleep(max(0.0, started + record.arrival_ms / 1000 / speed - time.perf_counter()))
+                server.receive_frame(slot, ingested(record, time.perf_counter()))
+                continue
+            server.receive_frame(slot, ingested(record, started + record.arrival_ms / 1000))
+            frame = await slot.get()
+            await server.handle_frame(socket, frame, session, slot, config, history)
+    finally:
+        slot.close()
+        if processor is not None:
+            await processor
+    return socket.replies, frames, slot.dropped
+
+
+def summarize(replies, frames, dropped, elapsed):
+    """Throughput, errors and mean stage times of a replay"""
+    metrics = [reply for reply in replies if "gait_metrics" in reply]
+    stages = {}
+    for reply in metrics:
+        for stage, ms in reply.get("timings_ms", {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "frames": frames,
+        "processed": len(metrics),
+        "dropped": dropped,
+        "errors": sum(reply.get("status") == "error" for reply in replies),
+        "elapsed_seconds": round(elapsed, 3),
+        "frames_per_second": round(len(metrics) / elapsed, 2) if elapsed else 0.0,
+        "mean_stage_ms": {stage: round(sum(times) / len(times), 2) for stage, times in stages.items()},
+    }
+
+
+def parse_options(pairs):
+    options = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Stream option {pair!r} is not name=value")
+        options[name] = value
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the frame handlers")
+    parser.add_argument("input", help=f"recording ({RECORDING_EXTENSION}) or video file")
+    parser.add_argument("--out", default="replay_metrics.jsonl", help="metrics file, one JSON reply per line")
+    parser.add_argument("--paced", action="store_true", help="hand frames in at their recorded arrival times")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale of --paced replays")
+    parser.add_argument("--option", action="append", default=[], metavar="NAME=VALUE",
+                        help="stream option (see stream_config.py), overriding the recorded config")
+    parser.add_argument("--keep-timings", action="store_true", help="keep timings_ms and ingest lag in --out")
+    parser.add_argument("--width", type=int, default=None, help="resize video frames to this width")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of video frames")
+    parser.add_argument("--save-recording", default=None, help="also write a video input as a recording")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    try:
+        options = parse_options(args.option)
+        StreamConfig().update(options)
+    except ValueError as e:
+        parser.error(str(e))
+    records = load_input(args.input, args.width, args.quality, args.save_recording)
+
+    started = time.perf_counter()
+    try:
+        replies, frames, dropped = asyncio.run(replay(records, options, args.paced, args.speed))
+    finally:
+        server.workers.shutdown()
+    elapsed = time.perf_counter() - started
+
+    with open(args.out, "wb") as f:
+        for reply in replies:
+            f.write(output_line(reply, args.keep_timings) + b"\n")
+    summary = summarize(replies, frames, dropped, elapsed)
+    print(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Reply messages of /ws/image and their wire encodings.
+
+The TypedDicts below describe every message the WebSocket sends, so the
+handlers in main.py build plain dicts with a checked shape instead of ad-hoc
+nesting. Keys marked NotRequired are only present when they apply (e.g.
+processed_image in image mode, landmarks in landmarks mode).
+
+Messages are serialized with orjson, which is several times faster than the
+stdlib json module and writes NumPy scalars and arrays itself, so float64
+averages and landmark arrays need no conversion first. A connection can
+negotiate MessagePack instead (encoding=msgpack, see stream_config.py): its
+replies are then binary messages with floats packed as 32-bit, about a
+quarter smaller than the same reply as JSON text. MessagePack replies
+never start with the binary frame magic b"GF" (they are maps), so clients can
+tell them apart from frames.
+"""
+from typing import Any, Literal, NotRequired, TypedDict
+
+import msgpack
+import numpy as np
+import orjson
+
+ENCODINGS = ("json", "msgpack")
+
+
+class PersonMetrics(TypedDict):
+    person_id: int
+    stride_length: int
+    swing_length: int
+    avg_stride: float | None
+    avg_swing: float | None
+    stride_period_ms: float | None
+    swing_period_ms: float | None
+    cadence: float | None
+    frames: int
+
+
+class FrameGaitMetrics(TypedDict, total=False):
+    """Gait metrics of one frame; empty when no pose was found"""
+    stride_length: int
+    swing_length: int
+    avg_stride: float | None
+    avg_swing: float | None
+    stride_period_ms: float | None  # average time between stride peaks on the media clock
+    swing_period_ms: float | None
+    cadence: float | None  # steps per minute
+    timestamp_ms: int  # media time of the frame (see media_clock.py)
+    frame_count: int
+    fast_mode: bool
+    gap_filled: bool  # pose carried over a detection dropout (smoothing on)
+    predicted: bool  # landmarks predicted instead of inferred (cadence on)
+    people: list[PersonMetrics]  # multi-pose streams only
+
+
+class PastMetric(TypedDict):
+    swing_length: int
+    stride_length: int
+
+
+class HistoryDelta(TypedDict):
+    seq: int
+    snapshot: bool
+    stride_length: list[int]
+    swing_length: list[int]
+
+
+class IngestStats(TypedDict):
+    received_frames: int
+    dropped_frames: int
+    queue_depth: int
+    lag_ms: NotRequired[float]
+
+
+class HistoryFields(TypedDict, total=False):
+    """Stride/swing history, as a window or as a delta (see metrics_history.py)"""
+    past_metrics: list[PastMetric]
+    people_past_metrics: dict[str, list[PastMetric]]
+    past_metrics_delta: HistoryDelta
+    people_past_metrics_delta: dict[str, HistoryDelta]
+
+
+class FrameReply(HistoryFields):
+    """Reply to a base64 or JSON frame"""
+    status: Literal["success"]
+    message: str
+    dimensions: dict[str, int]
+    gait_metrics: FrameGaitMetrics
+    frame_count: int
+    session_id: str
+    ingest: IngestStats
+    processed_image: NotRequired[str]
+    landmarks: NotRequired[np.ndarray]  # (num_poses, 132) rounded x, y, z, visibility
+    frame_id: NotRequired[Any]
+    timings_ms: NotRequired[dict[str, float]]
+
+
+class MetricsReply(HistoryFields):
+    """Side message following the reply to a binary frame"""
+    type: Literal["metrics"]
+    frame_id: int
+    gait_metrics: FrameGaitMetrics
+    frame_count: int
+    session_id: str
+    ingest: IngestStats
+    timings_ms: NotRequired[dict[str, float]]
+
+
+class StatusReply(TypedDict):
+    """Errors, config acknowledgements and other control replies"""
+    status: str
+    message: NotRequired[str]
+    config: NotRequired[dict[str, Any]]
+    frame_id: NotRequired[Any]  # of the frame an error is about, when the client sent one
+
+
+def _msgpack_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_message(message, encoding="json"):
+    """Serialize a reply: str for JSON (a text message), bytes for MessagePack"""
+    if encoding == "msgpack":
+        return msgpack.packb(message, default=_msgpack_default, use_single_float=True)
+    return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
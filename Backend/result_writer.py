@@ -0,0 +1,286 @@
+"""Background writer of gait results to Supabase (or a local SQLite stand-in).
+
+Nothing the server measured used to be kept anywhere but the landmark store
+on local disk. ResultWriter persists two tables without ever making the
+frame loop wait for the database:
+
+gait_sessions
+    one row per session (key session_id): frame count, media duration and
+    the latest averages, periods and cadence. Rewritten every
+    summary_interval seconds while the session streams, and a last time
+    with ended = true when it is evicted.
+gait_series
+    the stride/swing series downsampled to min/max envelopes of bucket_ms
+    of media time, like the /graph envelopes (key session_id, start_ms).
+
+A session id that comes back after eviction resumes the frame count, media
+time and start time of its landmark recording (see gait_session.py), so
+its rows continue the earlier visit's instead of replacing them. The first
+bucket of a resumed session starts at the resume point rather than at the
+bucket boundary before it, so it never shares a key with the earlier
+visit's last bucket. Without a landmark store there is nothing to resume
+from, and a reused id starts over and overwrites its rows.
+
+observe() runs on the event loop after every frame and only does NumPy
+slicing and dict updates: rows go into per-table buffers keyed by their
+primary key, so a summary that is rewritten before it was sent replaces the
+pending one. A background task flushes a table once batch_rows rows are
+waiting, and everything every flush_interval seconds. Batches are upserted
+from a thread (the Supabase client is synchronous) and retried with
+exponential backoff and jitter; a batch that still fails goes back into the
+buffer for the next flush. Each buffer holds at most max_pending rows,
+dropping the oldest beyond that, so a database outage costs data, not
+memory. Upserts make retries of a batch whose reply was lost harmless.
+
+The server writes to SQLite when GAIT_RESULTS_SQLITE names a database file
+(no Supabase project needed), otherwise to Supabase when SUPABASE_URL and
+SUPABASE_KEY are set. The Supabase tables need the same columns as
+SQLiteSink creates, with primary keys (session_id) and (session_id,
+start_ms).
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger("gait.results")
+
+SESSIONS_TABLE = "gait_sessions"
+SERIES_TABLE = "gait_series"
+
+# Table -> (primary key columns, all columns)
+TABLES = {
+    SESSIONS_TABLE: (
+        ("session_id",),
+        ("session_id", "started_at", "updated_at", "frames", "duration_ms", "avg_stride", "avg_swing",
+         "stride_period_ms", "swing_period_ms", "cadence", "ended"),
+    ),
+    SERIES_TABLE: (
+        ("session_id", "start_ms"),
+        ("session_id", "start_ms", "end_ms", "samples", "stride_min", "stride_max", "swing_min", "swing_max"),
+    ),
+}
+
+SUMMARY_METRICS = ("avg_stride", "avg_swing", "stride_period_ms", "swing_period_ms", "cadence")
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class SupabaseSink:
+    """Upserts rows with a supabase-py client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def upsert(self, table, rows):
+        key, _ = TABLES[table]
+        self.client.table(table).upsert(rows, on_conflict=",".join(key)).execute()
+
+
+class SQLiteSink:
+    """Local stand-in for the Supabase tables, in one SQLite file (":memory:" works too)"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            for table, (key, columns) in TABLES.items():
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}, PRIMARY KEY ({', '.join(key)}))")
+
+    def upsert(self, table, rows):
+        _, columns = TABLES[table]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row.get(column) for column in columns) for row in rows])
+
+    def rows(self, table):
+        """All rows of a table as dicts (for checks against the stand-in)"""
+        _, columns = TABLES[table]
+        with self._lock:
+            cursor = self._connection.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class _SessionState:
+    """What the writer has taken from one session so far"""
+
+    __slots__ = ("seen", "metrics", "summary_at", "bucket", "first_ms")
+
+    def __init__(self, seen, first_ms=0):
+        self.seen = seen  # samples (RingBuffer.total) already put into buckets
+        self.first_ms = first_ms  # no bucket starts earlier (after the stored part of a resumed session)
+        self.metrics = {}  # latest non-empty gait metrics
+        self.summary_at = None  # time.monotonic() of the last summary
+        self.bucket = None  # open series row
+
+
+class ResultWriter:
+    """Buffers session summaries and series rows and writes them in batches"""
+
+    def __init__(self, sink, batch_rows=500, flush_interval=5.0, summary_interval=10.0, bucket_ms=1000,
+                 max_retries=4, retry_delay=0.5, max_retry_delay=30.0, max_pending=50_000):
+        self.sink = sink
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.summary_interval = summary_interval
+        self.bucket_ms = bucket_ms
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_pending = max_pending
+        self._pending = {table: {} for table in TABLES}  # primary key -> row, oldest first
+        self._sessions = {}
+        self._wake = asyncio.Event()
+        self._task = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.failed_batches = 0
+
+    @property
+    def pending(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush task and write what is left (one round of retries)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def observe(self, session, gait_metrics):
+        """After a frame: bucket the session's new samples and, now and then, resend its summary"""
+        state = self._sessions.get(session.session_id)
+        if state is None:
+            times = session.sample_times
+            first_ms = 0 if session.resumed_ms is None else session.resumed_ms + 1
+            state = self._sessions[session.session_id] = _SessionState(times.total - len(times), first_ms)
+        if gait_metrics:
+            state.metrics = gait_metrics
+        self._add_samples(session, state)
+
+        now = time.monotonic()
+        if state.summary_at is None or now - state.summary_at >= self.summary_interval:
+            state.summary_at = now
+            self._submit(SESSIONS_TABLE, self._summary(session, state, ended=False))
+
+    def finish(self, session):
+        """The session is gone: write its last bucket and its final summary"""
+        state = self._sessions.pop(session.session_id, None)
+        if state is None:
+            return
+        self._add_samples(session, state)
+        if state.bucket is not None:
+            self._submit(SERIES_TABLE, state.bucket)
+        self._submit(SESSIONS_TABLE, self._summary(session, state, ended=True))
+
+    def _add_samples(self, session, state):
+        times = session.sample_times.since(state.seen).tolist()
+        stride = session.stride_lens.since(state.seen).tolist()
+        swing = session.swing_lens.since(state.seen).tolist()
+        state.seen = session.sample_times.total
+        for timestamp_ms, stride_length, swing_length in zip(times, stride, swing):
+            bucket = state.bucket
+            start_ms = max(timestamp_ms - timestamp_ms % self.bucket_ms, state.first_ms)
+            if bucket is not None and bucket["start_ms"] != start_ms:
+                self._submit(SERIES_TABLE, bucket)
+                bucket = None
+            if bucket is None:
+                bucket = state.bucket = {
+                    "session_id": session.session_id, "start_ms": start_ms, "end_ms": timestamp_ms, "samples": 0,
+                    "stride_min": stride_length, "stride_max": stride_length,
+                    "swing_min": swing_length, "swing_max": swing_length,
+                }
+            bucket["end_ms"] = timestamp_ms
+            bucket["samples"] += 1
+            bucket["stride_min"] = min(bucket["stride_min"], stride_length)
+            bucket["stride_max"] = max(bucket["stride_max"], stride_length)
+            bucket["swing_min"] = min(bucket["swing_min"], swing_length)
+            bucket["swing_max"] = max(bucket["swing_max"], swing_length)
+
+    def _summary(self, session, state, ended):
+        row = {
+            "session_id": session.session_id,
+            "started_at": _iso(session.created_at),
+            "updated_at": _iso(time.time()),
+            "frames": session.frame_count,
+            "duration_ms": session.clock.now_ms or 0,
+            "ended": ended,
+        }
+        for name in SUMMARY_METRICS:
+            value = state.metrics.get(name)
+            row[name] = None if value is None else float(value)
+        return row
+
+    def _submit(self, table, row):
+        key, _ = TABLES[table]
+        pending = self._pending[table]
+        row_key = tuple(row[column] for column in key)
+        pending.pop(row_key, None)  # a newer version of the row goes to the back
+        pending[row_key] = row
+        while len(pending) > self.max_pending:
+            del pending[next(iter(pending))]
+            self.rows_dropped += 1
+        if len(pending) >= self.batch_rows:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending row, batch_rows at a time"""
+        for table, pending in self._pending.items():
+            while pending:
+                keys = list(pending)[:self.batch_rows]
+                batch = {key: pending.pop(key) for key in keys}
+                written = False
+                try:
+                    written = await self._write(table, list(batch.values()))
+                finally:
+                    if not written:
+                        # Back into the buffer, unless a newer version arrived meanwhile
+                        for key, row in batch.items():
+                            pending.setdefault(key, row)
+                if not written:
+                    break
+
+    async def _write(self, table, rows):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self.sink.upsert, table, rows)
+                self.rows_written += len(rows)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed_batches += 1
+                    logger.error("Writing %d rows to %s failed, keeping them for the next flush: %s",
+                                 len(rows), table, e)
+                    return False
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning("Writing %d rows to %s failed (%s), retrying in %.1fs", len(rows), table, e, delay)
+                await asyncio.sleep(delay)
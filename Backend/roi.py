@@ -0,0 +1,107 @@
+"""Adaptive inference input: downscaling and cropping around the tracked person.
+
+The pose landmarker resizes every input to its own small network input
+internally, so handing it a full HD webcam frame mostly pays for copying
+and resizing pixels the model never sees. In adaptive mode (see
+stream_config.py) RoiTracker prepares a smaller input instead:
+
+* the frame is cropped to a padded box around the person found in the
+  previous frame, or left whole when there is no such box yet or tracking
+  was lost (no pose found);
+* the crop is downscaled with INTER_AREA so its longer side is at most
+  max_side pixels.
+
+Landmarks found in the crop are mapped back to coordinates normalized to the
+full frame, so drawing and process_gait_analysis work exactly as without
+adaptive mode. The box is only moved when the person leaves it or it has
+become much larger than needed, which keeps the input steady for
+MediaPipe's own frame-to-frame tracking in VIDEO mode.
+"""
+import cv2
+import numpy as np
+
+DEFAULT_MAX_SIDE = 320
+
+
+class RoiTracker:
+    """Region of interest of one video stream, updated from its landmarks"""
+
+    def __init__(self, max_side=DEFAULT_MAX_SIDE, padding=0.25, min_visibility=0.5):
+        self.max_side = max_side
+        self.padding = padding
+        self.min_visibility = min_visibility
+        self.box = None  # (x0, y0, x1, y1) in full-frame pixels, None for the whole frame
+        self.frames_lost = 0
+        self._frame_size = None
+        self._input_box = None
+
+    def prepare(self, frame):
+        """Crop and downscale an RGB frame for inference; returns a contiguous array"""
+        height, width = frame.shape[:2]
+        if self._frame_size != (width, height):
+            # The client changed resolution; the old box means nothing now
+            self._frame_size = (width, height)
+            self.box = None
+
+        x0, y0, x1, y1 = self.box or (0, 0, width, height)
+        self._input_box = (x0, y0, x1, y1)
+        crop = frame[y0:y1, x0:x1]
+        crop_width, crop_height = x1 - x0, y1 - y0
+        scale = self.max_side / max(crop_width, crop_height)
+        if scale < 1:
+            size = (max(1, round(crop_width * scale)), max(1, round(crop_height * scale)))
+            return cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(crop)
+
+    def to_frame(self, landmarks):
+        """Map (num_poses, 33, 4) landmarks from the last prepared input to the full frame
+
+        Also updates the box for the next frame.
+        """
+        width, height = self._frame_size
+        x0, y0, x1, y1 = self._input_box
+        crop_width, crop_height = x1 - x0, y1 - y0
+
+        mapped = landmarks.copy()
+        mapped[..., 0] = (landmarks[..., 0] * crop_width + x0) / width
+        mapped[..., 1] = (landmarks[..., 1] * crop_height + y0) / height
+        # z uses roughly the same scale as x
+        mapped[..., 2] = landmarks[..., 2] * crop_width / width
+        self._update(mapped)
+        return mapped
+
+    def _update(self, landmarks):
+        if not len(landmarks):
+            # Tracking lost: detect on the whole frame again
+            self.box = None
+            self.frames_lost += 1
+            return
+
+        width, height = self._frame_size
+        # The box covers every pose found, so multi-person streams keep everyone in view
+        poses = landmarks.reshape(-1, 4)
+        visible = poses[:, 3] >= self.min_visibility
+        points = poses[visible] if visible.sum() >= 4 else poses
+        x = np.clip(points[:, 0], 0, 1) * width
+        y = np.clip(points[:, 1], 0, 1) * height
+        pad = self.padding * max(x.max() - x.min(), y.max() - y.min())
+        box = (
+            max(0, int(x.min() - pad)),
+            max(0, int(y.min() - pad)),
+            min(width, int(np.ceil(x.max() + pad))),
+            min(height, int(np.ceil(y.max() + pad))),
+        )
+        if box[2] - box[0] < 2 or box[3] - box[1] < 2:
+            self.box = None
+            return
+
+        current = self.box or (0, 0, width, height)
+        contained = (box[0] >= current[0] and box[1] >= current[1]
+                     and box[2] <= current[2] and box[3] <= current[3])
+        if contained and _area(box) >= 0.5 * _area(current):
+            return
+        self.box = box
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
@@ -0,0 +1,134 @@
+"""Shared-memory ring of frame slots between the gateway and worker processes.
+
+In process mode (see process_workers.py) frames otherwise cross to the
+worker as encoded bytes and are decoded, annotated and re-encoded there.
+With GAIT_SHM_SLOTS > 0 the gateway instead decodes each frame into a slot
+of one multiprocessing.shared_memory block and hands the worker only the
+slot index and frame shape. The worker runs inference and annotates the
+frame in place in the slot; the gateway encodes the annotated frame straight
+from the slot. No decoded frame is ever pickled or copied between processes,
+and decode/encode run on the gateway's threads while the worker processes
+spend their time on inference.
+
+Each slot has an owner byte at the start of the block, so a slot is only
+touched by the side that owns it:
+
+    FREE --acquire()--> GATEWAY --hand_off()--> WORKER --give_back()--> GATEWAY --release()--> FREE
+
+Every transition checks the current owner and raises RuntimeError on a
+mismatch. Only the gateway allocates slots; when all of them are in use
+acquire() returns None and the frame takes the encoded-bytes path instead of
+waiting. python -m Backend.benchmark_shm compares the ring with pickling
+frames through a multiprocessing queue.
+"""
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FREE, GATEWAY, WORKER = 0, 1, 2
+OWNER_NAMES = {FREE: "free", GATEWAY: "gateway", WORKER: "worker"}
+
+# Default slot size: one 1080p RGB frame
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+# Slot data starts at a cache-line aligned offset after the owner bytes
+_ALIGN = 64
+
+
+class SharedFrameRing:
+    """Fixed-size frame slots in one shared memory block"""
+
+    def __init__(self, slots, slot_bytes=DEFAULT_SLOT_BYTES, name=None):
+        """Create a ring (name=None) or attach to the ring with that name"""
+        if slots < 1 or slot_bytes < 1:
+            raise ValueError("SharedFrameRing needs at least one non-empty slot")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._data_offset = -(-slots // _ALIGN) * _ALIGN
+        self._owner_created = name is None
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=self._data_offset + slots * slot_bytes)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+        self._owners = np.ndarray((slots,), dtype=np.uint8, buffer=self._memory.buf)
+        if self._owner_created:
+            self._owners[:] = FREE
+        self._lock = threading.Lock()
+
+    def spec(self):
+        """Picklable arguments to attach to this ring from another process"""
+        return {"slots": self.slots, "slot_bytes": self.slot_bytes, "name": self.name}
+
+    def fits(self, shape, dtype=np.uint8):
+        return int(np.prod(shape)) * np.dtype(dtype).itemsize <= self.slot_bytes
+
+    def frame(self, index, shape, dtype=np.uint8, owner=GATEWAY):
+        """Array view of a slot's frame; the caller must be the slot's owner"""
+        self._expect(index, owner)
+        if not self.fits(shape, dtype):
+            raise ValueError(f"Frame of shape {shape} does not fit in a {self.slot_bytes} byte slot")
+        offset = self._data_offset + index * self.slot_bytes
+        return np.ndarray(shape, dtype=dtype, buffer=self._memory.buf, offset=offset)
+
+    def acquire(self):
+        """Gateway: take a free slot, or None when every slot is in use"""
+        with self._lock:
+            free = np.flatnonzero(self._owners == FREE)
+            if not len(free):
+                return None
+            index = int(free[0])
+            self._owners[index] = GATEWAY
+            return index
+
+    def hand_off(self, index):
+        """Gateway: pass a filled slot to a worker"""
+        self._move(index, GATEWAY, WORKER)
+
+    def give_back(self, index):
+        """Worker: return a slot (with its annotated frame) to the gateway"""
+        self._move(index, WORKER, GATEWAY)
+
+    def release(self, index, force=False):
+        """Gateway: free a slot; force reclaims it from a worker that died holding it"""
+        with self._lock:
+            if not force:
+                self._expect(index, GATEWAY)
+            self._owners[index] = FREE
+
+    def in_use(self):
+        return int(np.count_nonzero(self._owners != FREE))
+
+    def close(self):
+        """Detach from the block; the creating process also removes it"""
+        self._owners = None
+        self._memory.close()
+        if self._owner_created:
+            self._memory.unlink()
+
+    def _move(self, index, current, new):
+        with self._lock:
+            self._expect(index, current)
+            self._owners[index] = new
+
+    def _expect(self, index, owner):
+        actual = int(self._owners[index])
+        if actual != owner:
+            raise RuntimeError(
+                f"Frame slot {index} is owned by the {OWNER_NAMES[actual]}, not the {OWNER_NAMES[owner]}")
+
+
+# The ring of a worker process, attached once at start (see process_workers.py)
+_worker_ring = None
+
+
+def attach_worker_ring(spec):
+    global _worker_ring
+    _worker_ring = SharedFrameRing(**spec) if spec is not None else None
+
+
+def worker_ring():
+    if _worker_ring is None:
+        raise RuntimeError("This process is not attached to a frame ring")
+    return _worker_ring
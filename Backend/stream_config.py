@@ -0,0 +1,177 @@
+"""Per-connection stream options for /ws/image.
+
+Options can be given as query parameters when connecting
+(ws://host/ws/image?mode=landmarks) or changed at any time with a JSON
+config message:
+
+    {"type": "config", "mode": "landmarks"}
+
+mode
+    "image" (default) returns the annotated frame plus gait metrics.
+    "landmarks" skips drawing and encoding and returns only the pose
+    landmarks (33 x [x, y, z, visibility] per pose, normalized to the frame)
+    plus gait metrics; the client draws the overlay itself.
+
+adaptive
+    when true ("1", "true"), pose inference runs on a downscaled crop
+    around the person tracked from the previous frame instead of the full
+    frame (see roi.py). Landmarks and metrics are still reported relative
+    to the full frame.
+
+model
+    pose landmarker tier: "default" (pose_landmarker.task), "lite", "full"
+    or "heavy" (see pose_models.py). Lighter tiers are faster and less
+    precise.
+
+segmentation
+    when true, the landmarker also produces segmentation masks. Off by
+    default: the server does not use them.
+
+detection_confidence, presence_confidence, tracking_confidence
+    MediaPipe's minimum pose detection, pose presence and tracking
+    confidence, between 0 and 1 (default 0.5 each).
+
+num_poses
+    how many people the landmarker looks for, 1 (default) to MAX_POSES.
+    Above 1 every person gets a stable id across frames and their own
+    stride/swing history (see person_tracker.py); replies then list each
+    person's metrics under gait_metrics["people"] and their recent series
+    under "people_past_metrics" (or "people_past_metrics_delta", keyed by
+    person id). The top-level gait metrics follow the person tracked the
+    longest.
+
+smoothing
+    when true, landmarks are smoothed over time with a One Euro filter and
+    short dropouts (up to 250 ms without a pose) are filled by carrying
+    the last pose along its velocity (see landmark_filter.py). The peak
+    detectors then use a shorter moving average, so averages settle
+    sooner. Replies of filled frames carry gait_metrics["gap_filled"].
+
+cadence
+    when true, single-person streams run pose inference only every k-th
+    frame, with k (1 to 3) chosen from how fast the person moves and how
+    long inference takes; the landmarks of the frames in between are
+    predicted and refined with optical flow (see cadence.py). Replies of
+    predicted frames carry gait_metrics["predicted"].
+
+history
+    "window" (default) sends the last 50 stride/swing pairs as
+    "past_metrics" with every reply. "delta" sends only the samples the
+    connection has not received yet as "past_metrics_delta"; send
+    {"type": "snapshot"} to get the full window again (see
+    metrics_history.py).
+
+encoding
+    "json" (default) sends replies as JSON text messages; "msgpack" sends
+    them as binary MessagePack messages, which are smaller (see
+    responses.py). Binary frames are still answered with a binary frame.
+
+Changing model, segmentation, num_poses or a confidence switches the
+session to a landmarker created with those options; landmarkers are cached
+per worker.
+
+timings
+    when true ("1", "true"), every reply carries "timings_ms" with the time
+    each processing stage took for that frame (see profiling.py).
+"""
+from dataclasses import asdict, dataclass, fields
+
+from .pose_models import MODEL_FILES, PoseModelOptions
+from .responses import ENCODINGS
+
+STREAM_MODES = ("image", "landmarks")
+HISTORY_MODES = ("window", "delta")
+CONFIDENCE_OPTIONS = ("detection_confidence", "presence_confidence", "tracking_confidence")
+TRUE_VALUES = ("1", "true", "yes", "on")
+MAX_POSES = 8
+
+
+def _parse_bool(value):
+    return value if isinstance(value, bool) else str(value).lower() in TRUE_VALUES
+
+
+@dataclass
+class StreamConfig:
+    mode: str = "image"
+    adaptive: bool = False
+    model: str = "default"
+    segmentation: bool = False
+    detection_confidence: float = 0.5
+    presence_confidence: float = 0.5
+    tracking_confidence: float = 0.5
+    num_poses: int = 1
+    smoothing: bool = False
+    cadence: bool = False
+    history: str = "window"
+    encoding: str = "json"
+    timings: bool = False
+
+    def update(self, options):
+        """Apply known options from a dict, raising ValueError on bad values"""
+        if "mode" in options:
+            mode = str(options["mode"])
+            if mode not in STREAM_MODES:
+                raise ValueError(f"Unknown stream mode {mode!r}, expected one of {STREAM_MODES}")
+            self.mode = mode
+        if "adaptive" in options:
+            self.adaptive = _parse_bool(options["adaptive"])
+        if "model" in options:
+            model = str(options["model"])
+            if model not in MODEL_FILES:
+                raise ValueError(f"Unknown pose model {model!r}, expected one of {tuple(MODEL_FILES)}")
+            self.model = model
+        if "segmentation" in options:
+            self.segmentation = _parse_bool(options["segmentation"])
+        for name in CONFIDENCE_OPTIONS:
+            if name in options:
+                try:
+                    value = float(options[name])
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a number") from None
+                if not 0.0 <= value <= 1.0:
+                    raise ValueError(f"{name} must be between 0 and 1")
+                setattr(self, name, value)
+        if "num_poses" in options:
+            try:
+                num_poses = int(options["num_poses"])
+            except (TypeError, ValueError):
+                raise ValueError("num_poses must be an integer") from None
+            if not 1 <= num_poses <= MAX_POSES:
+                raise ValueError(f"num_poses must be between 1 and {MAX_POSES}")
+            self.num_poses = num_poses
+        if "smoothing" in options:
+            self.smoothing = _parse_bool(options["smoothing"])
+        if "cadence" in options:
+            self.cadence = _parse_bool(options["cadence"])
+        if "history" in options:
+            history = str(options["history"])
+            if history not in HISTORY_MODES:
+                raise ValueError(f"Unknown history mode {history!r}, expected one of {HISTORY_MODES}")
+            self.history = history
+        if "encoding" in options:
+            encoding = str(options["encoding"])
+            if encoding not in ENCODINGS:
+                raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}")
+            self.encoding = encoding
+        if "timings" in options:
+            self.timings = _parse_bool(options["timings"])
+        return self
+
+    @classmethod
+    def from_query(cls, query_params):
+        """Build a config from WebSocket query parameters"""
+        names = {field.name for field in fields(cls)}
+        return cls().update({key: value for key, value in query_params.items() if key in names})
+
+    def pose_options(self):
+        """The landmarker options this stream asks for"""
+        return PoseModelOptions(
+            model=self.model,
+            segmentation=self.segmentation,
+            detection_confidence=self.detection_confidence,
+            presence_confidence=self.presence_confidence,
+            tracking_confidence=self.tracking_confidence,
+            num_poses=self.num_poses)
+
+    def to_dict(self):
+        return asdict(self)
@@ -7,4 +7,5 @@ load_dotenv()
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
\ No newline at end of file
+# None without credentials, so importing this module never fails on its own
+supabase: Client | None = create_client(url, key) if url and key else None
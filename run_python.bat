@@ -61,6 +61,7 @@ if "%1"=="gait" (
 if "%1"=="gait-video" (
     echo 🎥 Running gait detection video.py...
     cd "Backend\Gait Detection"
+    set PYTHONPATH=%PROJECT_ROOT%
     python video.py
     goto :end
 )
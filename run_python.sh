@@ -62,7 +62,7 @@ case "$1" in
     "gait-video")
         echo -e "${GREEN}🎥 Running gait detection video.py...${NC}"
         cd "Backend/Gait Detection"
-        python video.py
+        PYTHONPATH="$PROJECT_ROOT" python video.py
         ;;
     *)
         # Run the specified Python script
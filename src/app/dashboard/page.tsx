@@ -24,6 +24,39 @@ import { useUser, SignedIn, SignedOut, UserButton, SignOutButton } from '@clerk/
 import Link from 'next/link';
 import Webcam from 'react-webcam';
 
+// MediaPipe pose landmark pairs joined by the skeleton overlay
+const POSE_CONNECTIONS: [number, number][] = [
+  [0, 1], [1, 2], [2, 3], [3, 7], [0, 4], [4, 5], [5, 6], [6, 8], [9, 10],
+  [11, 12], [11, 13], [13, 15], [15, 17], [15, 19], [15, 21], [17, 19],
+  [12, 14], [14, 16], [16, 18], [16, 20], [16, 22], [18, 20],
+  [11, 23], [12, 24], [23, 24], [23, 25], [24, 26], [25, 27], [26, 28],
+  [27, 29], [28, 30], [29, 31], [30, 32], [27, 31], [28, 32]
+];
+
+// The server only sends landmarks (flat [x, y, z, visibility] * 33 per pose); we draw them.
+// The SVG has the frame's aspect ratio and is fitted like the object-contain image below it.
+const PoseOverlay = ({ poses, width, height }: { poses: number[][]; width: number; height: number }) => (
+  <svg className="absolute inset-0 w-full h-full" viewBox={`0 0 ${width} ${height}`}>
+    {poses.map((pose, p) => {
+      const point = (i: number) => ({ x: pose[i * 4] * width, y: pose[i * 4 + 1] * height });
+      const segment = (a: number, b: number, color: string, width: number, key: string) => (
+        <line key={key} x1={point(a).x} y1={point(a).y} x2={point(b).x} y2={point(b).y}
+          stroke={color} strokeWidth={width} vectorEffect="non-scaling-stroke" />
+      );
+      return (
+        <g key={p}>
+          {POSE_CONNECTIONS.map(([a, b]) => segment(a, b, 'white', 2, `c${a}-${b}`))}
+          {segment(27, 28, 'red', 3, 'stride')}
+          {segment(13, 14, 'blue', 3, 'swing')}
+          {Array.from({ length: 33 }, (_, i) => (
+            <circle key={i} cx={point(i).x} cy={point(i).y} r={0.006 * width} fill="red" />
+          ))}
+        </g>
+      );
+    })}
+  </svg>
+);
+
 const GaitGuardDashboard = () => {
   const [isMonitoring, setIsMonitoring] = useState(false);
   const [currentTime, setCurrentTime] = useState(new Date());
@@ -33,6 +66,8 @@ const GaitGuardDashboard = () => {
   const [processingStatus, setProcessingStatus] = useState('');
   const [processedImage, setProcessedImage] = useState<string | null>(null);
   const [gaitMetrics, setGaitMetrics] = useState<any>(null);
+  const [poseLandmarks, setPoseLandmarks] = useState<number[][] | null>(null);
+  const [frameSize, setFrameSize] = useState({ width: 640, height: 480 });
   const [isProcessing, setIsProcessing] = useState(false);
   const [droppedFrames, setDroppedFrames] = useState(0);
   const { user, isLoaded } = useUser();
@@ -42,6 +77,8 @@ const GaitGuardDashboard = () => {
   const intervalRef = useRef<NodeJS.Timeout | null>(null);
   const lastFrameTime = useRef<number>(0);
   const processingQueue = useRef<number>(0);
+  const nextFrameId = useRef<number>(0);
+  const sentFrames = useRef<Map<number, string>>(new Map());
 
 /* @ts-ignore */
   const [gaitData, setGaitData] = useState<any[]>([]);
@@ -56,7 +93,7 @@ const GaitGuardDashboard = () => {
   // WebSocket connection management
   const connectWebSocket = useCallback(() => {
     try {
-      const ws = new WebSocket('ws://localhost:8000/ws/image');
+      const ws = new WebSocket('ws://localhost:8000/ws/image?mode=landmarks&history=delta');
       
       ws.onopen = () => {
         console.log('WebSocket connected');
@@ -69,8 +106,12 @@ const GaitGuardDashboard = () => {
           const response = JSON.parse(event.data);
           console.log('Server response:', response);
           
-          // Decrease processing queue count
-          processingQueue.current = Math.max(0, processingQueue.current - 1);
+          // The server only keeps the newest frame, so trust its queue depth
+          if (response.ingest) {
+            processingQueue.current = response.ingest.queue_depth;
+          } else {
+            processingQueue.current = Math.max(0, processingQueue.current - 1);
+          }
           setIsProcessing(processingQueue.current > 0);
           
           if (response.status === 'success') {
@@ -80,16 +121,36 @@ const GaitGuardDashboard = () => {
             if (response.processed_image) {
               setProcessedImage(response.processed_image);
             }
+
+            // Landmarks mode: show the frame we sent with the pose drawn on top
+            if (response.landmarks) {
+              const frame = sentFrames.current.get(response.frame_id);
+              sentFrames.current.forEach((_, id) => {
+                if (id <= response.frame_id) sentFrames.current.delete(id);
+              });
+              if (frame) {
+                setProcessedImage(frame);
+              }
+              setPoseLandmarks(response.landmarks);
+              if (response.dimensions) {
+                setFrameSize(response.dimensions);
+              }
+            }
             
             // Update gait metrics if available
             if (response.gait_metrics) {
               setGaitMetrics(response.gait_metrics);
             }
 
-            if(response.past_metrics){
-              console.log("GETTING PAST METRICS!")
-              /* @ts-ignore */
-              setGaitData(response.past_metrics.map((e, i) => ({ ...e, date: i })))
+            // Only new stride/swing samples arrive; a snapshot replaces the window
+            if (response.past_metrics_delta) {
+              const delta = response.past_metrics_delta;
+              const samples = delta.stride_length.map((stride_length: number, i: number) => ({
+                stride_length,
+                swing_length: delta.swing_length[i],
+                date: delta.seq + i,
+              }));
+              setGaitData(previous => (delta.snapshot ? samples : [...previous, ...samples]).slice(-50));
             }
           } else if (response.status === 'error') {
             setProcessingStatus(`Error: ${response.message}`);
@@ -107,10 +168,12 @@ const GaitGuardDashboard = () => {
         setWsStatus('disconnected');
         setProcessingStatus('Disconnected from AI server');
         setProcessedImage(null);
+        setPoseLandmarks(null);
         setGaitMetrics(null);
         setIsProcessing(false);
         setDroppedFrames(0);
         processingQueue.current = 0;
+        sentFrames.current.clear();
       };
       
       ws.onerror = (error) => {
@@ -135,10 +198,12 @@ const GaitGuardDashboard = () => {
     setWsStatus('disconnected');
     setProcessingStatus('');
     setProcessedImage(null);
+    setPoseLandmarks(null);
     setGaitMetrics(null);
     setIsProcessing(false);
     setDroppedFrames(0);
     processingQueue.current = 0;
+    sentFrames.current.clear();
   }, []);
 
   // Capture and send frame function with smart throttling
@@ -166,12 +231,14 @@ const GaitGuardDashboard = () => {
         });
         
         if (imageSrc) {
+          const frameId = nextFrameId.current++;
+          sentFrames.current.set(frameId, imageSrc);
           const message = {
             type: 'gait_analysis',
             image: imageSrc,
             timestamp: new Date().toISOString(),
             user_id: user?.id || 'anonymous',
-            frame_id: frameCount // Add frame ID for tracking
+            frame_id: frameId // Add frame ID for tracking
           };
           
           wsRef.current.send(JSON.stringify(message));
@@ -185,7 +252,7 @@ const GaitGuardDashboard = () => {
         setProcessingStatus('Error capturing frame');
       }
     }
-  }, [user?.id, frameCount]);
+  }, [user?.id]);
 
   // Start/stop monitoring with frame streaming
   const toggleMonitoring = useCallback(() => {
@@ -268,11 +335,14 @@ const GaitGuardDashboard = () => {
   const ProcessedImageComponent = () => (
     <div className="relative w-full h-full">
       {processedImage ? (
-        <img 
-          src={processedImage} 
-          alt="Processed with landmarks" 
-          className="w-full h-full object-cover rounded-xl"
-        />
+        <>
+          <img 
+            src={processedImage} 
+            alt="Processed with landmarks" 
+            className="w-full h-full object-contain rounded-xl"
+          />
+          {poseLandmarks && <PoseOverlay poses={poseLandmarks} width={frameSize.width} height={frameSize.height} />}
+        </>
       ) : (
         <div className="w-full h-full bg-slate-900/50 rounded-xl flex items-center justify-center border border-purple-500/20">
           <div className="text-center">